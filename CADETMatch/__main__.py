@@ -100,6 +100,79 @@ def makeParser():
         type=pathlib.Path
     )    
 
+    parser.add_argument(
+        "--export_results", help="Result directory or evaluations.h5 file to export as a csv file with one row per evaluation", action="store",
+        type=pathlib.Path
+    )
+
+    parser.add_argument(
+        "--compact_results", help="Result directory or HDF5 file to rewrite with chunking and compression", action="store",
+        type=pathlib.Path
+    )
+
+    parser.add_argument(
+        "--compact_compression", help="Compression used by --compact_results (gzip, lzf or none)", action="store",
+        default="gzip", choices=["gzip", "lzf", "none"]
+    )
+
+    parser.add_argument(
+        "--compact_level", help="gzip level used by --compact_results", action="store",
+        default=4,
+        type=int
+    )
+
+    parser.add_argument(
+        "--compact_float32", help="Store transformed copies and flat chains as float32 with --compact_results",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--benchmark_scores", help="Directory to store the score benchmark baseline (benchmark_scores.json) in", action="store",
+        type=pathlib.Path
+    )
+
+    parser.add_argument(
+        "--benchmark_lengths", help="Comma separated chromatogram lengths to use for --benchmark_scores", action="store",
+        default="1000,10000,50000,200000"
+    )
+
+    parser.add_argument(
+        "--benchmark_repeats", help="Number of times each benchmark is repeated", action="store",
+        default=3,
+        type=int
+    )
+
+    parser.add_argument(
+        "--benchmark_update", help="Replace the benchmark baseline even if regressions were reported",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--benchmark_imports", help="Directory to store the import time benchmark baseline (benchmark_imports.json) in", action="store",
+        type=pathlib.Path
+    )
+
+    parser.add_argument(
+        "--benchmark_pareto", help="Directory to store the Pareto front benchmark baseline (benchmark_pareto.json) in", action="store",
+        type=pathlib.Path
+    )
+
+    parser.add_argument(
+        "--benchmark_population", help="Comma separated population sizes to use for --benchmark_pareto", action="store",
+        default="100,500"
+    )
+
+    parser.add_argument(
+        "--benchmark_examples", help="Directory of generated CADETMatch Examples to run a throughput and scaling benchmark on", action="store",
+        type=pathlib.Path
+    )
+
+    parser.add_argument(
+        "--benchmark_generations", help="Number of generations per estimated variable for --benchmark_examples", action="store",
+        default=5,
+        type=int
+    )
+
     return parser
 
 
@@ -160,6 +233,24 @@ if __name__ == "__main__":
         sys.exit(run_examples("CADETMatch.run_examples", args.run_examples, args.n))
     if args.results_examples:
         sys.exit(run_examples("CADETMatch.results_examples", args.results_examples))
+    if args.export_results:
+        sys.exit(run_examples("CADETMatch.records", args.export_results))
+    if args.compact_results:
+        sys.exit(run_examples("CADETMatch.compact_results", args.compact_results, args.compact_compression,
+                              args.compact_level, int(args.compact_float32)))
+    if args.benchmark_scores:
+        sys.exit(run_examples("CADETMatch.benchmark_scores", args.benchmark_scores, args.benchmark_lengths,
+                              args.benchmark_repeats, int(args.benchmark_update)))
+    if args.benchmark_imports:
+        sys.exit(run_examples("CADETMatch.benchmark_imports", args.benchmark_imports, args.benchmark_repeats,
+                              int(args.benchmark_update)))
+    if args.benchmark_pareto:
+        sys.exit(run_examples("CADETMatch.benchmark_pareto", args.benchmark_pareto, args.benchmark_population,
+                              args.benchmark_repeats))
+    if args.benchmark_examples:
+        sys.exit(run_examples("CADETMatch.benchmark_examples", args.benchmark_examples, args.n,
+                              args.cadet_examples or "", args.benchmark_generations,
+                              args.example_population or 10))
     if args.generate_examples:
         sys.exit(run_examples("CADETMatch.generate_examples", args.generate_examples, args.cadet_examples,
                               args.example_population, args.example_mcmc_population))
@@ -0,0 +1,112 @@
+"Simulation archive. Stores the outlet traces of evaluated individuals so they can be scored again without simulating"
+
+from pathlib import Path
+
+import h5py
+import numpy
+from addict import Dict
+
+archive_name = "simulation_archive.h5"
+
+# open archives and their individual -> row index for the processes that read them
+archives = {}
+
+
+def archive_path(cache):
+    return Path(cache.settings["resultsDir"]) / archive_name
+
+
+def collect(cache, result_data, individual, results):
+    "add the outlet traces of one evaluated individual to result_data, written by write"
+    data = result_data.setdefault("archive", {"input": [], "times": {}, "traces": {}})
+    data["input"].append(tuple(individual))
+
+    for experimentName, experiment in results.items():
+        solution = experiment["simulation"].root.output.solution
+        times = solution.solution_times
+
+        if experimentName not in data["times"]:
+            data["times"][experimentName] = times
+
+        for unitName in cache.target[experimentName]["units_used"]:
+            for name, values in solution[unitName].items():
+                if isinstance(values, numpy.ndarray) and values.shape == times.shape:
+                    trace = "%s/%s/%s" % (experimentName, unitName, name)
+                    data["traces"].setdefault(trace, []).append(values)
+
+
+def append_rows(hf, name, rows):
+    if name in hf:
+        hf[name].resize((hf[name].shape[0] + len(rows)), axis=0)
+        hf[name][-len(rows) :] = rows
+    else:
+        # one row per chunk so a single individual can be read without decompressing its neighbours
+        hf.create_dataset(
+            name,
+            data=rows,
+            maxshape=(None, rows.shape[1]),
+            chunks=(1, rows.shape[1]),
+            compression="gzip",
+            shuffle=True,
+        )
+
+
+def write(cache, result_data):
+    "append everything collected since the last write to the archive"
+    data = result_data.pop("archive", None)
+    if not data or not data["input"]:
+        return
+
+    with h5py.File(archive_path(cache), "a") as hf:
+        append_rows(hf, "input", numpy.array(data["input"]))
+
+        for experimentName, times in data["times"].items():
+            name = "%s/solution_times" % experimentName
+            if name not in hf:
+                hf.create_dataset(name, data=times)
+
+        for name, rows in data["traces"].items():
+            append_rows(hf, name, numpy.array(rows))
+
+
+def read_input(path):
+    "unique individuals in the archive in the order they were first evaluated"
+    with h5py.File(path, "r") as hf:
+        data = hf["input"][()]
+    unique, index = numpy.unique(data, axis=0, return_index=True)
+    return data[numpy.sort(index)]
+
+
+def load(path):
+    "open an archive once per process and index its rows by individual"
+    path = Path(path).as_posix()
+    if path not in archives:
+        hf = h5py.File(path, "r")
+        index = {}
+        for idx, row in enumerate(hf["input"][()]):
+            index.setdefault(tuple(row), idx)
+        archives[path] = (hf, index)
+    return archives[path]
+
+
+def contains(path, individual):
+    hf, index = load(path)
+    return tuple(individual) in index
+
+
+def get_solution(path, individual, experimentName):
+    "output/solution of the archived simulation of individual for an experiment, None if it was not archived"
+    hf, index = load(path)
+    idx = index.get(tuple(individual), None)
+
+    if idx is None or experimentName not in hf:
+        return None
+
+    group = hf[experimentName]
+    solution = Dict()
+    solution.solution_times = group["solution_times"][()]
+    for unitName, unit in group.items():
+        if isinstance(unit, h5py.Group):
+            for name, dataset in unit.items():
+                solution[unitName][name] = dataset[idx]
+    return solution
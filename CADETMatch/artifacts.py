@@ -0,0 +1,217 @@
+"""Startup artifact cache. Expensive startup products are stored under resultsDirMisc/artifacts keyed by a hash of the
+settings and inputs they depend on so a restarted or repeated run can reuse them"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import numpy
+from cadet import H5, Cadet
+
+import CADETMatch.version as version
+
+
+# id of the run, pool workers and graph processes inherit it. Entries other processes of the same run depend on are
+# still shared through the cache when artifactCache is off but only within the run that stored them
+run_variable = "CADETMATCH_RUN"
+os.environ.setdefault(run_variable, uuid.uuid4().hex)
+
+
+def start_run():
+    "give this process and every process it starts from now on a new run id"
+    os.environ[run_variable] = uuid.uuid4().hex
+
+
+def run_id():
+    return os.environ[run_variable]
+
+
+def artifact_dir(cache):
+    return Path(cache.settings["resultsDirMisc"]) / "artifacts"
+
+
+def enabled(cache):
+    "artifactCache turns off reusing artifacts, entries other processes of the same run depend on are always stored"
+    return bool(cache.settings.get("artifactCache", True))
+
+
+def hash_value(digest, value):
+    "feed value into digest, containers are walked so equal content always gives the same hash"
+    if isinstance(value, dict):
+        digest.update(b"dict")
+        for key in sorted(value.keys(), key=str):
+            hash_value(digest, str(key))
+            hash_value(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"list%d" % len(value))
+        for item in value:
+            hash_value(digest, item)
+    elif isinstance(value, numpy.ndarray):
+        digest.update(("%s%s" % (value.dtype.str, value.shape)).encode())
+        digest.update(numpy.ascontiguousarray(value).tobytes())
+    elif isinstance(value, bytes):
+        digest.update(b"bytes" + value)
+    elif isinstance(value, (str, Path)):
+        digest.update(b"str" + str(value).encode())
+    elif value is None or isinstance(value, (bool, int, float, numpy.generic)):
+        digest.update(repr(value).encode())
+    elif hasattr(value, "root"):
+        # H5 and Cadet objects are identified by their content
+        hash_value(digest, value.root)
+    else:
+        raise TypeError("can't hash %s for the artifact cache" % type(value))
+
+
+def artifact_key(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        hash_value(digest, part)
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with Path(path).open("rb") as data:
+        for block in iter(lambda: data.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def data_files(value):
+    "every string in the settings value that names an existing file, in a stable order"
+    if isinstance(value, dict):
+        for key in sorted(value.keys(), key=str):
+            yield from data_files(value[key])
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from data_files(item)
+    elif isinstance(value, str) and value:
+        try:
+            is_file = Path(value).is_file()
+        except (OSError, ValueError):
+            is_file = False
+        if is_file:
+            yield value
+
+
+def cadet_files(cache):
+    "the CADET executable and library simulations are run with, as far as cadet-python resolved them"
+    paths = [cache.settings.get("CADETPath", None)]
+    paths.extend(getattr(Cadet, name, None) for name in ("cadet_path", "cadet_cli_path", "cadet_dll_path"))
+    return sorted({Path(path).as_posix() for path in paths if path is not None})
+
+
+def settings_key(cache, *parts):
+    """key of the settings file, every data file the experiments, their features and the error model refer to (csv,
+    HDF5, fraction_csv, experimental_csv, ...) and the CADET binaries (their content identifies the version) together
+    with parts"""
+    files = [
+        file_hash(path)
+        for path in data_files([cache.settings["experiments"], cache.settings.get("errorModel", None)])
+    ]
+    cadet = [file_hash(path) if list(data_files(path)) else path for path in cadet_files(cache)]
+    return artifact_key(file_hash(cache.json_path), files, cadet, *parts)
+
+
+def load_arrays(cache, kind, key, this_run=False):
+    "the arrays stored for key or None if there is no valid entry, this_run only accepts entries stored by this run"
+    path = artifact_dir(cache) / ("%s_%s.h5" % (kind, key))
+    if not path.exists():
+        return None
+
+    data = H5()
+    data.filename = path.as_posix()
+    try:
+        data.load(lock=True)
+        valid = (
+            data.root.key.decode() == key
+            and data.root.version.decode() == version.__version__
+            and (not this_run or data.root.run.decode() == run_id())
+        )
+    except (OSError, KeyError, AttributeError):
+        valid = False
+
+    if not valid:
+        multiprocessing.get_logger().info("discard invalid artifact %s", path)
+        return None
+    return data.root.data
+
+
+def save_arrays(cache, kind, key, values):
+    directory = artifact_dir(cache)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    data = H5()
+    data.filename = (directory / ("%s_%s.h5" % (kind, key))).as_posix()
+    data.root.key = key
+    data.root.version = version.__version__
+    data.root.run = run_id()
+    data.root.data = values
+    data.save(lock=True)
+
+
+def cached_arrays(cache, kind, parts, compute):
+    "load the arrays of kind for the inputs in parts or compute (returns a dict of arrays) and store them"
+    if not enabled(cache):
+        return compute()
+
+    key = artifact_key(kind, *parts)
+    values = load_arrays(cache, kind, key)
+    if values is None:
+        values = compute()
+        save_arrays(cache, kind, key, values)
+    else:
+        multiprocessing.get_logger().info("loaded %s from the artifact cache", kind)
+    return values
+
+
+def store_files(cache, kind, key, paths):
+    "copy files into the artifact cache, the entry only becomes valid once all of them are copied"
+    if not enabled(cache):
+        return
+    directory = artifact_dir(cache) / ("%s_%s" % (kind, key))
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in paths:
+        shutil.copy(str(path), str(directory))
+
+    with (directory / "artifact.json").open("w") as json_data:
+        json.dump({"key": key, "version": version.__version__}, json_data)
+
+
+def restore_files(cache, kind, key, destinations):
+    "copy the stored files of kind back to destinations (name -> path), returns False if there is no valid entry"
+    directory = artifact_dir(cache) / ("%s_%s" % (kind, key))
+    marker = directory / "artifact.json"
+    if not enabled(cache) or not marker.exists():
+        return False
+
+    with marker.open() as json_data:
+        stored = json.load(json_data)
+
+    if stored != {"key": key, "version": version.__version__} or not all(
+        (directory / name).exists() for name in destinations
+    ):
+        multiprocessing.get_logger().info("discard invalid artifact %s", directory)
+        return False
+
+    for name, destination in destinations.items():
+        shutil.copy(str(directory / name), str(destination))
+    multiprocessing.get_logger().info("loaded %s from the artifact cache", kind)
+    return True
+
+
+def clear(cache, kind=None):
+    "remove all artifacts or only the ones of kind"
+    directory = artifact_dir(cache)
+    if not directory.exists():
+        return
+    pattern = "*" if kind is None else "%s_*" % kind
+    for path in directory.glob(pattern):
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
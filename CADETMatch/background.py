@@ -0,0 +1,95 @@
+"""Background writer of the main process. Result files, front simulations and checkpoints are written by a single
+thread while the next generation is evaluated. Tasks run in the order they were submitted so a checkpoint is only on
+disk after everything queued before it, the main process only waits for the queue at checkpoints and when a search
+finishes"""
+
+import concurrent.futures
+import io
+import multiprocessing
+import os
+import pickle
+import threading
+from pathlib import Path
+
+import numpy
+
+thread_name = "CADETMatch-writer"
+
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=thread_name)
+futures = []
+
+# path -> future of the last checkpoint written to it
+checkpoints = {}
+
+# called before a checkpoint is queued, they queue everything the checkpoint covers (buffered rows, file flushes)
+barriers = []
+
+
+def in_writer():
+    return threading.current_thread().name.startswith(thread_name)
+
+
+def submit(function, *args):
+    """run function(*args) on the writer thread, a task that failed since the last call is raised here so errors
+    stop the search like they did when the writes happened in the main process"""
+    check()
+    future = executor.submit(function, *args)
+    future.add_done_callback(log_error)
+    futures.append(future)
+    return future
+
+
+def check():
+    "raise the error of the first failed task and forget the finished ones"
+    done = [future for future in futures if future.done()]
+    for future in done:
+        futures.remove(future)
+    for future in done:
+        if future.exception() is not None:
+            raise future.exception()
+
+
+def log_error(future):
+    error = future.exception()
+    if error is not None:
+        multiprocessing.get_logger().error("background write failed", exc_info=error)
+
+
+def wait():
+    "block until every submitted task is done"
+    if in_writer():
+        return
+    concurrent.futures.wait(list(futures))
+    check()
+
+
+def write_bytes(path, data):
+    "written under a temporary name so a crash never leaves a partial file"
+    path = Path(path)
+    temp = path.with_name(path.name + ".tmp")
+    with temp.open("wb") as handle:
+        handle.write(data)
+    os.replace(temp, path)
+
+
+def write_checkpoint(path, data):
+    """data is pickled now so later changes don't end up in the checkpoint and written after everything queued before
+    it. The previous checkpoint of path has to be written first which keeps the writer at most one checkpoint behind"""
+    queue_checkpoint(path, pickle.dumps(data))
+
+
+def save_array(path, array):
+    "numpy.save of array to path (used as is, no .npy is added) with the ordering of write_checkpoint"
+    buffer = io.BytesIO()
+    numpy.save(buffer, array)
+    queue_checkpoint(path, buffer.getvalue())
+
+
+def queue_checkpoint(path, data):
+    path = Path(path).as_posix()
+    previous = checkpoints.get(path, None)
+    if previous is not None and not in_writer():
+        concurrent.futures.wait([previous])
+    for barrier in barriers:
+        barrier()
+    checkpoints[path] = submit(write_bytes, path, data)
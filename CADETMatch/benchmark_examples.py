@@ -0,0 +1,203 @@
+"Run a fixed subset of the generated examples at increasing worker counts and record throughput and scaling"
+
+import csv
+import json
+import multiprocessing
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import psutil
+
+import CADETMatch.h5store as h5store
+import CADETMatch.records as records
+import CADETMatch.version as version
+
+examples = [
+    "experiments/single",
+    "experiments/multiple",
+    "scores/Shape",
+    "scores/fractionationSlide",
+    "search/unsga3",
+]
+
+poll_interval = 0.5
+
+
+def worker_counts(max_workers):
+    "1, 2, 4 ... up to and including max_workers"
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+    return counts
+
+
+def prepare_run(example_dir, run_dir, generations, population, cadet_path):
+    "copy an example without results to run_dir and set the benchmark overrides in its json files"
+    if run_dir.exists():
+        shutil.rmtree(run_dir)
+    shutil.copytree(example_dir, run_dir, ignore=shutil.ignore_patterns("results"))
+
+    json_paths = sorted(run_dir.glob("*.json"))
+    for json_path in json_paths:
+        with json_path.open() as json_data:
+            config = json.load(json_data)
+
+        config["baseDir"] = run_dir.as_posix()
+        config["generations"] = generations
+        config["population"] = population
+        # keep the optimizer running for the fixed number of generations and keep graphing out of the measurement
+        config["stallGenerations"] = generations * 1000
+        config["finalGradRefinement"] = False
+        config["graphGenerateTime"] = 10**9
+        config["graphMetaTime"] = 10**9
+        if cadet_path:
+            config["CADETPath"] = cadet_path
+
+        with json_path.open("w") as json_data:
+            json.dump(config, json_data, indent="\t")
+    return json_paths
+
+
+def run_match(json_path, workers):
+    "run a match and return the return code, wall time and peak resident memory of the whole process tree"
+    command = [sys.executable, "-m", "CADETMatch", "--match", "-j", json_path.as_posix(), "-n", str(workers)]
+
+    start = time.time()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    parent = psutil.Process(process.pid)
+
+    peak_rss_total = 0
+    peak_rss_main = 0
+    while process.poll() is None:
+        try:
+            tree = [parent] + parent.children(recursive=True)
+            rss = {proc.pid: proc.memory_info().rss for proc in tree}
+        except psutil.NoSuchProcess:
+            continue
+        peak_rss_total = max(peak_rss_total, sum(rss.values()))
+        # the match process itself is the first child of the CADETMatch launcher
+        main_pids = [proc.pid for proc in parent.children()]
+        if main_pids:
+            peak_rss_main = max(peak_rss_main, rss.get(main_pids[0], 0))
+        time.sleep(poll_interval)
+
+    return process.returncode, time.time() - start, peak_rss_total, peak_rss_main
+
+
+def read_progress(results_dir):
+    "return generations, elapsed optimizer time and main process cpu time from progress.csv"
+    with (results_dir / "progress.csv").open(newline="") as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    if not rows:
+        return 0, 0.0, 0.0
+    last = rows[-1]
+    return len(rows), float(last["Elapsed Time"]), float(last["Total CPU Time"])
+
+
+def count_evaluations(results_dir):
+    "rows of evaluations.h5, results.csv is only written when the records are exported"
+    path = records.locate(results_dir)
+    if not path.exists():
+        raise FileNotFoundError(path)
+    with h5store.open_results(path) as hf:
+        return hf["values"].shape[0] if "values" in hf else 0
+
+
+def benchmark_run(json_path, workers):
+    with json_path.open() as json_data:
+        config = json.load(json_data)
+    results_dir = Path(config["baseDir"]) / config["resultsDir"]
+
+    returncode, wall_time, peak_rss_total, peak_rss_main = run_match(json_path, workers)
+
+    run = {
+        "workers": workers,
+        "population": config["population"],
+        "returncode": returncode,
+        "wall_time": wall_time,
+        "peak_rss_total": peak_rss_total,
+        "peak_rss_main": peak_rss_main,
+    }
+
+    try:
+        generations, elapsed, main_cpu = read_progress(results_dir)
+        evaluations = count_evaluations(results_dir)
+    except FileNotFoundError:
+        return run
+
+    run["generations"] = generations
+    run["evaluations"] = evaluations
+    run["elapsed"] = elapsed
+    run["evaluations_per_second"] = evaluations / elapsed if elapsed else 0.0
+    run["main_cpu_per_generation"] = main_cpu / generations if generations else 0.0
+    return run
+
+
+def add_efficiency(runs):
+    "parallel efficiency relative to the single worker run, throughput based so it works for strong and weak scaling"
+    base_rates = {
+        run["config"]: run["evaluations_per_second"]
+        for run in runs
+        if run["workers"] == 1 and run.get("evaluations_per_second")
+    }
+    for run in runs:
+        base_rate = base_rates.get(run["config"], None)
+        if base_rate and run.get("evaluations_per_second"):
+            run["speedup"] = run["evaluations_per_second"] / base_rate
+            run["efficiency"] = run["speedup"] / run["workers"]
+
+
+def environment():
+    return {
+        "version": version.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": multiprocessing.cpu_count(),
+    }
+
+
+def main(example_dir, max_workers, cadet_path=None, generations=5, population=10):
+    example_dir = Path(example_dir).resolve()
+    # kept next to the examples so run_examples and clean_examples do not pick up the benchmark copies
+    benchmark_dir = example_dir.parent / ("%s_benchmark" % example_dir.name)
+
+    if not max_workers:
+        max_workers = multiprocessing.cpu_count()
+
+    results = {}
+    for example in examples:
+        source = example_dir / example
+        if not source.exists():
+            print("skipping missing example", source)
+            continue
+
+        for scaling in ("strong", "weak"):
+            runs = []
+            for workers in worker_counts(max_workers):
+                # weak scaling keeps the work per worker constant
+                local_population = population * workers if scaling == "weak" else population
+                run_dir = benchmark_dir / example / scaling / str(workers)
+                for json_path in prepare_run(source, run_dir, generations, local_population, cadet_path):
+                    print(example, scaling, workers, json_path.name)
+                    run = benchmark_run(json_path, workers)
+                    run["config"] = json_path.name
+                    runs.append(run)
+            add_efficiency(runs)
+            results.setdefault(example, {})[scaling] = runs
+
+    output = benchmark_dir / ("benchmark_examples_%s.json" % version.__version__)
+    with output.open("w") as json_data:
+        json.dump({"environment": environment(), "results": results}, json_data, indent=4, sort_keys=True)
+    print("benchmark written to", output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], int(sys.argv[2]), sys.argv[3], int(sys.argv[4]), int(sys.argv[5]))
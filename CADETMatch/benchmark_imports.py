@@ -0,0 +1,152 @@
+"Time the imports every pool worker and graph/MLE subprocess pays at startup with python -X importtime"
+
+import json
+import platform
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy
+
+import CADETMatch.version as version
+
+# name -> import statement, each is run in a fresh interpreter
+targets = {
+    "worker": "import CADETMatch.cache, CADETMatch.evo, CADETMatch.gradFD",
+    "match": "import CADETMatch.match",
+    "generate_graphs": "import CADETMatch.generate_graphs",
+    "generate_corner_graphs": "import CADETMatch.generate_corner_graphs",
+    "generate_autocorr_graphs": "import CADETMatch.generate_autocorr_graphs",
+    "generate_mixing_graphs": "import CADETMatch.generate_mixing_graphs",
+    "graph_kde": "import CADETMatch.graph_kde",
+    "mle": "import CADETMatch.mle",
+}
+
+# seconds, a target over its budget fails the benchmark even without a baseline
+budgets = {
+    "worker": 1.0,
+}
+
+regression_factor = 1.25
+
+
+def parse_importtime(stderr):
+    "total import time and import time per top level package in seconds from -X importtime output"
+    total = 0.0
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:") :].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_time) * 1e-6
+        if not name.startswith("  "):
+            # top level entries include the time of everything imported below them
+            total += int(cumulative) * 1e-6
+    return total, packages
+
+
+def time_import(statement):
+    command = [sys.executable, "-X", "importtime", "-c", statement]
+    proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        return None, proc.stderr.strip().splitlines()[-1]
+    return parse_importtime(proc.stderr), None
+
+
+def run_benchmark(repeats=3):
+    base, _ = time_import("pass")
+    base_total = base[0]
+
+    results = {}
+    for name, statement in targets.items():
+        totals = []
+        packages = {}
+        error = None
+        for _ in range(repeats):
+            timing, error = time_import(statement)
+            if timing is None:
+                break
+            totals.append(timing[0] - base_total)
+            packages = timing[1]
+
+        if error is not None:
+            print("%s failed: %s" % (name, error))
+            results[name] = {"error": error}
+            continue
+
+        heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:10]
+        results[name] = {
+            "median": float(numpy.median(totals)),
+            "min": float(numpy.min(totals)),
+            "packages": dict(heaviest),
+        }
+        print("%s  %.3fs  %s" % (name, results[name]["median"], ", ".join("%s %.3f" % item for item in heaviest[:5])))
+    return results
+
+
+def environment():
+    return {
+        "version": version.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def compare(baseline, results, factor=regression_factor):
+    "return a list of (name, baseline median, new median) for every target that got slower by more than factor"
+    regressions = []
+    for name in sorted(baseline.keys() & results.keys()):
+        old = baseline[name].get("median", None)
+        new = results[name].get("median", None)
+        if old is not None and new is not None and new > old * factor:
+            regressions.append((name, old, new))
+    return regressions
+
+
+def over_budget(results, budgets=budgets):
+    return [
+        (name, budget, results[name]["median"])
+        for name, budget in budgets.items()
+        if "median" in results.get(name, {}) and results[name]["median"] > budget
+    ]
+
+
+def main(directory, repeats=3, update=False):
+    """write benchmark_imports.json to directory, returns 1 if a target regressed or is over its budget. The baseline
+    is only replaced when the check passes or update is set"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    baseline_path = directory / "benchmark_imports.json"
+
+    results = run_benchmark(repeats=repeats)
+
+    failed = False
+    if baseline_path.exists():
+        with baseline_path.open() as json_data:
+            baseline = json.load(json_data)
+        regressions = compare(baseline["results"], results)
+        for name, old, new in regressions:
+            print("regression %s  %.3fs -> %.3fs (%.2fx)" % (name, old, new, new / old))
+        if not regressions:
+            print("no regressions compared to %s" % baseline_path)
+        failed = bool(regressions)
+
+    for name, budget, new in over_budget(results):
+        print("over budget %s  %.3fs > %.3fs" % (name, new, budget))
+        failed = True
+
+    if failed and not update:
+        print("%s was not replaced, use --benchmark_update to accept the new timings" % baseline_path)
+    else:
+        with baseline_path.open("w") as json_data:
+            json.dump({"environment": environment(), "results": results}, json_data, indent=4, sort_keys=True)
+
+    return int(failed)
+
+
+if __name__ == "__main__":
+    benchmark_repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    benchmark_update = bool(int(sys.argv[3])) if len(sys.argv) > 3 else False
+    sys.exit(main(sys.argv[1], benchmark_repeats, benchmark_update))
@@ -0,0 +1,340 @@
+"Time the Pareto front updates and progress checks of the main process against the member by member reference implementation"
+
+import bisect
+import copy
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+import numpy
+
+import CADETMatch.pareto as pareto
+import CADETMatch.pop as pop
+import CADETMatch.version as version
+
+# name -> number of objectives, slice the domination is tested on, similar_fit
+cases = {
+    "scores": (6, slice(None), pareto.similar),
+    "meta": (4, slice(0, 3, 1), pareto.similar_fit_meta_split),
+}
+
+population_sizes = [100, 500]
+generations = 10
+parameters = 5
+
+# box size of the epsilon front cases
+epsilon_box = 0.05
+
+regression_factor = 1.25
+
+
+class ReferenceFront:
+    "the Pareto front update as it was before the front was stored in arrays, kept to check the results are identical"
+
+    def __init__(self, dimensions, similar, similar_fit, slice_object=slice(None)):
+        self.similar = similar
+        self.similar_fit = similar_fit
+        self.slice_object = slice_object
+        self.keys = []
+        self.items = []
+        self.dimensions = dimensions
+        self.best_keys = [1e308] * dimensions
+        self.best_items = [None] * dimensions
+
+    def __len__(self):
+        return len(self.items)
+
+    def insert(self, item):
+        item = copy.deepcopy(item)
+        i = bisect.bisect(self.keys, item.fitness)
+        self.items.insert(i, item)
+        self.keys.insert(i, item.fitness)
+
+    def remove(self, index):
+        del self.keys[index]
+        del self.items[index]
+
+    def update(self, population):
+        new_members = []
+        significant = []
+        slice_object = self.slice_object
+        pareto_length = len(self)
+
+        for ind in population:
+            is_dominated = False
+            dominates_one = False
+            has_twin = False
+            to_remove = []
+
+            for idx in range(len(ind.fitness.values)):
+                if ind.fitness.values[idx] < self.best_keys[idx]:
+                    self.best_keys[idx] = ind.fitness.values[idx]
+                    self.best_items[idx] = copy.deepcopy(ind)
+
+            for i, hofer in enumerate(self.items):
+                if not dominates_one and hofer.fitness.dominates(ind.fitness, obj=slice_object):
+                    is_dominated = True
+                    break
+                elif ind.fitness.dominates(hofer.fitness, obj=slice_object):
+                    dominates_one = True
+                    to_remove.append(i)
+                    significant.append(not self.similar_fit(ind.fitness.values, hofer.fitness.values))
+                elif self.similar_fit(ind.fitness.values, hofer.fitness.values) and self.similar(
+                    ind.value, hofer.value
+                ):
+                    has_twin = True
+                    break
+
+            for i in reversed(to_remove):
+                self.remove(i)
+            if not is_dominated and not has_twin:
+                if pareto_length == 0:
+                    significant.append(True)
+                elif self.dimensions > 1:
+                    if len(significant) == 0 or (len(significant) and any(significant)):
+                        significant.append(True)
+
+                self.insert(ind)
+                new_members.append(ind)
+
+        return new_members, any(significant)
+
+
+def create_generations(population_size, dimensions, seed=1):
+    """populations that move towards a curved front over the generations, a tenth of every population repeats an
+    earlier individual with a slightly changed fitness so twins and near ties are exercised"""
+    rng = numpy.random.default_rng(seed)
+    populations = []
+    previous = []
+    for generation in range(generations):
+        directions = rng.dirichlet(numpy.ones(dimensions), population_size)
+        distance = 1.0 - 0.5 * generation / generations + 0.2 * rng.random((population_size, 1))
+        fitness = distance * numpy.sqrt(directions)
+        values = rng.random((population_size, parameters))
+
+        if previous:
+            repeats = rng.integers(0, len(previous), population_size // 10)
+            for row, idx in enumerate(repeats):
+                values[row], fitness[row] = previous[idx]
+                fitness[row] = fitness[row] * (1.0 + 1e-3 * rng.standard_normal(dimensions))
+
+        previous.extend(zip(values.copy(), fitness.copy()))
+        populations.append(
+            [pop.Individual(value, fitness=fit) for value, fit in zip(values, fitness)]
+        )
+    return populations
+
+
+def run_front(front, populations):
+    "update front one individual at a time as util.process_population does"
+    decisions = []
+    start = time.perf_counter()
+    for population in populations:
+        for ind in population:
+            decisions.append(pareto.updateParetoFront(front, ind))
+    return time.perf_counter() - start, decisions
+
+
+def front_state(front):
+    items = [(tuple(item.value), tuple(item.fitness.values)) for item in front.items]
+    best = [None if item is None else tuple(item.value) for item in front.best_items]
+    return items, best
+
+
+def run_progress(front, population, reference):
+    """significance of every individual of a population against an unchanged front the way util.process_population
+    asked for it before (update a deepcopy of the front) and with the read only query"""
+    start = time.perf_counter()
+    if reference:
+        decisions = [pareto.updateParetoFront(copy.deepcopy(front), ind)[1] for ind in population]
+    else:
+        decisions = [front.is_significant(ind) for ind in population]
+    return time.perf_counter() - start, decisions
+
+
+def benchmark_progress(reference, front, population, repeats):
+    "compare the significance of the last generation against the front built from the earlier ones"
+    reference_times = []
+    new_times = []
+    identical = True
+    for _ in range(repeats):
+        elapsed, reference_decisions = run_progress(reference, population, True)
+        reference_times.append(elapsed)
+
+        elapsed, decisions = run_progress(front, population, False)
+        new_times.append(elapsed)
+
+        identical = (
+            identical
+            and decisions == reference_decisions
+            and list(front.significant_mask(population)) == reference_decisions
+        )
+    return {
+        "reference": {"min": min(reference_times), "median": float(numpy.median(reference_times))},
+        "vectorized": {"min": min(new_times), "median": float(numpy.median(new_times))},
+        "speedup": float(numpy.median(reference_times) / numpy.median(new_times)),
+        "front_size": len(front),
+        "evaluations": len(population),
+        "identical": identical,
+    }
+
+
+def benchmark_epsilon(dimensions, slice_object, similar_fit, populations, epsilon, repeats):
+    """time an epsilon box front and check that no two members share a box and no member box dominates another"""
+    times = []
+    for _ in range(repeats):
+        front = pareto.ParetoFront(
+            dimensions=dimensions,
+            similar=pareto.similar,
+            similar_fit=similar_fit,
+            slice_object=slice_object,
+            epsilon=epsilon,
+        )
+        elapsed, decisions = run_front(front, copy.deepcopy(populations))
+        times.append(elapsed)
+
+    boxes = numpy.floor(front.fitness_matrix[:, slice_object] / epsilon)
+    better = (boxes[:, numpy.newaxis, :] < boxes[numpy.newaxis, :, :]).any(axis=2)
+    worse = (boxes[:, numpy.newaxis, :] > boxes[numpy.newaxis, :, :]).any(axis=2)
+    valid = len(front.boxes) == len(front) and not numpy.any(better & ~worse)
+    return {
+        "vectorized": {"min": min(times), "median": float(numpy.median(times))},
+        "front_size": len(front),
+        "evaluations": sum(len(population) for population in populations),
+        "valid": bool(valid),
+    }
+
+
+def benchmark_case(dimensions, slice_object, similar_fit, population_size, repeats):
+    populations = create_generations(population_size, dimensions)
+
+    reference_times = []
+    new_times = []
+    identical = True
+    front_size = 0
+    for _ in range(repeats):
+        reference = ReferenceFront(dimensions, pareto.similar, similar_fit, slice_object)
+        front = pareto.ParetoFront(
+            dimensions=dimensions, similar=pareto.similar, similar_fit=similar_fit, slice_object=slice_object
+        )
+
+        elapsed, reference_decisions = run_front(reference, copy.deepcopy(populations))
+        reference_times.append(elapsed)
+
+        elapsed, decisions = run_front(front, copy.deepcopy(populations))
+        new_times.append(elapsed)
+
+        identical = identical and decisions == reference_decisions and front_state(front) == front_state(reference)
+        front_size = len(front)
+
+    update = {
+        "reference": {"min": min(reference_times), "median": float(numpy.median(reference_times))},
+        "vectorized": {"min": min(new_times), "median": float(numpy.median(new_times))},
+        "speedup": float(numpy.median(reference_times) / numpy.median(new_times)),
+        "front_size": front_size,
+        "evaluations": population_size * generations,
+        "identical": identical,
+    }
+
+    # the progress check is done against the front of all but the last generation
+    reference = ReferenceFront(dimensions, pareto.similar, similar_fit, slice_object)
+    front = pareto.ParetoFront(
+        dimensions=dimensions, similar=pareto.similar, similar_fit=similar_fit, slice_object=slice_object
+    )
+    run_front(reference, copy.deepcopy(populations[:-1]))
+    run_front(front, copy.deepcopy(populations[:-1]))
+    progress = benchmark_progress(reference, front, populations[-1], repeats)
+
+    epsilon = benchmark_epsilon(dimensions, slice_object, similar_fit, populations, epsilon_box, repeats)
+
+    return {"update": update, "progress": progress, "epsilon": epsilon}
+
+
+def run_benchmark(population_sizes=population_sizes, repeats=3):
+    results = {}
+    for name, (dimensions, slice_object, similar_fit) in cases.items():
+        for population_size in population_sizes:
+            timings = benchmark_case(dimensions, slice_object, similar_fit, population_size, repeats)
+            for stage, timing in timings.items():
+                case = "%s/p%d/%s" % (name, population_size, stage)
+                results[case] = timing
+                if "reference" in timing:
+                    print(
+                        "%s  reference %.3fs  vectorized %.3fs  speedup %.1fx  front %d  identical %s"
+                        % (
+                            case,
+                            timing["reference"]["median"],
+                            timing["vectorized"]["median"],
+                            timing["speedup"],
+                            timing["front_size"],
+                            timing["identical"],
+                        )
+                    )
+                else:
+                    print(
+                        "%s  %.3fs  front %d  valid %s"
+                        % (case, timing["vectorized"]["median"], timing["front_size"], timing["valid"])
+                    )
+    return results
+
+
+def environment():
+    return {
+        "version": version.__version__,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def compare(baseline, results, factor=regression_factor):
+    "return a list of (case, baseline median, new median) for every case where the vectorized front got slower"
+    regressions = []
+    for case in sorted(baseline.keys() & results.keys()):
+        old = baseline[case]["vectorized"]["median"]
+        new = results[case]["vectorized"]["median"]
+        if new > old * factor:
+            regressions.append((case, old, new))
+    return regressions
+
+
+def main(directory, population_sizes=population_sizes, repeats=3):
+    "write benchmark_pareto.json to directory, returns 1 if a result differs from the reference or a case regressed"
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    baseline_path = directory / "benchmark_pareto.json"
+
+    results = run_benchmark(population_sizes=population_sizes, repeats=repeats)
+
+    failed = False
+    for case, result in results.items():
+        if not result.get("identical", True):
+            print("%s differs from the reference front" % case)
+            failed = True
+        if not result.get("valid", True):
+            print("%s has members that share or box dominate each other" % case)
+            failed = True
+
+    if baseline_path.exists():
+        with baseline_path.open() as json_data:
+            baseline = json.load(json_data)
+        regressions = compare(baseline["results"], results)
+        for case, old, new in regressions:
+            print("regression %s  %.3fs -> %.3fs (%.2fx)" % (case, old, new, new / old))
+        if not regressions:
+            print("no regressions compared to %s" % baseline_path)
+        failed = failed or bool(regressions)
+
+    with baseline_path.open("w") as json_data:
+        json.dump({"environment": environment(), "results": results}, json_data, indent=4, sort_keys=True)
+
+    return int(failed)
+
+
+if __name__ == "__main__":
+    benchmark_sizes = [int(i) for i in sys.argv[2].split(",")] if len(sys.argv) > 2 else population_sizes
+    benchmark_repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    sys.exit(main(sys.argv[1], benchmark_sizes, benchmark_repeats))
@@ -0,0 +1,287 @@
+"Time the scoring hot path (score plugin setup/run and the smoothing/similarity helpers) on synthetic chromatograms"
+
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy
+import pandas
+import scipy.interpolate
+import scipy.special
+from cadet import H5
+
+import CADETMatch.plugins as plugins
+import CADETMatch.score as score
+import CADETMatch.smoothing as smoothing
+import CADETMatch.util as util
+import CADETMatch.version as version
+
+score_names = [
+    "Shape",
+    "ShapeFront",
+    "ShapeBack",
+    "ShapeDecay",
+    "DextranShape",
+    "fractionationSlide",
+    "curve",
+    "similarity",
+]
+
+lengths = [1000, 10000, 50000, 200000]
+noise_levels = [0.0, 1e-3, 1e-2]
+peak_shapes = ["gaussian", "tailing", "breakthrough"]
+
+end_time = 1000.0
+sim_shift = 5.0
+sim_scale = 0.95
+output_path = "/output/solution/unit_001/solution_outlet_comp_000"
+unit_name = "unit_001"
+
+# a run is flagged as a regression when the median time grows by more than this factor compared to the baseline
+regression_factor = 1.25
+
+
+def peak(times, shape, center=400.0, width=30.0):
+    if shape == "gaussian":
+        return numpy.exp(-((times - center) ** 2) / (2 * width**2))
+    elif shape == "tailing":
+        # exponentially modified gaussian normalized to a maximum of 1
+        tau = 2.0 * width
+        values = numpy.exp(width**2 / (2 * tau**2) - (times - center) / tau) * scipy.special.erfc(
+            (width / tau - (times - center) / width) / numpy.sqrt(2)
+        )
+        return values / numpy.max(values)
+    elif shape == "breakthrough":
+        return 1.0 / (1.0 + numpy.exp(-(times - center) / (width / 4.0)))
+    raise ValueError("unknown peak shape %s" % shape)
+
+
+def create_chromatogram(length, shape, noise, seed=1):
+    "return times, noisy experimental values and noiseless shifted simulated values"
+    rng = numpy.random.default_rng(seed)
+    times = numpy.linspace(0, end_time, length)
+
+    exp_values = peak(times, shape)
+    exp_values = exp_values + rng.normal(0.0, noise, length) * numpy.max(exp_values)
+
+    sim_values = sim_scale * peak(times - sim_shift, shape)
+    return times, exp_values, sim_values
+
+
+def create_simulation(times, values):
+    sim = H5()
+    sim.root.experiment_name = "benchmark"
+    sim.root.output.solution.solution_times = times
+    sim[output_path] = values
+    return sim
+
+
+def create_fraction_csv(directory, times, values, fractions=20):
+    "write a fractionation csv for component 0 covering the region where the peak is"
+    selected = values > 1e-2 * numpy.max(values)
+    edges = numpy.linspace(times[selected][0], times[selected][-1], fractions + 1)
+
+    spline = scipy.interpolate.InterpolatedUnivariateSpline(times, values, ext=1)
+    fraction_values = util.fractionate_spline(edges[:-1], edges[1:], spline)
+
+    path = Path(directory) / "fractions.csv"
+    data = pandas.DataFrame({"Start": edges[:-1], "Stop": edges[1:], "0": fraction_values})
+    data.to_csv(path, index=False)
+    return path
+
+
+def create_feature(score_name, times, values, fraction_csv):
+    feature = {
+        "name": score_name,
+        "type": score_name,
+        "time": times,
+        "value": values,
+        "factor": 1.0,
+        "start": times[0],
+        "stop": times[-1],
+        "output_path": output_path,
+        "selected": (times >= times[0]) & (times <= times[-1]),
+    }
+    if score_name == "fractionationSlide":
+        feature["fraction_csv"] = fraction_csv.as_posix()
+        feature["unit_name"] = unit_name
+    return feature
+
+
+def time_call(func, repeats):
+    elapsed = []
+    result = None
+    for i in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        elapsed.append(time.perf_counter() - start)
+    return result, {
+        "min": min(elapsed),
+        "median": float(numpy.median(elapsed)),
+        "repeats": repeats,
+    }
+
+
+def benchmark_score(score_module, times, exp_values, sim_values, fraction_csv, repeats):
+    exp_sim = create_simulation(times, exp_values)
+    sim = create_simulation(times, sim_values)
+    feature = create_feature(score_module.name, times, exp_values, fraction_csv)
+
+    def setup():
+        return score_module.setup(exp_sim, feature, times, exp_values, 100.0, 1e-8, None)
+
+    setup_data, setup_time = time_call(setup, repeats)
+    feature.update(setup_data)
+
+    def run():
+        return score_module.run({"simulation": sim}, feature)
+
+    run_data, run_time = time_call(run, repeats)
+    return {"setup": setup_time, "run": run_time, "scores": list(map(float, run_data[0]))}
+
+
+def benchmark_functions(times, exp_values, sim_values, repeats):
+    s, crit_fs, crit_fs_der = smoothing.find_smoothing_factors(times, exp_values, None, None)
+
+    spline = scipy.interpolate.InterpolatedUnivariateSpline(times, sim_values, ext=1)
+    edges = numpy.linspace(times[0], times[-1], 101)
+
+    results = {}
+    results["smoothing.full_smooth"] = time_call(
+        lambda: smoothing.full_smooth(times, sim_values, crit_fs, s, crit_fs_der), repeats
+    )[1]
+    operator = smoothing.create_operator(times, exp_values, crit_fs, s, crit_fs_der)
+    if operator is not None:
+        results["smoothing.apply_operator"] = time_call(
+            lambda: smoothing.apply_operator(operator, sim_values), repeats
+        )[1]
+        results["smoothing.apply_operator"]["error"] = list(
+            smoothing.check_operator(operator, times, sim_values, crit_fs, s, crit_fs_der)
+        )
+    results["score.pearson_spline"] = time_call(
+        lambda: score.pearson_spline(times, sim_values, exp_values), repeats
+    )[1]
+    results["score.pearson_spline_grid"] = time_call(
+        lambda: score.pearson_spline_grid(times, exp_values, spline), repeats
+    )[1]
+    results["util.fractionate_spline"] = time_call(
+        lambda: util.fractionate_spline(edges[:-1], edges[1:], spline), repeats
+    )[1]
+    return results
+
+
+def case_name(shape, length, noise):
+    return "%s/n%d/noise%g" % (shape, length, noise)
+
+
+def warmup():
+    "run the numba kernels once so jit compilation is not counted in the first timing"
+    times, exp_values, sim_values = create_chromatogram(100, "gaussian", 0.0)
+    score.pearson_spline(times, sim_values, exp_values)
+
+
+def run_benchmark(lengths=lengths, noise_levels=noise_levels, peak_shapes=peak_shapes, repeats=3):
+    scores = plugins.get_plugins("scores")
+    warmup()
+
+    results = {"functions": {}, "scores": {}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for shape in peak_shapes:
+            for length in lengths:
+                for noise in noise_levels:
+                    case = case_name(shape, length, noise)
+                    times, exp_values, sim_values = create_chromatogram(length, shape, noise)
+                    fraction_csv = create_fraction_csv(directory, times, exp_values)
+
+                    print(case)
+
+                    for name, timing in benchmark_functions(times, exp_values, sim_values, repeats).items():
+                        results["functions"].setdefault(name, {})[case] = timing
+
+                    for score_name in score_names:
+                        try:
+                            timing = benchmark_score(
+                                scores[score_name], times, exp_values, sim_values, fraction_csv, repeats
+                            )
+                        except Exception as error:
+                            # some shapes are not valid for some scores (a breakthrough curve has no back side)
+                            timing = {"error": repr(error)}
+                        results["scores"].setdefault(score_name, {})[case] = timing
+    return results
+
+
+def environment():
+    return {
+        "version": version.__version__,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "scipy": scipy.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def flatten(results):
+    "map group/name/case/stage to the median time of every timing in a result set"
+    flat = {}
+    for group, entries in results.items():
+        for name, cases in entries.items():
+            for case, timing in cases.items():
+                if "median" in timing:
+                    flat["%s/%s/%s" % (group, name, case)] = timing["median"]
+                for stage in ("setup", "run"):
+                    if stage in timing:
+                        flat["%s/%s/%s/%s" % (group, name, case, stage)] = timing[stage]["median"]
+    return flat
+
+
+def compare(baseline, results, factor=regression_factor):
+    "return a list of (key, baseline median, new median) for every timing that got slower by more than factor"
+    old = flatten(baseline)
+    new = flatten(results)
+
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        if new[key] > old[key] * factor:
+            regressions.append((key, old[key], new[key]))
+    return regressions
+
+
+def main(directory, lengths=lengths, repeats=3, update=False):
+    """write benchmark_scores.json to directory, returns 1 if a timing regressed. The baseline is only replaced when
+    there are no regressions or update is set"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    baseline_path = directory / "benchmark_scores.json"
+
+    results = run_benchmark(lengths=lengths, repeats=repeats)
+
+    failed = False
+    if baseline_path.exists():
+        with baseline_path.open() as json_data:
+            baseline = json.load(json_data)
+        regressions = compare(baseline["results"], results)
+        for key, old, new in regressions:
+            print("regression %s  %.3es -> %.3es (%.2fx)" % (key, old, new, new / old))
+        if not regressions:
+            print("no regressions compared to %s" % baseline_path)
+        failed = bool(regressions)
+
+    if failed and not update:
+        print("%s was not replaced, use --benchmark_update to accept the new timings" % baseline_path)
+    else:
+        with baseline_path.open("w") as json_data:
+            json.dump({"environment": environment(), "results": results}, json_data, indent=4, sort_keys=True)
+
+    return int(failed)
+
+
+if __name__ == "__main__":
+    benchmark_lengths = [int(i) for i in sys.argv[2].split(",")] if len(sys.argv) > 2 else lengths
+    benchmark_repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    benchmark_update = bool(int(sys.argv[4])) if len(sys.argv) > 4 else False
+    sys.exit(main(sys.argv[1], benchmark_lengths, benchmark_repeats, benchmark_update))
@@ -8,9 +8,11 @@ from pathlib import Path
 import jstyleson
 import numpy
 from cadet import Cadet
-from sklearn import preprocessing
 
+import CADETMatch.h5store as h5store
 import CADETMatch.plugins as plugins
+import CADETMatch.score as score
+import CADETMatch.smoothing as smoothing
 
 class Node:
     pass
@@ -41,6 +43,10 @@ class Cache:
         self.lastProgressGeneration = -1
         self.generationsOfProgress = 0
         self.fullTrainingData = 0
+        self.simulationArchive = False
+        self.resultStorage = None
+        self.metaCSVTime = 300
+        self.replayArchive = None
         self.normalizeOutput = True
         self.sobolGeneration = True
         self.continueMCMC = False
@@ -132,6 +138,21 @@ class Cache:
 
         self.errorBias = bool(self.settings.get("errorBias", True))
 
+        # time offset search used by the pearson based scores: fft, fft_parabolic, grid or validate
+        self.offsetSearch = self.settings.get("offsetSearch", "fft")
+        score.offset_search = self.offsetSearch
+
+        score.setup_numba(self.settings["resultsDirMisc"] / "numba")
+
+        # replace the per simulation smoothing spline with precomputed linear operators where they reproduce full_smooth,
+        # the operators use the knots of the experimental spline so simulations unlike the experiment are smoothed
+        # differently and it has to be turned on explicitly
+        self.smoothingOperator = bool(self.settings.get("smoothingOperator", False))
+        self.smoothingOperatorTol = float(self.settings.get("smoothingOperatorTol", 2e-2))
+
+        # have CADET write the outlet time derivative and use it for the derivative scores
+        self.simulationDerivative = bool(self.settings.get("simulationDerivative", False))
+
         Cadet.cadet_path = self.settings["CADETPath"]
 
         self.normalizeOutput = bool(self.settings.get("normalizeOutput", False))
@@ -170,6 +191,8 @@ class Cache:
         self.graphMetaTime = int(self.settings.get("graphMetaTime", 1200))
 
         self.metaResultsOnly = self.settings.get("metaResultsOnly", 1)
+        # box size for each meta objective used for domination, None keeps every non dominated individual
+        self.metaEpsilon = self.settings.get("metaEpsilon", None)
         self.stallGenerations = int(self.settings.get("stallGenerations", 10))
         self.stallCorrect = int(self.settings.get("stallCorrect", 5))
         self.progressCorrect = int(self.settings.get("progressCorrect", 5))
@@ -178,6 +201,15 @@ class Cache:
         )
 
         self.fullTrainingData = int(self.settings.get("fullTrainingData", 0))
+        self.simulationArchive = bool(self.settings.get("simulationArchive", False))
+        self.resultFlushTime = float(self.settings.get("resultFlushTime", 30))
+        self.metaCSVTime = float(self.settings.get("metaCSVTime", 300))
+        self.resultStorage = h5store.storage_options(self.settings.get("resultStorage", None))
+
+        # individuals found in a finished simulation archive are scored from it instead of simulated
+        self.replayArchive = self.settings.get("replayArchive", None)
+        if self.replayArchive is not None:
+            self.replayArchive = Path(self.replayArchive).as_posix()
 
         self.sobolGeneration = bool(
             self.settings.get("soboloGeneration", True)
@@ -420,8 +452,27 @@ class Cache:
         self.target = {}
         self.adaptive = True
 
-        for experiment in self.settings["experiments"]:
-            self.target[experiment["name"]] = self.setupExperiment(experiment)
+        # with a pool available missing smoothing factors are collected from all features and found in parallel,
+        # the targets are then built again from the cached factors
+        if (
+            getattr(self, "map_function", None) is not None
+            and multiprocessing.parent_process() is None
+        ):
+            smoothing.pending = []
+
+        try:
+            while True:
+                for experiment in self.settings["experiments"]:
+                    self.target[experiment["name"]] = self.setupExperiment(experiment)
+
+                if not smoothing.pending:
+                    break
+
+                smoothing.find_pending(smoothing.pending, self)
+                smoothing.pending = []
+        finally:
+            smoothing.pending = None
+
         if "errorModel" in self.settings:
             self.add_units_error_model(self.settings["errorModel"], self.target)
 
@@ -567,17 +618,20 @@ class Cache:
                 self.add_units_isotherm(units_used, feature["unit_name"])
 
             if featureType in self.scores:
-                temp[featureName].update(
-                    self.scores[featureType].setup(
-                        sim,
-                        feature,
-                        selectedTimes,
-                        selectedValues,
-                        CV_time,
-                        abstol,
-                        self,
+                try:
+                    temp[featureName].update(
+                        self.scores[featureType].setup(
+                            sim,
+                            feature,
+                            selectedTimes,
+                            selectedValues,
+                            CV_time,
+                            abstol,
+                            self,
+                        )
                     )
-                )
+                except smoothing.SmoothingPending:
+                    continue
                 settings = self.scores[featureType].get_settings(feature)
                 self.adaptive = settings.adaptive
                 if "peak_max" in temp[featureName]:
@@ -585,6 +639,9 @@ class Cache:
                         temp[featureName]["peak_max"] / temp[featureName]["factor"]
                     )
 
+        if smoothing.pending:
+            return temp
+
         temp["smallest_peak"] = min(peak_maxes)
         temp["largest_peak"] = max(peak_maxes)
 
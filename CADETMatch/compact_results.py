@@ -0,0 +1,97 @@
+"""Rewrite the HDF5 files of a finished run with the chunking and compression of a resultStorage block so they take less
+space, datasets are copied block by block so files larger than memory can be compacted"""
+
+import os
+import sys
+import warnings
+from pathlib import Path
+
+import CADETMatch.h5store as h5store
+
+with warnings.catch_warnings():
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    import h5py
+
+# rows copied at once for datasets that are chunked along the first axis
+block_rows = 1 << 16
+
+
+def copy_attrs(source, destination):
+    for key, value in source.attrs.items():
+        destination.attrs[key] = value
+
+
+def copy_dataset(source, parent, name, options):
+    if source.ndim == 0 or source.dtype.kind not in "biufc" or 0 in source.shape[1:]:
+        source.file.copy(source, parent, name=name)
+        return
+
+    # the stored dtype and chunk shape, the compacted file is written at once so chunks of datasets that are appended
+    # to can be as long as chunkRows
+    resizable = source.maxshape != source.shape
+    sample, kwargs = h5store.dataset_options(
+        options,
+        source[:1],
+        source.name,
+        chunked=source.nbytes >= options["minimumBytes"],
+        rows=None if resizable else source.shape[0],
+    )
+    maxshape = source.maxshape if resizable else None
+    destination = parent.create_dataset(name, shape=source.shape, dtype=sample.dtype, maxshape=maxshape, **kwargs)
+    for start in range(0, source.shape[0], block_rows):
+        destination[start : start + block_rows] = source[start : start + block_rows]
+    copy_attrs(source, destination)
+
+
+def copy_group(source, destination, options):
+    for name, item in source.items():
+        if isinstance(item, h5py.Group):
+            group = destination.create_group(name)
+            copy_attrs(item, group)
+            copy_group(item, group, options)
+        else:
+            copy_dataset(item, destination, name, options)
+
+
+def compact_file(path, options):
+    "rewrite path with options, the file is replaced only after the copy is complete, returns the sizes before and after"
+    path = Path(path)
+    temp = path.with_name(path.name + ".compact")
+    before = path.stat().st_size
+    with h5py.File(path, "r") as old, h5py.File(temp, "w", libver="latest") as new:
+        copy_attrs(old, new)
+        copy_group(old, new, options)
+    os.replace(temp, path)
+    return before, path.stat().st_size
+
+
+def result_files(path):
+    path = Path(path)
+    if path.is_file():
+        return [path]
+    return sorted(path.rglob("*.h5"))
+
+
+def main(path, compression="gzip", level=4, float32=False):
+    options = h5store.storage_options(
+        {"compression": None if compression == "none" else compression, "compressionLevel": level, "float32": float32}
+    )
+
+    total_before = 0
+    total_after = 0
+    for filename in result_files(path):
+        try:
+            before, after = compact_file(filename, options)
+        except OSError as error:
+            print("skipped %s: %s" % (filename, error))
+            continue
+        total_before += before
+        total_after += after
+        print("%s  %.1f MB -> %.1f MB" % (filename, before / 2**20, after / 2**20))
+
+    print("total  %.1f MB -> %.1f MB" % (total_before / 2**20, total_after / 2**20))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1], sys.argv[2], int(sys.argv[3]), bool(int(sys.argv[4]))))
@@ -1,9 +1,13 @@
+import functools
 import multiprocessing
+import time
 from pathlib import Path
 
 import numpy
 from cadet import Cadet
 
+import CADETMatch.archive as archive
+import CADETMatch.artifacts as artifacts
 import CADETMatch.cache as cache
 import CADETMatch.progress as progress
 import CADETMatch.score_calc as score_calc
@@ -31,29 +35,61 @@ def fitness(individual, json_path, run_experiment=None):
     )
 
 
+def fitness_replay(individual, json_path, archive_path):
+    "score the archived simulation of individual instead of simulating it"
+    runner = functools.partial(runExperimentReplay, archive_path=archive_path)
+    return fitness_base(runner, "simulation", individual, json_path, None)
+
+
+# one cache per bootstrap sample so a process can score against all samples at once
+bootstrap_caches = {}
+
+
+def get_bootstrap_cache(json_path):
+    if json_path not in bootstrap_caches:
+        sample_cache = cache.Cache()
+        sample_cache.setup_dir(json_path)
+        sample_cache.setup(json_path)
+        bootstrap_caches[json_path] = sample_cache
+    return bootstrap_caches[json_path]
+
+
+def fitness_bootstrap(individual, json_paths, archive_path):
+    "score the archived simulation of individual against every bootstrap sample, returns the min score per sample"
+    runner = functools.partial(runExperimentReplay, archive_path=archive_path)
+    scores = []
+    for json_path in json_paths:
+        sample_cache = get_bootstrap_cache(json_path)
+        sample_scores = fitness_cache(runner, "simulation", individual, sample_cache)[0]
+        scores.append(min(sample_scores))
+    return tuple(individual), scores
+
+
 def fitness_base(runner, template_name, individual, json_path, run_experiment):
     if json_path != cache.cache.json_path:
         cache.cache.setup_dir(json_path)
         util.setupLog(cache.cache.settings["resultsDirLog"], "main.log")
         cache.cache.setup(json_path)
 
-    if run_experiment is None:
-        run_experiment = runExperiment
+    return fitness_cache(runner, template_name, individual, cache.cache)
+
 
+def fitness_cache(runner, template_name, individual, local_cache):
+    "evaluate individual against the experiments and scores of local_cache"
     scores = []
     error = 0.0
     exp_values = []
     sim_values = []
 
     results = {}
-    for experiment in cache.cache.settings["experiments"]:
+    for experiment in local_cache.settings["experiments"]:
         result = runner(
             individual,
             template_name,
             experiment,
-            cache.cache.settings,
-            cache.cache.target,
-            cache.cache,
+            local_cache.settings,
+            local_cache.target,
+            local_cache,
         )
         if result is not None:
             results[experiment["name"]] = result
@@ -63,7 +99,7 @@ def fitness_base(runner, template_name, individual, json_path, run_experiment):
             sim_values.extend(result["sim_value"])
             exp_values.extend(result["exp_value"])
         else:
-            return cache.cache.WORST, [], cache.cache.WORST_META, None, individual
+            return local_cache.WORST, [], local_cache.WORST_META, None, individual
 
     rmse = score_calc.rmse_combine(exp_values, sim_values)
 
@@ -72,7 +108,7 @@ def fitness_base(runner, template_name, individual, json_path, run_experiment):
 
     # human scores
     meta_score = numpy.concatenate(
-        [util.calcMetaScores(scores, cache.cache), [error, rmse]]
+        [util.calcMetaScores(scores, local_cache), [error, rmse]]
     )
 
     for result in results.values():
@@ -90,6 +126,65 @@ def fitness_base(runner, template_name, individual, json_path, run_experiment):
     return scores, csv_record, meta_score, results, tuple(individual)
 
 
+def calibrate_template(job, json_path):
+    "time one solve of a saved template, its timeout is derived from the elapsed time"
+    path, name = job
+    if json_path != cache.cache.json_path:
+        cache.cache.setup_dir(json_path)
+        util.setupLog(cache.cache.settings["resultsDirLog"], "main.log")
+        cache.cache.setup(json_path)
+
+    for experiment in cache.cache.settings["experiments"]:
+        if experiment["name"] == name:
+            break
+
+    simulation = Cadet()
+    simulation.filename = path
+    simulation.load()
+
+    start = time.time()
+    util.runExperiment(
+        None,
+        experiment,
+        cache.cache.settings,
+        cache.cache.target,
+        simulation,
+        experiment.get("timeout", 1800),
+        cache.cache,
+    )
+    return path, time.time() - start
+
+
+def calibrate_templates(templates, cache):
+    "save the (simulation, experiment name) templates and time their solves concurrently, returns filename -> elapsed"
+    elapsed = {}
+    keys = {}
+    jobs = []
+    for simulation, name in templates:
+        simulation.save()
+
+        # the solve time only depends on the simulation and the CADET build, not on the timeout stored in it
+        root = {key: value for key, value in simulation.root.items() if key != "timeout"}
+        key = artifacts.artifact_key(
+            "calibration", root, cache.settings["CADETPath"], cache.settings.get("nThreads", 1)
+        )
+        stored = None
+        if artifacts.enabled(cache):
+            stored = artifacts.load_arrays(cache, "calibration", key)
+        if stored is not None:
+            elapsed[simulation.filename] = float(stored.elapsed)
+        else:
+            keys[simulation.filename] = key
+            jobs.append((simulation.filename, name))
+
+    evaluate = functools.partial(calibrate_template, json_path=cache.json_path)
+    for path, time_elapsed in cache.map_function(evaluate, jobs):
+        elapsed[path] = time_elapsed
+        artifacts.save_arrays(cache, "calibration", keys[path], {"elapsed": time_elapsed})
+
+    return elapsed
+
+
 def saveExperiments(save_name_base, settings, target, results):
     return util.saveExperiments(
         save_name_base,
@@ -120,29 +215,66 @@ def runExperimentFinal(individual, template_name, experiment, settings, target,
 
 
 def runExperiment(individual, template_name, experiment, settings, target, cache):
+    if cache.replayArchive is not None and archive.contains(
+        cache.replayArchive, individual
+    ):
+        return runExperimentReplay(
+            individual,
+            template_name,
+            experiment,
+            settings,
+            target,
+            cache,
+            cache.replayArchive,
+        )
+
     sim_name = "template_%s.h5" % experiment["name"]
     return runExperimentBase(
         sim_name, template_name, individual, experiment, settings, target, cache
     )
 
 
-def runExperimentBase(
-    sim_name, template_name, individual, experiment, settings, target, cache
-):
+def get_template(sim_name, template_name, experiment, settings):
+    "load the template simulation once per process and keep it on the experiment"
     if template_name not in experiment:
         templatePath = Path(settings["resultsDirMisc"], sim_name)
         templateSim = Cadet()
         templateSim.filename = templatePath.as_posix()
         templateSim.load()
         experiment[template_name] = templateSim
+    return experiment[template_name]
+
+
+def runExperimentReplay(
+    individual, template_name, experiment, settings, target, cache, archive_path
+):
+    solution = archive.get_solution(archive_path, individual, experiment["name"])
+    if solution is None:
+        multiprocessing.get_logger().warn(
+            "%s not found in simulation archive %s", individual, archive_path
+        )
+        return None
+
+    sim_name = "template_%s.h5" % experiment["name"]
+    template = get_template(sim_name, template_name, experiment, settings)
+
+    return util.replayExperiment(
+        individual, experiment, settings, target, template, solution, cache
+    )
+
+
+def runExperimentBase(
+    sim_name, template_name, individual, experiment, settings, target, cache
+):
+    template = get_template(sim_name, template_name, experiment, settings)
 
     return util.runExperiment(
         individual,
         experiment,
         settings,
         target,
-        experiment[template_name],
-        experiment[template_name].root.timeout,
+        template,
+        template.root.timeout,
         cache,
     )
 
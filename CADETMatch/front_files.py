@@ -0,0 +1,126 @@
+"""Simulation files of front members. Individuals that join a front are collected during a generation and only the ones
+still on the front at the end of it are written, by the background writer, together with an index of the tolerances the
+files were simulated with"""
+
+import json
+import os
+from pathlib import Path
+
+import CADETMatch.background as background
+
+index_name = "front_index.json"
+
+# settings key of the directory -> file name pattern of the simulations of that front
+patterns = {
+    "resultsDirEvo": "%s_%s_EVO.h5",
+    "resultsDirMeta": "%s_%s_meta.h5",
+    "resultsDirGrad": "%s_%s_GRAD.h5",
+}
+
+# directory -> FrontFiles of the runs in this process
+fronts = {}
+
+class FrontFiles:
+    def __init__(self, cache, key):
+        self.directory = Path(cache.settings[key])
+        self.file_pattern = patterns[key]
+        self.experiments = [(experiment["name"], experiment["headers"]) for experiment in cache.settings["experiments"]]
+
+        # name -> results of the individuals that joined the front since the last commit
+        self.pending = {}
+
+        # name -> {experiment: abstol} of the stored files
+        self.index = load_index(self.directory)
+
+        # files left by an earlier run are only known after the directory has been scanned once
+        self.scanned = False
+
+    def add(self, save_name_base, results):
+        self.pending[save_name_base] = results
+
+    def commit(self, hof):
+        "write the pending individuals still on hof and remove the files of members that left it"
+        allowed = hof.hashes()
+        removed = [name for name in self.index if name not in allowed]
+        for name in removed:
+            del self.index[name]
+
+        writes = []
+        for name, results in self.pending.items():
+            if name not in allowed:
+                continue
+            tolerances = {
+                experimentName: float(results[experimentName]["simulation"].root.input.solver.time_integrator.abstol)
+                for experimentName, headers in self.experiments
+            }
+            if self.index.get(name, None) == tolerances:
+                continue
+            self.index[name] = tolerances
+            writes.append((name, results))
+        self.pending = {}
+
+        if writes or removed or not self.scanned:
+            background.submit(
+                write_front,
+                self.directory,
+                self.file_pattern,
+                self.experiments,
+                writes,
+                set(allowed) if removed or not self.scanned else None,
+                dict(self.index),
+            )
+            self.scanned = True
+
+
+def get_front(cache, key):
+    directory = Path(cache.settings[key]).as_posix()
+    if directory not in fronts:
+        fronts[directory] = FrontFiles(cache, key)
+    return fronts[directory]
+
+
+def load_index(directory):
+    path = directory / index_name
+    if not path.exists():
+        return {}
+    with path.open() as json_data:
+        return json.load(json_data)
+
+
+def write_front(directory, file_pattern, experiments, writes, allowed, index):
+    if allowed is not None:
+        remove_files(directory, allowed)
+
+    for name, results in writes:
+        for experimentName, headers in experiments:
+            simulation = results[experimentName]["simulation"]
+            try:
+                # for addict 2.4.0 otherwise when variables are set below it can't find __frozen even though it is not used
+                simulation.root.unfreeze()
+            except TypeError:
+                pass
+
+            for header, score in zip(headers, results[experimentName]["scores"]):
+                simulation.root.score[header] = score
+
+            # written under a temporary name so the graph processes never see a partial file
+            dst = directory / (file_pattern % (name, experimentName))
+            temp = dst.with_name(dst.name + ".tmp")
+            simulation.filename = temp.as_posix()
+            simulation.save()
+            os.replace(temp, dst)
+
+    temp = directory / (index_name + ".tmp")
+    with temp.open("w") as json_data:
+        json.dump(index, json_data)
+    os.replace(temp, directory / index_name)
+
+
+def remove_files(directory, allowed):
+    "remove every file of an individual that has a simulation file in directory and is not in allowed"
+    names = [entry.name for entry in os.scandir(directory) if entry.is_file()]
+    exists = {name.split("_", 1)[0] for name in names if name.endswith(".h5")}
+    remove = exists - allowed
+    for name in names:
+        if name.split("_", 1)[0] in remove:
+            (directory / name).unlink()
@@ -38,6 +38,7 @@ from matplotlib import figure
 from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
 from mpl_toolkits.mplot3d import Axes3D
 
+import CADETMatch.h5store as h5store
 import CADETMatch.loggerwriter as loggerwriter
 import CADETMatch.util as util
 from CADETMatch.cache import cache
@@ -78,9 +79,7 @@ def main():
 
         data_results = None
     else:
-        data_results = H5()
-        data_results.filename = result_h5.as_posix()
-        data_results.load(lock=True)
+        data_results = h5store.load_results(result_h5)
 
         data_mcmc = None
 
@@ -31,11 +31,12 @@ import numpy
 import pandas
 import scipy.interpolate
 from addict import Dict
-from cadet import H5, Cadet
+from cadet import Cadet
 from matplotlib import figure
 from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
 from mpl_toolkits.mplot3d import Axes3D
 
+import CADETMatch.h5store as h5store
 import CADETMatch.loggerwriter as loggerwriter
 import CADETMatch.smoothing as smoothing
 import CADETMatch.util as util
@@ -81,8 +82,8 @@ def main(map_function):
     # full generation 1 = 2D, 2 = 2D + 3D
     fullGeneration = int(sys.argv[2])
 
-    # load all data, all data that can be changed by the main process MUST be loaded and this point and the files locked
-    # this allows the main process to wait for data loading and then continue once complete
+    # load all data, all data that can be changed by the main process MUST be loaded at this point
+    # result.h5 is read in SWMR mode so the main process keeps writing while it is loaded
 
     resultDir = Path(cache.settings["resultsDirBase"])
     progress = resultDir / "progress.csv"
@@ -92,9 +93,8 @@ def main(map_function):
 
     progress_df = pandas.read_csv(progress)
 
-    result_data = H5()
-    result_data.filename = result_h5.as_posix()
-    result_data.load(
+    result_data = h5store.load_results(
+        result_h5,
         paths=[
             "/output",
             "/output_meta",
@@ -106,7 +106,6 @@ def main(map_function):
             "/confidence",
             "/distance_correct",
         ],
-        lock=True
     )
 
     graphMeta(cache, map_function)
@@ -1,5 +1,3 @@
-import csv
-import hashlib
 import multiprocessing
 import time
 from pathlib import Path
@@ -20,9 +18,7 @@ class GradientException(Exception):
     pass
 
 
-def create_template(
-    experiment, name, cache, settings, template_name, store_name
-):
+def create_template(experiment, name, cache, settings, template_name):
     simulationGrad = Cadet(experiment["simulation"].root)
     template_path_grad = Path(settings["resultsDirMisc"], template_name % name)
     simulationGrad.filename = template_path_grad.as_posix()
@@ -31,50 +27,49 @@ def create_template(
         simulationGrad.root.input.solver.time_integrator.abstol = util.get_grad_tolerance(cache, name)
         simulationGrad.root.input.solver.time_integrator.reltol = 0.0
 
-    start = time.time()
-    util.runExperiment(
-        None,
-        experiment,
-        cache.settings,
-        cache.target,
-        simulationGrad,
-        experiment.get("timeout", 1800),
-        cache,
-    )
-    elapsed = time.time() - start
-
-    # timeout needs to be stored in the template so all processes have it without calculating it
-    simulationGrad.root.timeout = max(10, elapsed * 50)
-    simulationGrad.save()
-
-    multiprocessing.get_logger().info("grad simulation took %s", elapsed)
-
-    multiprocessing.get_logger().info(
-        "grad %s abstol=%.3g  reltol=%.3g",
-        simulationGrad.filename,
-        simulationGrad.root.input.solver.time_integrator.abstol,
-        simulationGrad.root.input.solver.time_integrator.reltol,
-    )
-
-    experiment[store_name] = simulationGrad
+    return simulationGrad
 
 
 def setupTemplates(cache):
+    "setup the gradient templates, the calibration solves of all experiments run concurrently"
     settings = cache.settings
-    target = cache.target
 
+    templates = []
     for experiment in settings["experiments"]:
         name = experiment["name"]
 
-        create_template(
+        simulationGrad = create_template(
             experiment,
             name,
             cache,
             settings,
             "template_%s_grad.h5",
-            "simulationSens",
+        )
+        templates.append((experiment, simulationGrad))
+
+    elapsed = evo.calibrate_templates(
+        [(simulationGrad, experiment["name"]) for experiment, simulationGrad in templates],
+        cache,
+    )
+
+    for experiment, simulationGrad in templates:
+        # timeout needs to be stored in the template so all processes have it without calculating it
+        simulationGrad.root.timeout = max(10, elapsed[simulationGrad.filename] * 50)
+        simulationGrad.save()
+
+        multiprocessing.get_logger().info(
+            "grad simulation took %s", elapsed[simulationGrad.filename]
         )
 
+        multiprocessing.get_logger().info(
+            "grad %s abstol=%.3g  reltol=%.3g",
+            simulationGrad.filename,
+            simulationGrad.root.input.solver.time_integrator.abstol,
+            simulationGrad.root.input.solver.time_integrator.reltol,
+        )
+
+        experiment["simulationSens"] = simulationGrad
+
 
 def grad_score(values, cache):
     values = numpy.array(values)
@@ -113,7 +108,6 @@ def search(
 
     temp = []
     csv_lines = []
-    meta_csv_lines = []
 
     gradient_results = []
 
@@ -122,7 +116,6 @@ def search(
         newOffspring,
         temp,
         csv_lines,
-        meta_csv_lines,
         gradient_results,
         grad_hof,
         meta_hof,
@@ -141,7 +134,6 @@ def search(
             fineOffspring,
             temp,
             csv_lines,
-            meta_csv_lines,
             gradient_results,
             grad_hof,
             meta_hof,
@@ -163,16 +155,11 @@ def search(
     # flush before returning
     csvfile.flush()
 
-    path_meta_csv = cache.settings["resultsDirMeta"] / "results.csv"
-    with path_meta_csv.open("a", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_ALL)
-        writer.writerows(meta_csv_lines)
-
     if gradient_results:
         write_gradient_results(gradient_results, cache)
 
     util.cleanupFront(cache, None, meta_hof, grad_hof)
-    util.writeMetaFront(cache, meta_hof, path_meta_csv)
+    util.writeMetaFront(cache, meta_hof)
 
     return gradCheck, temp
 
@@ -181,7 +168,6 @@ def processOffspring(
     offspring,
     temp,
     csv_lines,
-    meta_csv_lines,
     gradient_results,
     grad_hof,
     meta_hof,
@@ -215,9 +201,7 @@ def processOffspring(
             except (AttributeError, numpy.linalg.LinAlgError):
                 csv_line[1] = ""
 
-            save_name_base = hashlib.md5(
-                str(list(ind)).encode("utf-8", "ignore")
-            ).hexdigest()
+            save_name_base = ind.hash
             ind.csv_line = [time.ctime(), save_name_base] + csv_line
 
             ind_meta = pop.Individual(ind)
@@ -235,7 +219,6 @@ def processOffspring(
                 onFrontMeta, significant = pareto.updateParetoFront(meta_hof, ind_meta)
                 new_meta.append(onFrontMeta)
                 if onFrontMeta:
-                    meta_csv_lines.append([time.ctime(), save_name_base] + csv_line)
                     util.processResultsMeta(save_name_base, ind, cache, results)
 
                     if significant:
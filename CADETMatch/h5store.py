@@ -0,0 +1,289 @@
+"""Long lived HDF5 writers. result.h5 is kept open in SWMR mode by the main process and flushed on a timer so graph
+and analysis processes can read it with load_results without waiting for the optimizer. Datasets are created with the
+chunking and compression of the resultStorage settings"""
+
+import atexit
+import contextlib
+import multiprocessing
+import os
+import time
+import warnings
+from pathlib import Path
+
+import filelock
+import numpy
+from addict import Dict
+from cadet import H5
+
+import CADETMatch.background as background
+
+with warnings.catch_warnings():
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    import h5py
+
+# path -> writer for the files this process keeps open
+writers = {}
+
+# defaults of the resultStorage settings block
+default_storage = {
+    "compression": None,
+    "compressionLevel": 4,
+    "shuffle": True,
+    "chunkRows": 1024,
+    "chunkBytes": 1 << 20,
+    "float32": False,
+    "minimumBytes": 1 << 16,
+}
+
+
+def storage_options(settings=None):
+    "resultStorage settings merged with the defaults"
+    options = dict(default_storage)
+    options.update(settings or {})
+    if options["compression"] not in (None, "gzip", "lzf"):
+        raise ValueError("resultStorage compression must be gzip, lzf or null not %s" % options["compression"])
+    return options
+
+
+def is_derived(name):
+    "datasets that are computed from other datasets in the same file, these can be stored as float32"
+    name = name.split("/")[-1]
+    return name.endswith(("_transform", "_transform_extended")) or "flat_chain" in name or name.startswith("distance_correct")
+
+
+def dataset_options(options, data, name="", chunked=True, rows=None):
+    """data converted for storage and the create_dataset keywords for it. Chunks hold whole rows and at most rows of
+    them, for datasets that are appended to this is the length of an append so every append fills complete chunks and
+    compressed chunks are not written again (HDF5 doesn't reuse the space of rewritten chunks)"""
+    data = numpy.asarray(data)
+    if options["float32"] and data.dtype == numpy.float64 and is_derived(name):
+        data = data.astype(numpy.float32)
+
+    if data.ndim == 0 or not chunked or 0 in data.shape[1:] or data.dtype.kind not in "biufc" or rows == 0:
+        return data, {}
+
+    row_bytes = data.itemsize * int(numpy.prod(data.shape[1:]))
+    chunk_rows = max(1, min(options["chunkRows"], options["chunkBytes"] // row_bytes))
+    if rows is not None:
+        chunk_rows = min(chunk_rows, rows)
+
+    kwargs = {"chunks": (chunk_rows,) + data.shape[1:]}
+    if options["compression"] is not None:
+        kwargs["compression"] = options["compression"]
+        kwargs["shuffle"] = bool(options["shuffle"])
+        if options["compression"] == "gzip":
+            kwargs["compression_opts"] = int(options["compressionLevel"])
+    return data, kwargs
+
+
+def create_rows(hf, name, data, options):
+    "dataset that is appended to along the first axis, data is the first append"
+    data = numpy.asarray(data)
+    data, kwargs = dataset_options(options, data, name, rows=max(1, len(data)))
+    hf.create_dataset(name, data=data, maxshape=(None,) + data.shape[1:], **kwargs)
+
+
+def create_array(hf, name, data, options):
+    "dataset with a fixed shape, only chunked and compressed when it is large enough to be worth it"
+    data = numpy.asarray(data)
+    data, kwargs = dataset_options(
+        options, data, name, chunked=data.nbytes >= options["minimumBytes"], rows=len(data) if data.ndim else None
+    )
+    hf.create_dataset(name, data=data, **kwargs)
+
+
+def save_group(hf, path, group, transform, options):
+    for key, item in group.items():
+        if item is None:
+            continue
+        name = path + transform(str(key))
+        if isinstance(item, dict):
+            save_group(hf, name + "/", item, transform, options)
+            continue
+        if isinstance(item, str):
+            item = numpy.array(item.encode("utf-8"))
+        elif isinstance(item, list) and item and all(isinstance(i, str) for i in item):
+            item = numpy.array([i.encode("utf-8") for i in item])
+        create_array(hf, name, item, options)
+
+
+def save_store(store, options, lock=True):
+    "H5.save with the chunking and compression of options for large arrays"
+    lock_file = filelock.FileLock(store.filename + ".lock") if lock else contextlib.nullcontext()
+    with lock_file:
+        with h5py.File(store.filename, "w") as hf:
+            save_group(hf, "/", store.root, store.transform, options)
+
+
+class ResultWriter:
+    "an HDF5 file kept open for SWMR writing, datasets can only be created while SWMR is off so that reopens the file"
+
+    def __init__(self, path, flush_interval):
+        self.path = Path(path).as_posix()
+        self.flush_interval = flush_interval
+        self.hf = None
+        self.last_flush = time.time()
+
+        # name -> data of datasets that are replaced completely so unchanged data is not written again
+        self.written = {}
+
+    def open(self, swmr):
+        self.close()
+        if Path(self.path).exists():
+            if not recover(self.path):
+                upgrade_format(self.path)
+        self.hf = h5py.File(self.path, "a", libver="latest")
+        if swmr:
+            self.hf.swmr_mode = True
+
+    def write(self, function, required, *args):
+        """call function(hf, *args), if the file is not open yet or datasets in required don't exist the file is
+        opened without SWMR for the change and switched to SWMR afterwards"""
+        if self.hf is None or (self.hf.swmr_mode and any(name not in self.hf for name in required)):
+            self.open(swmr=False)
+
+        function(self.hf, *args)
+
+        if not self.hf.swmr_mode:
+            self.hf.flush()
+            self.hf.swmr_mode = True
+            self.last_flush = time.time()
+        elif time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.hf is not None:
+            self.hf.flush()
+            self.last_flush = time.time()
+
+    def close(self):
+        if self.hf is not None:
+            self.hf.close()
+            self.hf = None
+
+
+def get_writer(path, flush_interval=30.0):
+    path = Path(path).as_posix()
+    if path not in writers:
+        writers[path] = ResultWriter(path, flush_interval)
+    writers[path].flush_interval = flush_interval
+    return writers[path]
+
+
+def flush_writers():
+    "queue a flush of every open writer after the writes submitted so far"
+    for writer in writers.values():
+        background.submit(writer.flush)
+
+
+def close_writers():
+    "flush and close every open writer, they are reopened by the next write"
+    background.wait()
+    for writer in writers.values():
+        writer.close()
+
+
+atexit.register(close_writers)
+
+
+def upgrade_format(path):
+    "SWMR needs the latest file format, files written by older versions are copied into it once"
+    with h5py.File(path, "r") as hf:
+        superblock = hf.id.get_create_plist().get_version()[0]
+    if superblock >= 3:
+        return
+
+    multiprocessing.get_logger().info("converting %s to the latest HDF5 format for SWMR", path)
+    rewrite_file(path)
+
+
+def recover(path):
+    """a writer that died while the file was open in SWMR mode leaves its status flags set and the file can't be
+    opened for writing again (h5clear -s). The file is copied with a SWMR reader, which ignores the flags, and
+    everything up to the last flush is kept. Returns True if the file had to be recovered"""
+    try:
+        with h5py.File(path, "r"):
+            return False
+    except OSError as error:
+        if "already open for write" not in str(error):
+            raise
+
+    multiprocessing.get_logger().warning("%s was not closed by the last run, recovering it", path)
+    rewrite_file(path, libver="latest", swmr=True)
+    return True
+
+
+def rewrite_file(path, **kwargs):
+    "copy path into a new file in the latest format and replace it"
+    temp = path + ".upgrade"
+    with h5py.File(path, "r", **kwargs) as old, h5py.File(temp, "w", libver="latest") as new:
+        for name in old:
+            old.copy(old[name], new, name=name)
+        for key, value in old.attrs.items():
+            new.attrs[key] = value
+    os.replace(temp, path)
+
+
+def load_group(group):
+    data = Dict()
+    for key, item in group.items():
+        if isinstance(item, h5py.Group):
+            data[key] = load_group(item)
+        else:
+            data[key] = item[()]
+    return data
+
+
+def load_file(hf, paths=None):
+    "content of an open file as a Dict, paths limits it to those datasets and groups like H5.load"
+    if paths is None:
+        return load_group(hf)
+
+    data = Dict()
+    for path in paths:
+        item = hf.get(path, None)
+        if item is None:
+            continue
+        node = data
+        parts = path.strip("/").split("/")
+        for part in parts[:-1]:
+            node = node[part]
+        node[parts[-1]] = load_group(item) if isinstance(item, h5py.Group) else item[()]
+    return data
+
+
+@contextlib.contextmanager
+def open_results(path, retries=5):
+    """a result file opened in SWMR mode so it can be read while it is written. Files this process is
+    writing are read through the open writer once the writes queued for it are done"""
+    path = Path(path).as_posix()
+    writer = writers.get(path, None)
+    if writer is not None:
+        background.wait()
+    if writer is not None and writer.hf is not None:
+        writer.flush()
+        yield writer.hf
+        return
+
+    for attempt in range(retries):
+        try:
+            hf = h5py.File(path, "r", libver="latest", swmr=True)
+            break
+        except OSError:
+            # the writer has the file open without SWMR for a moment when it adds datasets
+            if attempt == retries - 1:
+                raise
+            time.sleep(1.0)
+    try:
+        yield hf
+    finally:
+        hf.close()
+
+
+def load_results(path, paths=None, retries=5):
+    "H5 with the content of a result file read with open_results"
+    data = H5()
+    data.filename = Path(path).as_posix()
+    with open_results(path, retries) as hf:
+        data.root = load_file(hf, paths)
+    return data
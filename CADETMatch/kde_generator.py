@@ -17,6 +17,7 @@ from cadet import H5, Cadet
 from sklearn import preprocessing
 from sklearn.neighbors import KernelDensity
 
+import CADETMatch.artifacts as artifacts
 import CADETMatch.kde_util as kde_util
 import CADETMatch.score as score
 
@@ -52,9 +53,24 @@ def mirror(data, meta_mask):
 
 
 def setupKDE(cache):
-    scores = generate_synthetic_error(cache)
-
     mcmcDir = Path(cache.settings["resultsDirMCMC"])
+    dir_base = Path(cache.settings["resultsDirBase"])
+
+    # the error model simulations dominate the startup of an MCMC run, reuse the fit if nothing it depends on changed
+    key = artifacts.settings_key(
+        cache, "kde", cache.settings.get("errorModel", None), cache.settings["errorModelCount"]
+    )
+    files = {
+        "kde_scaler.joblib": mcmcDir / "kde_scaler.joblib",
+        "kde_score.joblib": mcmcDir / "kde_score.joblib",
+        "kde_settings.h5": mcmcDir / "kde_settings.h5",
+        "kde_data.h5": dir_base / "kde_data.h5",
+    }
+    if artifacts.restore_files(cache, "kde", key, files):
+        sub.graph_kde(cache)
+        return getKDE(cache)
+
+    scores = generate_synthetic_error(cache)
 
     scores_mirror = mirror(scores, cache.meta_mask)
 
@@ -85,6 +101,8 @@ def setupKDE(cache):
 
     h5_data.save(lock=True)
 
+    artifacts.store_files(cache, "kde", key, files.values())
+
     sub.graph_kde(cache)
 
     return kde, scaler
@@ -9,16 +9,20 @@ import time
 from pathlib import Path
 
 import h5py
+import jstyleson
 import numpy
 import functools
 from cadet import H5, Cadet
 
+import CADETMatch.archive as archive
+import CADETMatch.artifacts as artifacts
 import CADETMatch.evo as evo
 import CADETMatch.gradFD as gradFD
 import CADETMatch.loggerwriter as loggerwriter
+import CADETMatch.pop as pop
 import CADETMatch.util as util
 import CADETMatch.version as version
-from CADETMatch.cache import cache
+from CADETMatch.cache import Cache, cache
 
 
 def main(map_function):
@@ -63,28 +67,31 @@ def main(map_function):
 
             bootstrap = cache.settings["resultsDirBase"] / "bootstrap_output"
 
-            for i in range(samples):
-                # copy csv files to a new directory with noise added
-                # put a new json file in the directory that points to the new csv files
-                json_path = util.copyCSVWithNoise(i, center, noise)
-                multiprocessing.get_logger().info(json_path)
+            if cache.settings["bootstrap"].get("useArchive", False):
+                temp = bootstrap_archive(cache, map_function, samples, center, noise)
+            else:
+                for i in range(samples):
+                    # copy csv files to a new directory with noise added
+                    # put a new json file in the directory that points to the new csv files
+                    json_path = util.copyCSVWithNoise(i, center, noise)
+                    multiprocessing.get_logger().info(json_path)
 
-                setup(cache, json_path)
+                    setup(cache, json_path, map_function)
 
-                # call setup on all processes with the new json file as an argument to reset them
-                # util.updateScores(json_path)
+                    # call setup on all processes with the new json file as an argument to reset them
+                    # util.updateScores(json_path)
 
-                hof = evo.run(cache)
-                temp.append(util.bestMinScore(hof))
+                    hof = evo.run(cache)
+                    temp.append(util.bestMinScore(hof))
 
-                numpy_temp = numpy.array(temp)
-                cov = numpy.cov(numpy_temp.transpose())
-                multiprocessing.get_logger().info(
-                    "in progress cov %s data %s det %s",
-                    cov,
-                    numpy_temp,
-                    numpy.linalg.det(cov),
-                )
+                    numpy_temp = numpy.array(temp)
+                    cov = numpy.cov(numpy_temp.transpose())
+                    multiprocessing.get_logger().info(
+                        "in progress cov %s data %s det %s",
+                        cov,
+                        numpy_temp,
+                        numpy.linalg.det(cov),
+                    )
 
             numpy_temp = numpy.array(temp)
             cov = numpy.cov(numpy_temp.transpose())
@@ -93,6 +100,85 @@ def main(map_function):
             )
 
 
+def bootstrap_archive(cache, map_function, samples, center, noise):
+    """bootstrap from the simulation archive of the main run, simulations don't depend on the noisy data
+    so every archived simulation is scored against all samples at once on the pool. With refit each sample
+    is then optimized seeded with its best archived points and archived points are not simulated again."""
+    settings = cache.settings["bootstrap"]
+    refit = bool(settings.get("refit", False))
+    numSeeds = int(settings.get("seeds", 10))
+
+    archive_path = archive.archive_path(cache).resolve().as_posix()
+    data = archive.read_input(archive_path)
+    template_paths = list(cache.settings["resultsDirMisc"].glob("template_*.h5"))
+
+    multiprocessing.get_logger().info(
+        "bootstrap %s samples from %s archived simulations in %s",
+        samples,
+        len(data),
+        archive_path,
+    )
+
+    json_paths = []
+    for i in range(samples):
+        json_path = util.copyCSVWithNoise(i, center, noise)
+        multiprocessing.get_logger().info(json_path)
+
+        # the templates don't depend on the data so the ones from the main run are reused
+        sample_cache = Cache()
+        sample_cache.setup_dir(json_path)
+        createDirectories(sample_cache, json_path)
+        for template_path in template_paths:
+            shutil.copy(str(template_path), str(sample_cache.settings["resultsDirMisc"]))
+
+        json_paths.append(Path(json_path).as_posix())
+
+    evaluate = functools.partial(
+        evo.fitness_bootstrap, json_paths=json_paths, archive_path=archive_path
+    )
+    # results arrive in any order from the pool
+    lookup = dict(map_function(evaluate, [pop.Individual(row) for row in data]))
+    scores = numpy.array([lookup[tuple(row)] for row in data])
+
+    temp = []
+    for i, json_path in enumerate(json_paths):
+        order = numpy.argsort(scores[:, i])[::-1]
+        best = data[order[0]]
+        multiprocessing.get_logger().info(
+            "bootstrap sample %s archive best %s score %s", i, best, scores[order[0], i]
+        )
+
+        if refit:
+            with open(json_path) as json_data:
+                sample_settings = jstyleson.load(json_data)
+
+            sample_settings["replayArchive"] = archive_path
+            sample_settings["seeds"] = [
+                util.convert_individual_inputorder(data[idx], cache)
+                for idx in order[:numSeeds]
+            ]
+
+            with open(json_path, "w") as json_data:
+                jstyleson.dump(sample_settings, json_data)
+
+            setup(cache, json_path, map_function)
+            hof = evo.run(cache)
+            best = util.bestMinScore(hof)
+
+        temp.append(best)
+
+        numpy_temp = numpy.array(temp)
+        cov = numpy.cov(numpy_temp.transpose())
+        multiprocessing.get_logger().info(
+            "in progress cov %s data %s det %s",
+            cov,
+            numpy_temp,
+            numpy.linalg.det(cov),
+        )
+
+    return temp
+
+
 def setup(cache, json_path, map_function):
     "run seutp for the current json_file"
     cache.setup_dir(json_path)
@@ -102,8 +188,8 @@ def setup(cache, json_path, map_function):
 
     print_version()
 
-    cache.setup(json_path)
     cache.map_function = map_function
+    cache.setup(json_path)
 
     cache.eval.evaluate = functools.partial(evo.fitness, json_path=json_path)
     cache.eval.evaluate_final = functools.partial(evo.fitness_final, json_path=json_path)
@@ -174,12 +260,7 @@ def createDirectories(cache, json_path):
 
 
 def createCSV(cache):
-    path = Path(cache.settings["resultsDirBase"], cache.settings["csv"])
-    if not path.exists():
-        with path.open("w", newline="") as csvfile:
-            writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_ALL)
-            writer.writerow(cache.headers)
-
+    "the meta results.csv, evaluations are stored in evaluations.h5 and only exported to the csv setting on request"
     path = cache.settings["resultsDirMeta"] / "results.csv"
     if not path.exists():
         with path.open("w", newline="") as csvfile:
@@ -247,7 +328,10 @@ def setTemplateValuesAuto(simulation, set_values_auto, cache):
 
 
 def setupTemplates(cache):
-    "setup all the experimental templates"
+    "setup all the experimental templates, the calibration solves of all experiments run concurrently"
+    bias = cache.settings["searchMethod"] != "MCMC" and "errorModel" in cache.settings
+
+    templates = []
     for experiment in cache.settings["experiments"]:
         HDF5 = experiment["HDF5"]
         name = experiment["name"]
@@ -269,79 +353,78 @@ def setupTemplates(cache):
 
         util.setupSimulation(template, cache.target[name]["time"], name, cache)
 
-        start = time.time()
-        util.runExperiment(
-            None,
-            experiment,
-            cache.settings,
-            cache.target,
-            template,
-            experiment.get("timeout", 1800),
-            cache,
-        )
-        elapsed = time.time() - start
-
-        multiprocessing.get_logger().info("simulation took %s", elapsed)
-
-        # timeout needs to be stored in the template so all processes have it without calculating it
-        template.root.timeout = max(10, elapsed * 10)
-
-        if (
-            cache.settings["searchMethod"] != "MCMC"
-            and "errorModel" in cache.settings
-        ):
+        template_bias = None
+        if bias:
             # the base case needs to be saved since the normal template file is what the rest of the code will look for
             template_base_path = Path(
                 cache.settings["resultsDirMisc"], "template_%s_base.h5" % name
             )
             template.filename = template_base_path.as_posix()
-            template.save()
 
             multiprocessing.get_logger().info(
                 "create bias template for experiment %s", name
             )
             template_bias = util.biasSimulation(template, experiment, cache)
-            template_bias_path = Path(
-                cache.settings["resultsDirMisc"], "template_%s_bias.h5" % name
-            )
-            template_bias.filename = template_bias_path.as_posix()
-            template_bias.save()
-            template = template_bias
-
-        # change to where we want the template created
-        template.filename = template_path.as_posix()
-
-        template.save()
-
-        experiment["simulation"] = template
+        else:
+            template.filename = template_path.as_posix()
 
-        template_path = Path(
+        template_final_path = Path(
             cache.settings["resultsDirMisc"], "template_%s_final.h5" % name
         )
-        template_final = Cadet(template.root)
-        template_final.filename = template_path.as_posix()
+        if template_bias is not None:
+            template_final = Cadet(template_bias.root)
+        else:
+            template_final = Cadet(template.root)
+        template_final.filename = template_final_path.as_posix()
         if cache.dynamicTolerance:
             template_final.root.input.solver.time_integrator.abstol = (
                 util.get_grad_tolerance(cache, name)
             )
             template_final.root.input.solver.time_integrator.reltol = 0.0
 
-        start = time.time()
-        util.runExperiment(
-            None,
-            experiment,
-            cache.settings,
-            cache.target,
-            template_final,
-            experiment.get("timeout", 1800),
-            cache,
+        templates.append((experiment, template, template_bias, template_final))
+
+    elapsed = evo.calibrate_templates(
+        [(template, experiment["name"]) for experiment, template, _, _ in templates]
+        + [(final, experiment["name"]) for experiment, _, _, final in templates],
+        cache,
+    )
+
+    for experiment, template, template_bias, template_final in templates:
+        name = experiment["name"]
+
+        multiprocessing.get_logger().info(
+            "simulation took %s", elapsed[template.filename]
         )
-        elapsed = time.time() - start
 
-        multiprocessing.get_logger().info("simulation final took %s", elapsed)
+        # timeout needs to be stored in the template so all processes have it without calculating it
+        template.root.timeout = max(10, elapsed[template.filename] * 10)
+        template.save()
+
+        if template_bias is not None:
+            template_bias.root.timeout = template.root.timeout
+            template_bias_path = Path(
+                cache.settings["resultsDirMisc"], "template_%s_bias.h5" % name
+            )
+            template_bias.filename = template_bias_path.as_posix()
+            template_bias.save()
+
+            # change to where we want the template created
+            template_path = Path(
+                cache.settings["resultsDirMisc"], "template_%s.h5" % name
+            )
+            template_bias.filename = template_path.as_posix()
+            template_bias.save()
+            template = template_bias
+
+        experiment["simulation"] = template
+
+        multiprocessing.get_logger().info(
+            "simulation final took %s", elapsed[template_final.filename]
+        )
 
         # timeout needs to be stored in the template so all processes have it without calculating it
-        template_final.root.timeout = max(10, elapsed * 10)
+        template_final.root.timeout = max(10, elapsed[template_final.filename] * 10)
 
         template_final.save()
         experiment["simulation_final"] = template_final
@@ -359,7 +442,8 @@ def continue_mcmc(cache, map_function):
 
 if __name__ == "__main__":
     start = time.time()
-    map_function = util.getMapFunction()
+    artifacts.start_run()
+    map_function = util.getMapFunction(sys.argv[1])
     main(map_function=map_function)
     multiprocessing.get_logger().info("System has finished")
     multiprocessing.get_logger().info(
@@ -174,7 +174,7 @@ def genRandomChoice(cache, chain, kde, scaler):
     individuals_mle = kde_mle.sample(size)
     individuals_scaled = scaler_mle.inverse_transform(individuals_mle)
 
-    map_function = util.getMapFunction()
+    map_function = util.getMapFunction(sys.argv[1])
     fitnesses = map_function(fitness, individuals_scaled)
 
     results = {}
@@ -370,7 +370,7 @@ def process_mle(chain, probability, gen, cache):
         "cadetValues: %s %s", cadetValues.shape, cadetValues
     )
 
-    map_function = util.getMapFunction()
+    map_function = util.getMapFunction(sys.argv[1])
 
     fitnesses = list(map_function(fitness, temp))
 
@@ -1,15 +1,17 @@
 import copy
 from operator import eq
-import hashlib
 import CADETMatch.pop as pop
 import bisect
 import itertools
 
 import numpy
 class ParetoFront:
-    "Pareto front designed to be compatible with DEAP"
+    """Pareto front designed to be compatible with DEAP
+
+    The fitness and values of the members are kept in numpy arrays in the same (sorted) order as items so an
+    individual is compared against the whole front at once instead of member by member"""
 
-    def __init__(self, dimensions, similar=None, similar_fit=None, slice_object=slice(None)):
+    def __init__(self, dimensions, similar=None, similar_fit=None, slice_object=slice(None), epsilon=None):
         if similar is None:
             similar = eq
         
@@ -30,20 +32,87 @@ class ParetoFront:
         self.best_keys = [1e308]*dimensions
         self.best_items = [None]*dimensions
 
+        self.fitness_matrix = None
+        self.value_matrix = None
+
+        # with epsilon the objectives in slice_object are gridded into boxes of this size and at most one member is
+        # kept per box (epsilon dominance) which bounds the size of the front, boxes maps box -> member
+        self.epsilon = None if epsilon is None else numpy.array(epsilon, dtype=float)
+        self.boxes = {}
+
+        # hash of a member -> number of members with that hash
+        self.hash_index = {}
+
+    def __setstate__(self, state):
+        "fronts pickled in checkpoints before the arrays existed get them rebuilt from their items"
+        self.__dict__.update(state)
+        if self.__dict__.get("fitness_matrix", None) is None and self.items:
+            self.fitness_matrix = numpy.array([item.fitness.values for item in self.items])
+            self.value_matrix = numpy.array([item.value for item in self.items])
+        self.__dict__.setdefault("fitness_matrix", None)
+        self.__dict__.setdefault("value_matrix", None)
+        self.__dict__.setdefault("epsilon", None)
+        self.__dict__.setdefault("boxes", {})
+        if "hash_index" not in self.__dict__:
+            self.hash_index = {}
+            for item in self.items:
+                self.hash_index[item.hash] = self.hash_index.get(item.hash, 0) + 1
+
     def insert(self, item):
         """Insert a new item in sorted order"""
-        item = copy.deepcopy(item)
+        self.insert_copy(copy_individual(item))
+
+    def insert_copy(self, item):
+        "insert an item that is already a copy owned by the front"
         i = bisect.bisect(self.keys, item.fitness)
         self.items.insert(i, item)
         self.keys.insert(i, item.fitness)
+        if self.epsilon is not None:
+            self.boxes[self.box(numpy.array(item.fitness.values))] = item
+        self.hash_index[item.hash] = self.hash_index.get(item.hash, 0) + 1
+
+        fitness = numpy.array(item.fitness.values)
+        value = numpy.array(item.value)
+        if self.fitness_matrix is None or not len(self.fitness_matrix):
+            self.fitness_matrix = fitness.reshape(1, -1)
+            self.value_matrix = value.reshape(1, -1)
+        else:
+            self.fitness_matrix = numpy.insert(self.fitness_matrix, i, fitness, axis=0)
+            self.value_matrix = numpy.insert(self.value_matrix, i, value, axis=0)
+
+    def row_of(self, member):
+        "row of a member, keys are sorted so only members with the same fitness are compared"
+        row = bisect.bisect_left(self.keys, member.fitness)
+        while self.items[row] is not member:
+            row += 1
+        return row
 
     def remove(self, index):
-        del self.keys[index]
-        del self.items[index]
+        self.remove_rows([index])
+
+    def remove_rows(self, indexes):
+        "remove several members at once, indexes refer to the positions before removal"
+        remove = set(indexes)
+        if self.epsilon is not None:
+            for i in remove:
+                del self.boxes[self.box(self.fitness_matrix[i])]
+        for i in remove:
+            item_hash = self.items[i].hash
+            self.hash_index[item_hash] -= 1
+            if not self.hash_index[item_hash]:
+                del self.hash_index[item_hash]
+        self.keys = [key for i, key in enumerate(self.keys) if i not in remove]
+        self.items = [item for i, item in enumerate(self.items) if i not in remove]
+        self.fitness_matrix = numpy.delete(self.fitness_matrix, list(remove), axis=0)
+        self.value_matrix = numpy.delete(self.value_matrix, list(remove), axis=0)
 
     def clear(self):
         del self.items[:]
         del self.keys[:]
+        self.fitness_matrix = None
+        self.value_matrix = None
+        self.boxes = {}
+        self.hash_index = {}
 
     def __len__(self):
         return len(self.items)
@@ -68,86 +137,221 @@ class ParetoFront:
         """
         new_members = []
         significant = []
-        slice_object = self.slice_object
         pareto_length = len(self)
 
         for ind in population:
-            is_dominated = False
-            dominates_one = False
-            has_twin = False
-            to_remove = []
-            
-            for idx in range(len(ind.fitness.values)):
-                if ind.fitness.values[idx] < self.best_keys[idx]:
-                    self.best_keys[idx] = ind.fitness.values[idx]
-                    self.best_items[idx] = copy.deepcopy(ind)
-
-            for i, hofer in enumerate(self):  # hofer = hall of famer
-                if not dominates_one and hofer.fitness.dominates(
-                    ind.fitness, obj=slice_object
-                ):
-                    is_dominated = True
-                    break
-                elif ind.fitness.dominates(hofer.fitness, obj=slice_object):
-                    dominates_one = True
-                    to_remove.append(i)
-                    significant.append(
-                        not self.similar_fit(ind.fitness.values, hofer.fitness.values)
-                    )
-                elif self.similar_fit(
-                    ind.fitness.values, hofer.fitness.values
-                ) and self.similar(ind.value, hofer.value):
-                    has_twin = True
-                    break
-
-            for i in reversed(to_remove):  # Remove the dominated hofer
-                self.remove(i)
-            if not is_dominated and not has_twin:
-                # if the pareto front is empty or a new item is added to the pareto front that is progress
-                # however if there is only a single objective and it does not significantly dominate then
-                # don't count that as significant progress
-                if pareto_length == 0:
-                    significant.append(True)
-                elif self.dimensions > 1:
-                    if len(significant) == 0 or (len(significant) and any(significant)):
-                        significant.append(True)
-
-                self.insert(ind)
+            if self.update_individual(ind, significant, pareto_length):
                 new_members.append(ind)
 
         return new_members, any(significant)
 
-    def hashes(self):
-        hashes = {
-            hashlib.md5(str(list(individual.value)).encode("utf-8", "ignore")).hexdigest()
-            for individual in itertools.chain(self.items, self.best_items) if individual is not None
-        }
-        return hashes 
+    def update_individual(self, ind, significant, pareto_length):
+        """Add one individual, returns True if it was inserted. significant is extended the same way a member by
+        member scan of the front would do it so update keeps the semantics of DEAP's ParetoFront"""
+        fitness = numpy.array(ind.fitness.values)
+
+        improved = numpy.flatnonzero(fitness < numpy.array(self.best_keys))
+        best_copy = None
+        if len(improved):
+            best_copy = copy_individual(ind)
+            for idx in improved:
+                self.best_keys[idx] = ind.fitness.values[idx]
+                self.best_items[idx] = best_copy
+
+        if self.epsilon is not None:
+            return self.update_box(ind, fitness, significant, best_copy)
+
+        if len(self):
+            is_dominated, has_twin = self.compare_front(ind, fitness, significant)
+            if is_dominated or has_twin:
+                return False
+
+        # if the pareto front is empty or a new item is added to the pareto front that is progress
+        # however if there is only a single objective and it does not significantly dominate then
+        # don't count that as significant progress
+        if pareto_length == 0:
+            significant.append(True)
+        elif self.dimensions > 1:
+            if len(significant) == 0 or (len(significant) and any(significant)):
+                significant.append(True)
+
+        self.insert_copy(copy_individual(ind) if best_copy is None else best_copy)
+        return True
+
+    def box(self, fitness):
+        "coordinates of the epsilon box of a fitness"
+        return tuple(numpy.floor(fitness[self.slice_object] / self.epsilon).astype(int).tolist())
+
+    def box_decision(self, fitness):
+        """what adding a fitness to an epsilon front does: ("reject", []), ("replace", rows) when it takes over the
+        box of an existing member or ("insert", rows) for a new box, rows are the members it removes"""
+        box = self.box(fitness)
+        if not len(self):
+            return "insert", []
+
+        member = self.boxes.get(box, None)
+        if member is not None:
+            # only one member can be in a box and it can't box dominate any other member
+            fit = fitness[self.slice_object]
+            member_fit = numpy.array(member.fitness.values)[self.slice_object]
+            if numpy.all(member_fit <= fit) and numpy.any(member_fit < fit):
+                return "reject", []
+            corner = numpy.array(box) * self.epsilon
+            if (numpy.all(fit <= member_fit) and numpy.any(fit < member_fit)) or numpy.linalg.norm(
+                fit - corner
+            ) < numpy.linalg.norm(member_fit - corner):
+                return "replace", [self.row_of(member)]
+            return "reject", []
+
+        boxes = numpy.floor(self.fitness_matrix[:, self.slice_object] / self.epsilon)
+        box = numpy.array(box)
+        front_better = boxes < box
+        front_worse = boxes > box
+        if numpy.any(front_better.any(axis=1) & ~front_worse.any(axis=1)):
+            return "reject", []
+        return "insert", list(numpy.flatnonzero(front_worse.any(axis=1) & ~front_better.any(axis=1)))
+
+    def update_box(self, ind, fitness, significant, best_copy):
+        """epsilon dominance update, only a new box is significant progress, moving within a box is below the resolution
+        the front is asked to keep"""
+        decision, rows = self.box_decision(fitness)
+        if decision == "reject":
+            return False
+
+        if rows:
+            self.remove_rows(rows)
+        if decision == "insert":
+            significant.append(True)
+        self.insert_copy(copy_individual(ind) if best_copy is None else best_copy)
+        return True
+
+    def compare_front(self, ind, fitness, significant):
+        "remove the members ind dominates and return if ind is dominated by or has a twin in the front"
+        dominated, has_twin, removed, close = self.classify([ind], fitness.reshape(1, -1))
+
+        to_remove = numpy.flatnonzero(removed[0])
+        if len(to_remove):
+            significant.extend(bool(i) for i in ~close[0, to_remove])
+            self.remove_rows(to_remove)
+
+        return dominated[0], has_twin[0]
+
+    def classify(self, population, fitness=None):
+        """compare individuals against the front as it is now without changing it
+
+        returns dominated and has_twin (one entry per individual) together with removed and close where removed[i, j]
+        is True if individual i would remove member j and close[i, j] if their fitness is similar"""
+        if fitness is None:
+            fitness = numpy.array([ind.fitness.values for ind in population])
+        rows = numpy.arange(len(self))
+
+        front = self.fitness_matrix[:, self.slice_object]
+        fit = fitness[:, self.slice_object]
+        front_better = front[numpy.newaxis, :, :] < fit[:, numpy.newaxis, :]
+        front_worse = front[numpy.newaxis, :, :] > fit[:, numpy.newaxis, :]
+        hofer_dominates = front_better.any(axis=2) & ~front_worse.any(axis=2)
+        ind_dominates = front_worse.any(axis=2) & ~front_better.any(axis=2)
+
+        # a scan of the front stops at the first member that dominates the individual (as long as the individual
+        # did not dominate an earlier member) or at the first twin, members dominated before that are removed
+        first_dominates = first_true(ind_dominates)
+        stop = first_true(hofer_dominates & (rows < first_dominates[:, numpy.newaxis]))
+
+        candidates = ~ind_dominates & (rows < stop[:, numpy.newaxis])
+        close = self.similar_matrix(self.similar_fit, fitness, self.fitness_matrix, "fitness", candidates | ind_dominates)
+        twins = candidates & close
+        if twins.any():
+            values = numpy.array([ind.value for ind in population])
+            twins = twins & self.similar_matrix(self.similar, values, self.value_matrix, "value", twins)
+        first_twin = first_true(twins)
+        has_twin = first_twin < len(self)
+        stop = numpy.minimum(stop, first_twin)
+        dominated = ~has_twin & (stop < len(self))
+
+        removed = ind_dominates & (rows < stop[:, numpy.newaxis])
+        return dominated, has_twin, removed, close
+
+    def similar_matrix(self, function, vectors, matrix, attribute, mask):
+        "function(vectors[i], member j) where mask[i, j] is set, vectorized for the similarity functions of this module"
+        if function in vectorized_similar:
+            columns, rtol = vectorized_similar[function]
+            vectors = vectors[:, numpy.newaxis, columns]
+            matrix = matrix[numpy.newaxis, :, columns]
+            if rtol is None:
+                return mask & numpy.all(matrix == vectors, axis=2)
+            return mask & numpy.all(numpy.isclose(vectors, matrix, rtol=rtol), axis=2)
+
+        result = numpy.zeros(mask.shape, dtype=bool)
+        for i, j in zip(*numpy.nonzero(mask)):
+            member = self.items[j].fitness.values if attribute == "fitness" else self.items[j].value
+            result[i, j] = bool(function(pop.seq2array(vectors[i]), member))
+        return result
+
+    def would_improve(self, ind):
+        "True if updating the front with ind would insert it"
+        if self.epsilon is not None:
+            return self.box_decision(numpy.array(ind.fitness.values))[0] != "reject"
+        if not len(self):
+            return True
+        dominated, has_twin, removed, close = self.classify([ind])
+        return not dominated[0] and not has_twin[0]
+
+    def is_significant(self, ind):
+        "True if updating the front with ind would count as significant progress, the front is not changed"
+        return bool(self.significant_mask([ind])[0])
+
+    def significant_mask(self, population, chunk=256):
+        """is_significant for every individual of a population, each one is compared against the front as it is now
+        and not against a front that already contains the other individuals"""
+        if not len(self):
+            return numpy.ones(len(population), dtype=bool)
+
+        if self.epsilon is not None:
+            return numpy.array(
+                [self.box_decision(numpy.array(ind.fitness.values))[0] == "insert" for ind in population], dtype=bool
+            )
+
+        mask = []
+        for start in range(0, len(population), chunk):
+            dominated, has_twin, removed, close = self.classify(population[start : start + chunk])
+            removal_significant = (removed & ~close).any(axis=1)
+            if self.dimensions > 1:
+                # an inserted individual is significant unless everything it removes is similar to it
+                inserted = ~dominated & ~has_twin
+                removal_significant = removal_significant | (inserted & ~removed.any(axis=1))
+            mask.append(removal_significant)
+        return numpy.concatenate(mask)
 
+    def hashes(self):
+        return set(self.hash_index).union(
+            individual.hash for individual in self.best_items if individual is not None
+        )
 
-    def totalEntries(self):
-        population = []
+    def __contains__(self, individual):
+        "True if an individual with the same values is a member of the front"
+        return individual.hash in self.hash_index
 
+    def unique_entries(self):
+        "members and best items with the same values only once"
+        seen = set()
         for ind in itertools.chain(self.items, self.best_items):
-            if ind is not None and ind.value not in population:
-                population.append(ind.value)
-
-        return len(population)
+            if ind is not None and ind.hash not in seen:
+                seen.add(ind.hash)
+                yield ind
 
+    def totalEntries(self):
+        return sum(1 for ind in self.unique_entries())
 
     def getEntries(self):
         population = []
         fitnesses  = []
 
-        for ind in itertools.chain(self.items, self.best_items):
-            if ind is not None and ind.value not in population:
-                population.append(ind.value)
-                fitnesses.append(ind.fitness.values)
+        for ind in self.unique_entries():
+            population.append(ind.value)
+            fitnesses.append(ind.fitness.values)
 
         return numpy.array(population), numpy.array(fitnesses)
 
-
-
     def getBestScores(self):
         items = [i.fitness.values for i in itertools.chain(self.items, self.best_items) if i is not None]
         data = numpy.array(items)
@@ -160,12 +364,22 @@ class DummyFront(ParetoFront):
         "This is here for API compatibility, don't do anything"
         self.items = []
         self.best_items = []
+        self.hash_index = {}
         return None
 
     def update(self, population):
         "do not put anything in this front, it is just needed to maintain compatibility"
         return [], False
 
+    def would_improve(self, ind):
+        return False
+
+    def is_significant(self, ind):
+        return False
+
+    def significant_mask(self, population, chunk=256):
+        return numpy.zeros(len(population), dtype=bool)
+
 
 def similar(a, b):
     "for minimization the rtol needs to be fairly high otherwise the pareto front contains too many entries"
@@ -198,6 +412,35 @@ def similar_fit(cache):
     return similar
 
 
+def first_true(mask):
+    "index of the first True entry of every row of mask, the number of columns for rows without one"
+    return numpy.where(mask.any(axis=1), numpy.argmax(mask, axis=1), mask.shape[1])
+
+
+# similarity function -> (columns compared, rtol of numpy.allclose or None for exact equality)
+vectorized_similar = {
+    eq: (slice(None), None),
+    similar: (slice(None), 1e-1),
+    similar_fit_meta_split: (slice(None, 3), 1e-1),
+    similar_fit_meta_sse: (slice(-2, -1), 1e-1),
+}
+
+
+def copy_individual(ind):
+    "copy of an individual that is independent of later changes to ind, cheaper than a deepcopy"
+    if isinstance(ind, pop.Individual):
+        copied = pop.Individual(
+            ind.value,
+            ind.fitness.values,
+            best=copy.deepcopy(ind.best),
+            csv_line=copy.copy(ind.csv_line),
+        )
+        # the cached hash is checked against the raw values so it can be shared
+        copied._hash = getattr(ind, "_hash", None)
+        return copied
+    return copy.deepcopy(ind)
+
+
 def updateParetoFront(halloffame, offspring):
     new_members, significant = halloffame.update(
         [
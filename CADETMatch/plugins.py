@@ -1,10 +1,15 @@
+import ast
 import importlib
 import importlib.util
 import sys
+from collections.abc import Mapping
 from pathlib import Path
 
 base = Path(__file__).parent
 
+# directory -> {plugin name: module path}, built once per process
+indexes = {}
+
 
 def load_plugin(path):
     module = ".".join(path.relative_to(base).parts).replace(".py", "")
@@ -19,13 +24,81 @@ def get_files(dir):
     return [path for path in dir.glob("*.py") if not path.name == "__init__.py"]
 
 
+def literal_string(node):
+    "the string a node is a literal of or None, literal_eval also reads the Str nodes python 3.7 parses strings into"
+    if node is None:
+        return None
+    try:
+        value = ast.literal_eval(node)
+    except ValueError:
+        return None
+    return value if isinstance(value, str) else None
+
+
+def plugin_names(path):
+    "names a plugin module provides read from its source without importing it, None if they are not literals"
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    for node in tree.body:
+        if (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+        ):
+            target = node.targets[0].id
+            if target == "name":
+                value = literal_string(node.value)
+                return None if value is None else [value]
+            if target == "plugins" and isinstance(node.value, ast.Dict):
+                names = [literal_string(key) for key in node.value.keys]
+                return None if None in names else names
+    return None
+
+
+def get_index(directory):
+    if directory not in indexes:
+        index = {}
+        for path in get_files(base / directory):
+            names = plugin_names(path)
+            if names is None:
+                names = list(plugin_module(load_plugin(path)))
+            for name in names:
+                index[name] = path
+        indexes[directory] = index
+    return indexes[directory]
+
+
+def plugin_module(plug):
+    if getattr(plug, "plugins", None) is not None:
+        return plug.plugins
+    return {plug.name: plug}
+
+
+class Plugins(Mapping):
+    "plugins of a directory by name, a plugin module is only imported the first time one of its plugins is used"
+
+    def __init__(self, directory):
+        self.index = get_index(directory)
+        self.loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            path = self.index[name]
+            module = ".".join(path.relative_to(base).parts).replace(".py", "")
+            plug = sys.modules.get(module, None)
+            if getattr(plug, "__file__", None) != str(path):
+                plug = load_plugin(path)
+            self.loaded.update(plugin_module(plug))
+        return self.loaded[name]
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
 def get_plugins(directory):
-    plugins = base / directory
-    temp = {}
-    for path in get_files(plugins):
-        plug = load_plugin(path)
-        if getattr(plug, "plugins", None) is not None:
-            temp.update(plug.plugins)
-        else:
-            temp[plug.name] = plug
-    return temp
+    return Plugins(directory)
@@ -1,6 +1,7 @@
 import numpy
 import array
 import attr
+import hashlib
 from typing import Iterable
 
 def seq2array(x: Iterable[float]) -> array.array:
@@ -57,10 +58,22 @@ class Individual:
     fitness = attr.ib(converter=Fitness, default=attr.Factory(list))
     best = attr.ib(default=None)
     csv_line = attr.ib(default='')
+    _hash = attr.ib(default=None, init=False, repr=False, eq=False)
     
     @property
     def valid(self):
         return self.fitness.valid
+
+    @property
+    def hash(self):
+        """md5 of the values used to name the files and csv entries of an individual, it is only recomputed when the
+        raw bytes of value change"""
+        raw = self.value.tobytes()
+        cached = getattr(self, "_hash", None)
+        if cached is None or cached[0] != raw:
+            cached = (raw, hashlib.md5(str(list(self.value)).encode("utf-8", "ignore")).hexdigest())
+            self._hash = cached
+        return cached[1]
     
     def __array__(self, dtype=None):
         return numpy.frombuffer(self.value, dtype=dtype)
@@ -1,19 +1,15 @@
 import csv
 import multiprocessing
 import time
-import warnings
 from pathlib import Path
 
 import numpy
 import psutil
-from cadet import H5
 
+import CADETMatch.archive as archive
+import CADETMatch.background as background
+import CADETMatch.h5store as h5store
 import CADETMatch.util as util
-import filelock
-
-with warnings.catch_warnings():
-    warnings.filterwarnings("ignore", category=FutureWarning)
-    import h5py
 
 
 def process_pareto(cache, hof):
@@ -104,6 +100,8 @@ def clear_result_data(result_data):
     if "mcmc_score" in result_data:
         result_data["mcmc_score"] = []
 
+    result_data.pop("archive", None)
+
 
 def write_progress_csv(
     cache,
@@ -166,7 +164,7 @@ def write_progress_csv(
 
 def write_results(
     cache,
-    result_h5,
+    hf,
     result_data,
     gen_data,
     now,
@@ -184,174 +182,87 @@ def write_results(
     grad_param_transform,
     probability,
 ):
-    with h5py.File(result_h5, "w") as hf:
-        hf.create_dataset(
-            "input",
-            data=result_data["input"],
-            maxshape=(None, len(result_data["input"][0])),
-        )
+    h5store.create_rows(hf, "input", result_data["input"], cache.resultStorage)
 
-        if len(result_data["strategy"]):
-            hf.create_dataset(
-                "strategy",
-                data=result_data["strategy"],
-                maxshape=(None, len(result_data["strategy"][0])),
-            )
+    if len(result_data["strategy"]):
+        h5store.create_rows(hf, "strategy", result_data["strategy"], cache.resultStorage)
 
-        if len(result_data["mean"]):
-            hf.create_dataset(
-                "mean",
-                data=result_data["mean"],
-                maxshape=(None, len(result_data["mean"][0])),
-            )
+    if len(result_data["mean"]):
+        h5store.create_rows(hf, "mean", result_data["mean"], cache.resultStorage)
 
-        if len(result_data["confidence"]):
-            hf.create_dataset(
-                "confidence",
-                data=result_data["confidence"],
-                maxshape=(None, len(result_data["confidence"][0])),
-            )
+    if len(result_data["confidence"]):
+        h5store.create_rows(hf, "confidence", result_data["confidence"], cache.resultStorage)
 
-        if cache.correct is not None:
-            distance = cache.correct - result_data["input"]
-            hf.create_dataset(
-                "distance_correct",
-                data=distance,
-                maxshape=(None, len(result_data["input"][0])),
-            )
+    if cache.correct is not None:
+        distance = cache.correct - result_data["input"]
+        h5store.create_rows(hf, "distance_correct", distance, cache.resultStorage)
 
-            distance_transform = (
-                cache.correct_transform - result_data["input_transform"]
-            )
-            hf.create_dataset(
-                "distance_correct_transform",
-                data=distance_transform,
-                maxshape=(None, len(result_data["input_transform"][0])),
-            )
-
-        hf.create_dataset(
-            "output",
-            data=result_data["output"],
-            maxshape=(None, len(result_data["output"][0])),
-        )
-        hf.create_dataset(
-            "output_meta",
-            data=result_data["output_meta"],
-            maxshape=(None, len(result_data["output_meta"][0])),
+        distance_transform = (
+            cache.correct_transform - result_data["input_transform"]
         )
+        h5store.create_rows(hf, "distance_correct_transform", distance_transform, cache.resultStorage)
 
-        hf.create_dataset(
-            "input_transform",
-            data=result_data["input_transform"],
-            maxshape=(None, len(result_data["input_transform"][0])),
-        )
+    h5store.create_rows(hf, "output", result_data["output"], cache.resultStorage)
+    h5store.create_rows(hf, "output_meta", result_data["output_meta"], cache.resultStorage)
 
-        if numpy.array_equal(
-            result_data["input_transform"], result_data["input_transform_extended"]
-        ):
-            hf.create_dataset("is_extended_input", data=False)
-        else:
-            hf.create_dataset("is_extended_input", data=True)
-            hf.create_dataset(
-                "input_transform_extended",
-                data=result_data["input_transform_extended"],
-                maxshape=(None, len(result_data["input_transform_extended"][0])),
-            )
+    h5store.create_rows(hf, "input_transform", result_data["input_transform"], cache.resultStorage)
 
-        hf.create_dataset("generation", data=gen_data, maxshape=(None, 2))
-        hf.create_dataset("total_time", data=now - sim_start)
+    if numpy.array_equal(
+        result_data["input_transform"], result_data["input_transform_extended"]
+    ):
+        hf.create_dataset("is_extended_input", data=False)
+    else:
+        hf.create_dataset("is_extended_input", data=True)
+        h5store.create_rows(
+            hf, "input_transform_extended", result_data["input_transform_extended"], cache.resultStorage
+        )
 
-        if population_input is not None:
-            hf.create_dataset(
-                "population_input",
-                data=population_input,
-                maxshape=(None, population_input.shape[1]),
-            )
+    h5store.create_rows(hf, "generation", gen_data, cache.resultStorage)
+    hf.create_dataset("total_time", data=now - sim_start)
 
-        if population_output is not None:
-            hf.create_dataset(
-                "population_output",
-                data=population_output,
-                maxshape=(None, population_output.shape[1]),
-            )
+    if population_input is not None:
+        h5store.create_rows(hf, "population_input", population_input, cache.resultStorage)
 
-        if probability is not None:
-            hf.create_dataset("probability", data=probability, maxshape=(None, 1))
+    if population_output is not None:
+        h5store.create_rows(hf, "population_output", population_output, cache.resultStorage)
 
-        if cache.debugWrite:
-            mcmc_score = result_data.get("mcmc_score", None)
-            if mcmc_score is not None:
-                hf.create_dataset(
-                    "mcmc_score", data=mcmc_score, maxshape=(None, len(mcmc_score[0]))
-                )
+    if probability is not None:
+        h5store.create_rows(hf, "probability", probability, cache.resultStorage)
 
-        if len(hof_param):
-            hf.create_dataset(
-                "hof_population", data=hof_param, maxshape=(None, hof_param.shape[1])
-            )
-            hf.create_dataset(
-                "hof_population_transform",
-                data=hof_param_transform,
-                maxshape=(None, hof_param_transform.shape[1]),
-            )
-            hf.create_dataset(
-                "hof_score_original", data=data, maxshape=(None, data.shape[1])
-            )
-            hf.create_dataset(
-                "hof_score",
-                data=data,
-                maxshape=(None, data.shape[1]),
-            )
+    if cache.debugWrite:
+        mcmc_score = result_data.get("mcmc_score", None)
+        if mcmc_score is not None:
+            h5store.create_rows(hf, "mcmc_score", mcmc_score, cache.resultStorage)
 
-        if len(meta_param):
-            hf.create_dataset(
-                "meta_population", data=meta_param, maxshape=(None, meta_param.shape[1])
-            )
-            hf.create_dataset(
-                "meta_population_transform",
-                data=meta_param_transform,
-                maxshape=(None, meta_param_transform.shape[1]),
-            )
-            hf.create_dataset(
-                "meta_score",
-                data=data_meta,
-                maxshape=(None, data_meta.shape[1]),
-            )
+    if len(hof_param):
+        h5store.create_rows(hf, "hof_population", hof_param, cache.resultStorage)
+        h5store.create_rows(hf, "hof_population_transform", hof_param_transform, cache.resultStorage)
+        h5store.create_rows(hf, "hof_score_original", data, cache.resultStorage)
+        h5store.create_rows(hf, "hof_score", data, cache.resultStorage)
 
-        if len(grad_param):
-            hf.create_dataset(
-                "grad_population", data=grad_param, maxshape=(None, grad_param.shape[1])
-            )
-            hf.create_dataset(
-                "grad_population_transform",
-                data=grad_param_transform,
-                maxshape=(None, grad_param_transform.shape[1]),
-            )
-            hf.create_dataset(
-                "grad_score_original",
-                data=data_grad,
-                maxshape=(None, data_grad.shape[1]),
-            )
-            hf.create_dataset(
-                "grad_score",
-                data=data_grad,
-                maxshape=(None, data_grad.shape[1]),
-            )
+    if len(meta_param):
+        h5store.create_rows(hf, "meta_population", meta_param, cache.resultStorage)
+        h5store.create_rows(hf, "meta_population_transform", meta_param_transform, cache.resultStorage)
+        h5store.create_rows(hf, "meta_score", data_meta, cache.resultStorage)
 
-        if cache.fullTrainingData:
+    if len(grad_param):
+        h5store.create_rows(hf, "grad_population", grad_param, cache.resultStorage)
+        h5store.create_rows(hf, "grad_population_transform", grad_param_transform, cache.resultStorage)
+        h5store.create_rows(hf, "grad_score_original", data_grad, cache.resultStorage)
+        h5store.create_rows(hf, "grad_score", data_grad, cache.resultStorage)
 
-            for filename, chroma in result_data["results"].items():
-                hf.create_dataset(
-                    filename, data=chroma, maxshape=(None, len(chroma[0]))
-                )
+    if cache.fullTrainingData:
 
-            for filename, chroma in result_data["times"].items():
-                hf.create_dataset(filename, data=chroma)
+        for filename, chroma in result_data["results"].items():
+            h5store.create_rows(hf, filename, chroma, cache.resultStorage)
+
+        for filename, chroma in result_data["times"].items():
+            h5store.create_array(hf, filename, chroma, cache.resultStorage)
 
 
 def update_results(
     cache,
-    result_h5,
+    hf,
     result_data,
     gen_data,
     now,
@@ -368,182 +279,150 @@ def update_results(
     grad_param,
     grad_param_transform,
     probability,
+    written,
 ):
+    hf["input"].resize((hf["input"].shape[0] + len(result_data["input"])), axis=0)
+    hf["input"][-len(result_data["input"]) :] = result_data["input"]
 
-    with h5py.File(result_h5, "a") as hf:
-        hf["input"].resize((hf["input"].shape[0] + len(result_data["input"])), axis=0)
-        hf["input"][-len(result_data["input"]) :] = result_data["input"]
-
-        hf["total_time"][()] = now - sim_start
-        hf["generation"][()] = gen_data
-
-        if len(result_data["strategy"]):
-            hf["strategy"].resize(
-                (hf["strategy"].shape[0] + len(result_data["strategy"])), axis=0
-            )
-            hf["strategy"][-len(result_data["strategy"]) :] = result_data["strategy"]
-
-        if len(result_data["mean"]):
-            hf["mean"].resize((hf["mean"].shape[0] + len(result_data["mean"])), axis=0)
-            hf["mean"][-len(result_data["mean"]) :] = result_data["mean"]
-
-        if len(result_data["confidence"]):
-            hf["confidence"].resize(
-                (hf["confidence"].shape[0] + len(result_data["confidence"])), axis=0
-            )
-            hf["confidence"][-len(result_data["confidence"]) :] = result_data[
-                "confidence"
-            ]
-
-        if cache.correct is not None:
-            distance = cache.correct - result_data["input"]
-            hf["distance_correct"].resize(
-                (hf["distance_correct"].shape[0] + len(result_data["input"])), axis=0
-            )
-            hf["distance_correct"][-len(result_data["input"]) :] = distance
+    hf["total_time"][()] = now - sim_start
+    hf["generation"][()] = gen_data
 
-            distance_transform = (
-                cache.correct_transform - result_data["input_transform"]
-            )
-            hf["distance_correct_transform"].resize(
-                (
-                    hf["distance_correct_transform"].shape[0]
-                    + len(result_data["input_transform"])
-                ),
-                axis=0,
-            )
-            hf["distance_correct_transform"][
-                -len(result_data["input_transform"]) :
-            ] = distance_transform
-
-        if population_input is not None:
-            hf["population_input"].resize(
-                (hf["population_input"].shape[0] + population_input.shape[0]), axis=0
-            )
-            hf["population_input"][-population_input.shape[0] :] = population_input
-
-        if population_output is not None:
-            hf["population_output"].resize(
-                (hf["population_output"].shape[0] + population_output.shape[0]), axis=0
-            )
-            hf["population_output"][-population_output.shape[0] :] = population_output
+    if len(result_data["strategy"]):
+        hf["strategy"].resize(
+            (hf["strategy"].shape[0] + len(result_data["strategy"])), axis=0
+        )
+        hf["strategy"][-len(result_data["strategy"]) :] = result_data["strategy"]
 
-        if probability is not None:
-            hf["probability"].resize(
-                (hf["probability"].shape[0] + probability.shape[0]), axis=0
-            )
-            hf["probability"][-probability.shape[0] :] = probability
+    if len(result_data["mean"]):
+        hf["mean"].resize((hf["mean"].shape[0] + len(result_data["mean"])), axis=0)
+        hf["mean"][-len(result_data["mean"]) :] = result_data["mean"]
 
-        if cache.debugWrite:
-            mcmc_score = result_data.get("mcmc_score", None)
-            if mcmc_score is not None:
-                hf["mcmc_score"].resize(
-                    (hf["mcmc_score"].shape[0] + len(mcmc_score)), axis=0
-                )
-                hf["mcmc_score"][-len(mcmc_score) :] = mcmc_score
-
-        hf["output"].resize(
-            (hf["output"].shape[0] + len(result_data["output"])), axis=0
+    if len(result_data["confidence"]):
+        hf["confidence"].resize(
+            (hf["confidence"].shape[0] + len(result_data["confidence"])), axis=0
         )
-        hf["output"][-len(result_data["output"]) :] = result_data["output"]
+        hf["confidence"][-len(result_data["confidence"]) :] = result_data[
+            "confidence"
+        ]
 
-        hf["output_meta"].resize(
-            (hf["output_meta"].shape[0] + len(result_data["output_meta"])), axis=0
+    if cache.correct is not None:
+        distance = cache.correct - result_data["input"]
+        hf["distance_correct"].resize(
+            (hf["distance_correct"].shape[0] + len(result_data["input"])), axis=0
         )
-        hf["output_meta"][-len(result_data["output_meta"]) :] = result_data["output_meta"]
+        hf["distance_correct"][-len(result_data["input"]) :] = distance
 
-        hf["input_transform"].resize(
-            (hf["input_transform"].shape[0] + len(result_data["input_transform"])),
+        distance_transform = (
+            cache.correct_transform - result_data["input_transform"]
+        )
+        hf["distance_correct_transform"].resize(
+            (
+                hf["distance_correct_transform"].shape[0]
+                + len(result_data["input_transform"])
+            ),
             axis=0,
         )
-        hf["input_transform"][-len(result_data["input_transform"]) :] = result_data[
-            "input_transform"
-        ]
-
-        if not numpy.array_equal(
-            result_data["input_transform"], result_data["input_transform_extended"]
-        ):
-            hf["input_transform_extended"].resize(
-                (
-                    hf["input_transform_extended"].shape[0]
-                    + len(result_data["input_transform_extended"])
-                ),
-                axis=0,
-            )
-            hf["input_transform_extended"][
-                -len(result_data["input_transform_extended"]) :
-            ] = result_data["input_transform_extended"]
-
-        if len(hof_param):
-            hf["hof_population"].resize((hof_param.shape[0]), axis=0)
-            hf["hof_population"][:] = hof_param
+        hf["distance_correct_transform"][
+            -len(result_data["input_transform"]) :
+        ] = distance_transform
 
-            hf["hof_population_transform"].resize(
-                (hof_param_transform.shape[0]), axis=0
-            )
-            hf["hof_population_transform"][:] = hof_param_transform
-
-            hf["hof_score_original"].resize((data.shape[0]), axis=0)
-            hf["hof_score_original"][:] = data
+    if population_input is not None:
+        hf["population_input"].resize(
+            (hf["population_input"].shape[0] + population_input.shape[0]), axis=0
+        )
+        hf["population_input"][-population_input.shape[0] :] = population_input
 
-            hf["hof_score"].resize((data.shape[0]), axis=0)
-            hf["hof_score"][:] = data
+    if population_output is not None:
+        hf["population_output"].resize(
+            (hf["population_output"].shape[0] + population_output.shape[0]), axis=0
+        )
+        hf["population_output"][-population_output.shape[0] :] = population_output
 
-        if len(meta_param):
-            hf["meta_population"].resize((meta_param.shape[0]), axis=0)
-            hf["meta_population"][:] = meta_param
+    if probability is not None:
+        hf["probability"].resize(
+            (hf["probability"].shape[0] + probability.shape[0]), axis=0
+        )
+        hf["probability"][-probability.shape[0] :] = probability
 
-            hf["meta_population_transform"].resize(
-                (meta_param_transform.shape[0]), axis=0
+    if cache.debugWrite:
+        mcmc_score = result_data.get("mcmc_score", None)
+        if mcmc_score is not None:
+            hf["mcmc_score"].resize(
+                (hf["mcmc_score"].shape[0] + len(mcmc_score)), axis=0
             )
-            hf["meta_population_transform"][:] = meta_param_transform
+            hf["mcmc_score"][-len(mcmc_score) :] = mcmc_score
 
-            hf["meta_score"].resize((data_meta.shape[0]), axis=0)
-            hf["meta_score"][:] = data_meta
+    hf["output"].resize(
+        (hf["output"].shape[0] + len(result_data["output"])), axis=0
+    )
+    hf["output"][-len(result_data["output"]) :] = result_data["output"]
 
-        if len(grad_param):
-            if "grad_population" in hf:
-                hf["grad_population"].resize((grad_param.shape[0]), axis=0)
-                hf["grad_population"][:] = grad_param
+    hf["output_meta"].resize(
+        (hf["output_meta"].shape[0] + len(result_data["output_meta"])), axis=0
+    )
+    hf["output_meta"][-len(result_data["output_meta"]) :] = result_data["output_meta"]
 
-                hf["grad_population_transform"].resize(
-                    (grad_param_transform.shape[0]), axis=0
-                )
-                hf["grad_population_transform"][:] = grad_param_transform
+    hf["input_transform"].resize(
+        (hf["input_transform"].shape[0] + len(result_data["input_transform"])),
+        axis=0,
+    )
+    hf["input_transform"][-len(result_data["input_transform"]) :] = result_data[
+        "input_transform"
+    ]
+
+    if not numpy.array_equal(
+        result_data["input_transform"], result_data["input_transform_extended"]
+    ):
+        hf["input_transform_extended"].resize(
+            (
+                hf["input_transform_extended"].shape[0]
+                + len(result_data["input_transform_extended"])
+            ),
+            axis=0,
+        )
+        hf["input_transform_extended"][
+            -len(result_data["input_transform_extended"]) :
+        ] = result_data["input_transform_extended"]
+
+    if len(hof_param):
+        replace_rows(hf, "hof_population", hof_param, written)
+        replace_rows(hf, "hof_population_transform", hof_param_transform, written)
+        replace_rows(hf, "hof_score_original", data, written)
+        replace_rows(hf, "hof_score", data, written)
+
+    if len(meta_param):
+        replace_rows(hf, "meta_population", meta_param, written)
+        replace_rows(hf, "meta_population_transform", meta_param_transform, written)
+        replace_rows(hf, "meta_score", data_meta, written)
+
+    if len(grad_param):
+        if "grad_population" in hf:
+            replace_rows(hf, "grad_population", grad_param, written)
+            replace_rows(hf, "grad_population_transform", grad_param_transform, written)
+            replace_rows(hf, "grad_score_original", data_grad, written)
+            replace_rows(hf, "grad_score", data_grad, written)
+        else:
+            h5store.create_rows(hf, "grad_population", grad_param, cache.resultStorage)
+            h5store.create_rows(hf, "grad_population_transform", grad_param_transform, cache.resultStorage)
+            h5store.create_rows(hf, "grad_score_original", data_grad, cache.resultStorage)
 
-                hf["grad_score_original"].resize((data_grad.shape[0]), axis=0)
-                hf["grad_score_original"][:] = data_grad
+            h5store.create_rows(hf, "grad_score", data_grad, cache.resultStorage)
 
-                hf["grad_score"].resize((data_grad.shape[0]), axis=0)
-                hf["grad_score"][:] = data_grad
-            else:
-                hf.create_dataset(
-                    "grad_population",
-                    data=grad_param,
-                    maxshape=(None, grad_param.shape[1]),
-                )
-                hf.create_dataset(
-                    "grad_population_transform",
-                    data=grad_param_transform,
-                    maxshape=(None, grad_param_transform.shape[1]),
-                )
-                hf.create_dataset(
-                    "grad_score_original",
-                    data=data_grad,
-                    maxshape=(None, data_grad.shape[1]),
-                )
+    if cache.fullTrainingData:
 
-                hf.create_dataset(
-                    "grad_score",
-                    data=data_grad,
-                    maxshape=(None, data_grad.shape[1]),
-                )
+        for filename, chroma in result_data["results"].items():
+            hf[filename].resize((hf[filename].shape[0] + len(chroma)), axis=0)
+            hf[filename][-len(chroma) :] = chroma
 
-        if cache.fullTrainingData:
 
-            for filename, chroma in result_data["results"].items():
-                hf[filename].resize((hf[filename].shape[0] + len(chroma)), axis=0)
-                hf[filename][-len(chroma) :] = chroma
+def replace_rows(hf, name, data, written):
+    "replace the content of a front dataset, skipped when it is the same as the last time it was written"
+    previous = written.get(name, None)
+    if previous is not None and numpy.array_equal(previous, data):
+        return
+    hf[name].resize((data.shape[0]), axis=0)
+    hf[name][:] = data
+    written[name] = data
 
 
 def numpy_result_data(result_data):
@@ -609,55 +488,42 @@ def writeProgress(
         resultDir = Path(cache.settings["resultsDir"])
         result_h5 = resultDir / "result.h5"
 
-        lock = filelock.FileLock(result_h5.as_posix() + '.lock')
-
-        if not result_h5.exists():
-            with lock:
-                write_results(
-                    cache,
-                    result_h5,
-                    result_data,
-                    gen_data,
-                    now,
-                    sim_start,
-                    population_input,
-                    population_output,
-                    data,
-                    hof_param,
-                    hof_param_transform,
-                    data_meta,
-                    meta_param,
-                    meta_param_transform,
-                    data_grad,
-                    grad_param,
-                    grad_param_transform,
-                    probability,
-                )
-        else:
-            with lock:
-                update_results(
-                    cache,
-                    result_h5,
-                    result_data,
-                    gen_data,
-                    now,
-                    sim_start,
-                    population_input,
-                    population_output,
-                    data,
-                    hof_param,
-                    hof_param_transform,
-                    data_meta,
-                    meta_param,
-                    meta_param_transform,
-                    data_grad,
-                    grad_param,
-                    grad_param_transform,
-                    probability,
-                )
+        writer = h5store.get_writer(result_h5, cache.resultFlushTime)
 
+        # the writer thread gets the data of this generation, result_data is refilled by the next one
+        generation_data = dict(result_data)
         clear_result_data(result_data)
 
+        def write(hf):
+            arguments = (
+                generation_data,
+                gen_data,
+                now,
+                sim_start,
+                population_input,
+                population_output,
+                data,
+                hof_param,
+                hof_param_transform,
+                data_meta,
+                meta_param,
+                meta_param_transform,
+                data_grad,
+                grad_param,
+                grad_param_transform,
+                probability,
+            )
+            if "input" in hf:
+                update_results(cache, hf, *arguments, writer.written)
+            else:
+                write_results(cache, hf, *arguments)
+
+        required = ["input", "grad_population"] if len(grad_param) else ["input"]
+        background.submit(writer.write, write, required)
+
+        if cache.simulationArchive:
+            background.submit(archive.write, cache, generation_data)
+
     write_progress_csv(
         cache,
         data_meta,
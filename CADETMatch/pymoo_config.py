@@ -1,12 +1,14 @@
-import csv
 import time
 import numpy
 import random
 import pickle
 from pathlib import Path
 
+import CADETMatch.artifacts as artifacts
+import CADETMatch.background as background
 import CADETMatch.pareto as pareto
 import CADETMatch.progress as progress
+import CADETMatch.records as records
 import CADETMatch.sub as sub
 import CADETMatch.util as util
 import CADETMatch.pop as pop
@@ -80,7 +82,14 @@ def run(cache, alg="unsga3"):
 
     totalGenerations = parameters * cache.settings.get("generations", 1000)
 
-    init_pop = util.sobolPopulation(populationSize, parameters, numpy.array(cache.MIN_VALUE), numpy.array(cache.MAX_VALUE))
+    init_pop = artifacts.cached_arrays(
+        cache,
+        "sobol",
+        [populationSize, parameters, cache.MIN_VALUE, cache.MAX_VALUE],
+        lambda: {
+            "population": util.sobolPopulation(populationSize, parameters, numpy.array(cache.MIN_VALUE), numpy.array(cache.MAX_VALUE))
+        },
+    )["population"]
 
     if "seeds" in cache.settings:
         seed_pop = [
@@ -90,9 +99,8 @@ def run(cache, alg="unsga3"):
         init_pop = numpy.concatenate([init_pop, numpy.array(seed_pop)], axis=0)
 
     
-    path = Path(cache.settings["resultsDirBase"], cache.settings["csv"])
-    with path.open("a", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_ALL)
+    with records.RecordSink(cache) as writer:
+        csvfile = writer
 
         checkpointFile = Path(
             cache.settings["resultsDirMisc"], cache.settings.get("checkpointFile", "check")
@@ -126,7 +134,7 @@ def run(cache, alg="unsga3"):
                 )
             meta_hof = pareto.ParetoFront(dimensions=len(cache.WORST_META),
                 similar=pareto.similar, similar_fit=pareto.similar_fit_meta(cache),
-                slice_object=cache.meta_slice
+                slice_object=cache.meta_slice, epsilon=cache.metaEpsilon
             )
             grad_hof = pareto.ParetoFront(dimensions=len(cache.WORST),
                 similar=pareto.similar, similar_fit=pareto.similar_fit(cache)
@@ -159,7 +167,12 @@ def run(cache, alg="unsga3"):
 
         numRefDirs = min(populationSize, 1000)
 
-        ref_dirs = get_reference_directions("energy", cache.numGoals, numRefDirs, seed=1)
+        ref_dirs = artifacts.cached_arrays(
+            cache,
+            "ref_dirs",
+            ["energy", cache.numGoals, numRefDirs, 1],
+            lambda: {"ref_dirs": get_reference_directions("energy", cache.numGoals, numRefDirs, seed=1)},
+        )["ref_dirs"]
 
 
         if pymoo_checkpointFile.exists():
@@ -209,13 +222,12 @@ def run(cache, alg="unsga3"):
                 progress_halloffame=progress_hof,
             )
 
-            with checkpointFile.open("wb") as cp_file:
-                pickle.dump(cp, cp_file)
+            background.write_checkpoint(checkpointFile, cp)
 
             #can't pickle the pool and other things so all of that is just stored in problem_state
             #just temporarily unhook it from the problem and then add it back
             del algorithm.problem.problem_state
-            numpy.save(pymoo_checkpointFile, algorithm)
+            background.save_array(pymoo_checkpointFile, algorithm)
             algorithm.problem.problem_state = problem_state
 
             if stop_iteration(best, stalled, cache):
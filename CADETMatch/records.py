@@ -0,0 +1,249 @@
+"""Evaluation records. Every evaluated individual is stored column by column in evaluations.h5 instead of a csv row,
+results.csv is only written when it is exported. Changes of the meta front are stored the same way in meta_front.h5"""
+
+import csv
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy
+
+import CADETMatch.background as background
+import CADETMatch.h5store as h5store
+
+records_name = "evaluations.h5"
+
+# kept in resultsDirBase, front_files removes every HDF5 file in resultsDirMeta that does not belong to a front member
+meta_name = "meta_front.h5"
+
+# path -> MetaFrontStore of the runs in this process
+meta_stores = {}
+
+# RecordSinks open in this process, everything they buffer is written at every checkpoint
+sinks = []
+
+# rows collected before they are written even if resultFlushTime has not passed
+buffer_rows = 10000
+
+# rows converted at once when records are exported or read
+block_rows = 100000
+
+# the first columns of cache.headers are stored as strings, the rest as float64
+text_columns = {"time": "S24", "name": "S32", "method": "S16", "condition": "S32"}
+
+
+def records_path(cache):
+    return Path(cache.settings["resultsDirBase"]) / records_name
+
+
+class RecordSink:
+    """collects the csv lines of process_population and gradFD.search and appends them to evaluations.h5 in blocks. It
+    takes the place of both the csv writer (writerows) and the csv file (flush) in the search methods"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.writer = h5store.get_writer(records_path(cache), cache.resultFlushTime)
+        self.rows = []
+        self.last_write = time.time()
+        sinks.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def writerows(self, rows):
+        self.rows.extend(rows)
+
+    def flush(self, force=False):
+        "write the collected rows once there are enough of them or resultFlushTime has passed"
+        if not self.rows:
+            return
+        if force or len(self.rows) >= buffer_rows or time.time() - self.last_write >= self.cache.resultFlushTime:
+            columns = split_rows(self.rows, len(self.cache.headers))
+            background.submit(self.writer.write, append_records, ["values"], columns, self.cache)
+            self.rows = []
+            self.last_write = time.time()
+
+    def close(self):
+        self.flush(force=True)
+        background.submit(self.writer.flush)
+        if self in sinks:
+            sinks.remove(self)
+
+
+def flush_sinks():
+    "write the rows every open sink buffers so a checkpoint never covers evaluations that are only in memory"
+    for sink in sinks:
+        sink.flush(force=True)
+
+
+def checkpoint_barrier():
+    "the rows of every sink and a flush of every result file are queued before a checkpoint is written"
+    flush_sinks()
+    h5store.flush_writers()
+
+
+background.barriers.append(checkpoint_barrier)
+
+
+def split_rows(rows, width):
+    columns = {}
+    for idx, (name, dtype) in enumerate(text_columns.items()):
+        columns[name] = numpy.array([str(row[idx]) for row in rows], dtype=dtype)
+    columns["values"] = numpy.array([row[len(text_columns) :] for row in rows], dtype=numpy.float64).reshape(
+        len(rows), width - len(text_columns)
+    )
+    return columns
+
+
+def append_records(hf, columns, cache):
+    if "values" not in hf:
+        hf.attrs["headers"] = numpy.array([header.encode("utf-8") for header in cache.headers])
+        hf.attrs["csv"] = cache.settings["csv"]
+        for name, data in columns.items():
+            h5store.create_rows(hf, name, data, cache.resultStorage)
+        return
+
+    for name, data in columns.items():
+        hf[name].resize((hf[name].shape[0] + len(data)), axis=0)
+        hf[name][-len(data) :] = data
+
+
+class MetaFrontStore:
+    """the meta front keyed by the name of its members. Members that join the front are appended with their csv line
+    and members that leave it get a tombstone so a generation only writes what changed. results.csv and results.xlsx
+    of resultsDirMeta are materialized from it every metaCSVTime seconds and when the search finishes"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.path = Path(cache.settings["resultsDirBase"]) / meta_name
+        self.csv_path = Path(cache.settings["resultsDirMeta"]) / "results.csv"
+        self.writer = h5store.get_writer(self.path, cache.resultFlushTime)
+        self.members = set(live_rows(self.path)) if self.path.exists() else set()
+        self.last_export = time.time()
+        self.changed = False
+
+    def update(self, meta_hof):
+        current = {ind.csv_line[1]: ind.csv_line for ind in meta_hof.items}
+        added = [line for name, line in current.items() if name not in self.members]
+        removed = [name for name in self.members if name not in current]
+
+        if added or removed:
+            width = len(self.cache.headers)
+            tombstones = [[time.ctime(), name, "", ""] + [numpy.nan] * (width - len(text_columns)) for name in removed]
+            columns = split_rows(added + tombstones, width)
+            columns["alive"] = numpy.array([1] * len(added) + [0] * len(removed), dtype=numpy.int8)
+            background.submit(self.writer.write, append_records, ["values"], columns, self.cache)
+            self.members = set(current)
+            self.changed = True
+
+        if self.changed and time.time() - self.last_export >= self.cache.metaCSVTime:
+            self.export()
+
+    def export(self):
+        export_meta(self.path, self.csv_path)
+        self.last_export = time.time()
+        self.changed = False
+
+
+def get_meta_store(cache):
+    path = (Path(cache.settings["resultsDirBase"]) / meta_name).as_posix()
+    if path not in meta_stores:
+        meta_stores[path] = MetaFrontStore(cache)
+    return meta_stores[path]
+
+
+def export_meta_fronts():
+    "materialize every meta front that changed since its last export"
+    for store in meta_stores.values():
+        if store.changed:
+            store.export()
+
+
+def live_rows(path):
+    "name -> row of the meta front members of path, rows with a later tombstone are left out"
+    with h5store.open_results(path) as hf:
+        names = hf["name"][()].astype(str)
+        alive = hf["alive"][()]
+
+    live = {}
+    for row, (name, flag) in enumerate(zip(names, alive)):
+        if flag:
+            live[name] = row
+        else:
+            live.pop(name, None)
+    return live
+
+
+def export_meta(path, csv_path):
+    "write the live members of the meta front store path to csv_path and an xlsx file next to it"
+    import pandas
+
+    rows = numpy.array(sorted(live_rows(path).values()), dtype=int)
+    with h5store.open_results(path) as hf:
+        headers = [header.decode("utf-8") for header in hf.attrs["headers"]]
+        frame = pandas.DataFrame(hf["values"][()][rows], columns=headers[len(text_columns) :])
+        for idx, name in enumerate(text_columns):
+            frame.insert(idx, headers[idx], hf[name][()][rows].astype(str))
+
+    # replaced at once so a reader never sees a partial file
+    csv_path = Path(csv_path)
+    temp = csv_path.with_name(csv_path.name + ".tmp")
+    frame.to_csv(temp, quoting=csv.QUOTE_ALL, index=False)
+    os.replace(temp, csv_path)
+    frame.to_excel(csv_path.with_suffix(".xlsx"), index=False)
+
+
+def locate(path):
+    "evaluations.h5 in a result directory or the file itself"
+    path = Path(path)
+    if path.is_dir():
+        path = path / records_name
+    return path
+
+
+def read_records(path):
+    "all records of path as a pandas DataFrame with the column names of results.csv"
+    import pandas
+
+    with h5store.open_results(locate(path)) as hf:
+        headers = [header.decode("utf-8") for header in hf.attrs["headers"]]
+        frame = pandas.DataFrame(hf["values"][()], columns=headers[len(text_columns) :])
+        for idx, name in enumerate(text_columns):
+            frame.insert(idx, headers[idx], hf[name][()].astype(str))
+    return frame
+
+
+def export_csv(path, csv_path=None):
+    """write the records of path as results.csv (the csv setting of the run) next to evaluations.h5 in the format the
+    search methods used to write, returns the path of the csv file"""
+    path = locate(path)
+    with h5store.open_results(path) as hf:
+        headers = [header.decode("utf-8") for header in hf.attrs["headers"]]
+        if csv_path is None:
+            csv_path = path.parent / hf.attrs["csv"]
+
+        with Path(csv_path).open("w", newline="") as csvfile:
+            writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_ALL)
+            writer.writerow(headers)
+
+            rows = hf["values"].shape[0]
+            for start in range(0, rows, block_rows):
+                stop = min(start + block_rows, rows)
+                text = [hf[name][start:stop].astype(str).tolist() for name in text_columns]
+                values = hf["values"][start:stop].tolist()
+                writer.writerows(list(row) + value for *row, value in zip(*text, values))
+    return csv_path
+
+
+def main(path):
+    csv_path = export_csv(path)
+    print("wrote %s" % csv_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1]))
@@ -1,19 +1,22 @@
 import math
 import multiprocessing
 import sys
+from pathlib import Path
 
 import numpy
 import numpy.linalg
-import SALib.sample.sobol_sequence
 import scipy.interpolate
 import scipy.optimize
 import scipy.signal
-import scipy.stats
 
 import CADETMatch.calc_coeff as calc_coeff
 import CADETMatch.util as util
 import numba
 
+# engine used by pearson_spline_fun to find the time offset, set from the offsetSearch setting
+# fft, fft_parabolic, grid or validate
+offset_search = "fft"
+
 
 def roll_spline(times, values, shift):
     "this function does approximately what the roll function does except that is used the spline so the shift does not have to be an integer and the points are resampled"
@@ -66,8 +69,7 @@ def pearson_spline(exp_time_values, sim_data_values, exp_data_values):
     )
     return pearson_spline_fun(exp_time_values, exp_data_values, sim_spline)
 
-@numba.njit(fastmath=True)
-def pearsonr_mat(x, Y, times):
+def pearsonr_mat_kernel(x, Y, times):
     r = numpy.zeros(Y.shape[0])
     xm = x - x.mean()
     
@@ -89,6 +91,33 @@ def pearsonr_mat(x, Y, times):
             r[i] = min(max(r_num/(r_x_den*r_y_den), -1.0), 1.0) * min_fun
     return r
 
+pearsonr_mat = numba.njit(fastmath=True)(pearsonr_mat_kernel)
+
+# directory of the on-disk numba compilation cache, the first one set in a process is kept
+numba_cache_dir = None
+
+
+def setup_numba(cache_dir):
+    "compile the numba kernels with an on-disk cache in cache_dir so each process only compiles them once per run"
+    global numba_cache_dir, pearsonr_mat
+    if numba_cache_dir is not None:
+        return
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    numba.config.CACHE_DIR = cache_dir.as_posix()
+    numba_cache_dir = cache_dir
+    pearsonr_mat = numba.njit(fastmath=True, cache=True)(pearsonr_mat_kernel)
+
+
+def warmup_numba():
+    "compile the numba kernels or load them from the disk cache before they are needed"
+    times = numpy.linspace(0.0, 1.0, 16)
+    values = numpy.exp(-((times - 0.5) ** 2))
+    pearsonr_mat(values, numpy.zeros([2, len(values)]), times)
+
+
 def eval_offsets(offsets, sim_spline, exp_time_values, exp_data_values):
     rol_mat = numpy.zeros([len(offsets), len(exp_data_values)])
 
@@ -99,6 +128,8 @@ def eval_offsets(offsets, sim_spline, exp_time_values, exp_data_values):
     return scores
 
 def pearson_offset(offset, times, sim_data, exp_data):
+    import scipy.stats
+
     sim_spline = scipy.interpolate.InterpolatedUnivariateSpline(times, sim_data, ext=1)
     sim_data_offset = sim_spline(times - offset)
     try:
@@ -116,6 +147,25 @@ def pearson_offset(offset, times, sim_data, exp_data):
 
 def pearson_spline_fun(
     exp_time_values, exp_data_values, sim_spline, size=20, nest=50, bounds=2, tol=1e-13
+):
+    "find the time offset with the best pearson correlation, uses the fft search for uniform times and the grid search otherwise"
+    if offset_search == "grid" or not uniform_times(exp_time_values):
+        return pearson_spline_grid(
+            exp_time_values, exp_data_values, sim_spline, size, nest, bounds, tol
+        )
+    elif offset_search == "validate":
+        return pearson_spline_validate(
+            exp_time_values, exp_data_values, sim_spline, size, nest, bounds, tol
+        )
+    elif offset_search == "fft_parabolic":
+        return pearson_spline_fft(
+            exp_time_values, exp_data_values, sim_spline, refine="parabolic"
+        )
+    return pearson_spline_fft(exp_time_values, exp_data_values, sim_spline)
+
+
+def pearson_spline_grid(
+    exp_time_values, exp_data_values, sim_spline, size=20, nest=50, bounds=2, tol=1e-13
 ):
     for i in range(nest + 1):
         if i == 0:
@@ -181,7 +231,13 @@ def pearson_spline_fun(
 
     dt, time_found, goal_found = util.find_opt_poly(offsets, pearson, idx)
 
-    # calculate pearson correlation at the new time
+    return pearson_time(exp_time_values, exp_data_values, sim_spline, dt), dt
+
+
+def pearson_time(exp_time_values, exp_data_values, sim_spline, dt):
+    "calculate the pearson score with the simulation shifted by dt"
+    import scipy.stats
+
     sim_data_values_copy = sim_spline(exp_time_values - dt)
     try:
         pear = scipy.stats.pearsonr(exp_data_values, sim_data_values_copy)[0]
@@ -192,9 +248,114 @@ def pearson_spline_fun(
             list(sim_data_values_copy),
         )
         pear = 0
-    score_local = pear_corr(pear)
+    return pear_corr(pear)
+
+
+def uniform_times(times, tolerance=0.01):
+    "same criteria smoothing.resample uses to decide if the time steps are consistent"
+    if len(times) < 3:
+        return False
+    diff_times = times[1:] - times[:-1]
+    min_time = numpy.min(diff_times)
+    if min_time <= 0:
+        return False
+    return (numpy.max(diff_times) - min_time) / min_time <= tolerance
+
+
+def pearson_offsets_fft(exp_data_values, sim_data_values, min_overlap=1e-6):
+    """pearson correlation for every whole sample shift of the simulation against the experiment
+
+    The simulation is treated as zero outside of the experimental window (the same as the ext=1 spline used by the grid search)
+    so the numerator is a single fft cross-correlation and the simulation variance for each shift comes from cumulative sums.
+    Returns the shifts in samples and the correlation for each shift."""
+    n = len(exp_data_values)
+    xm = exp_data_values - numpy.mean(exp_data_values)
+    r_x_den = numpy.linalg.norm(xm)
+
+    numerator = scipy.signal.correlate(xm, sim_data_values, mode="full", method="fft")
+    lags = numpy.arange(-(n - 1), n)
 
-    return score_local, dt
+    # part of the simulation that is still inside the window for each shift
+    lower = numpy.clip(-lags, 0, n)
+    upper = numpy.clip(n - lags, 0, n)
+
+    cum_sum = numpy.concatenate([[0.0], numpy.cumsum(sim_data_values)])
+    cum_sum_sq = numpy.concatenate([[0.0], numpy.cumsum(sim_data_values ** 2)])
+
+    sim_sum = cum_sum[upper] - cum_sum[lower]
+    sim_sum_sq = cum_sum_sq[upper] - cum_sum_sq[lower]
+
+    r_y_den = numpy.sqrt(numpy.clip(sim_sum_sq - sim_sum ** 2 / n, 0.0, None))
+
+    # shifts where almost nothing of the simulation is left in the window are dominated by fft round off
+    valid = r_y_den > min_overlap * numpy.max(r_y_den)
+
+    pearson = numpy.full(len(lags), -1.0)
+    if r_x_den > 0:
+        pearson[valid] = numpy.clip(
+            numerator[valid] / (r_x_den * r_y_den[valid]), -1.0, 1.0
+        )
+    return lags, pearson
+
+
+def parabolic_peak(y, index):
+    "sub-sample position of the maximum of y near index based on a parabola through 3 points"
+    index = min(max(index, 1), len(y) - 2)
+    y0, y1, y2 = y[index - 1], y[index], y[index + 1]
+    den = y0 - 2 * y1 + y2
+    if den >= 0:
+        # not a maximum, the points are flat or convex
+        return float(index)
+    return index + float(numpy.clip(0.5 * (y0 - y2) / den, -1.0, 1.0))
+
+
+def pearson_spline_fft(exp_time_values, exp_data_values, sim_spline, refine="spline"):
+    """fft based version of pearson_spline_grid for uniformly spaced exp_time_values
+
+    The best whole sample shift is refined with a parabola, with refine="spline" the offset is then polished with a bounded
+    search on the spline within one sample of the parabola estimate. The parabola alone is biased when the optimum sits on
+    a kink (such as a breakthrough curve where the best offset is at the edge)."""
+    dt_sample = (exp_time_values[-1] - exp_time_values[0]) / (len(exp_time_values) - 1)
+
+    sim_data_values = sim_spline(exp_time_values)
+    lags, pearson = pearson_offsets_fft(exp_data_values, sim_data_values)
+
+    idx = parabolic_peak(pearson, int(numpy.argmax(pearson)))
+    dt = (idx - (len(exp_time_values) - 1)) * dt_sample
+
+    if refine == "spline":
+
+        def goal(offset):
+            return pearson_time(exp_time_values, exp_data_values, sim_spline, offset)
+
+        result = scipy.optimize.minimize_scalar(
+            goal, bounds=(dt - dt_sample, dt + dt_sample), method="bounded"
+        )
+        dt = float(result.x)
+
+    return pearson_time(exp_time_values, exp_data_values, sim_spline, dt), dt
+
+
+def pearson_spline_validate(
+    exp_time_values, exp_data_values, sim_spline, size=20, nest=50, bounds=2, tol=1e-13
+):
+    "run the grid and fft offset search, log when they disagree and return the grid result"
+    score_grid, dt_grid = pearson_spline_grid(
+        exp_time_values, exp_data_values, sim_spline, size, nest, bounds, tol
+    )
+    score_fft, dt_fft = pearson_spline_fft(exp_time_values, exp_data_values, sim_spline)
+
+    dt_sample = (exp_time_values[-1] - exp_time_values[0]) / (len(exp_time_values) - 1)
+
+    if abs(dt_grid - dt_fft) > dt_sample or abs(score_grid - score_fft) > 1e-3:
+        multiprocessing.get_logger().warn(
+            "offset search mismatch grid dt: %s score: %s  fft dt: %s score: %s",
+            dt_grid,
+            score_grid,
+            dt_fft,
+            score_fft,
+        )
+    return score_grid, dt_grid
 
 
 def time_function_decay(max_time):
@@ -3,7 +3,7 @@ import sys
 
 import numpy
 import numpy.linalg
-import scipy.stats
+import scipy.interpolate
 from addict import Dict
 
 import CADETMatch.score as score
@@ -47,12 +47,9 @@ def run(sim_data, feature):
     exp_time_values = exp_time_values[selected]
     exp_data_zero = feature["exp_data_zero"]
 
-    sim_data_values_smooth = smoothing.smooth_data(
-        sim_time_values,
-        sim_data_values,
-        feature["critical_frequency"],
-        feature["smoothing_factor"],
-    )
+    sim_data_values_smooth = smoothing.smooth_simulation(
+        sim_data, feature, sim_time_values, sim_data_values, derivative=False
+    )[0]
     (
         sim_data_zero,
         sim_min_time,
@@ -87,6 +84,9 @@ def setup(sim, feature, selectedTimes, selectedValues, CV_time, abstol, cache):
     smooth_value, values_der = smoothing.full_smooth(
         selectedTimes, selectedValues, crit_fs, s, crit_fs_der
     )
+    smooth_operator = smoothing.setup_operator(
+        selectedTimes, selectedValues, crit_fs, s, crit_fs_der, name, cache
+    )
 
     spline_der = scipy.interpolate.InterpolatedUnivariateSpline(
         selectedTimes, values_der, ext=1
@@ -130,6 +130,7 @@ def setup(sim, feature, selectedTimes, selectedValues, CV_time, abstol, cache):
     temp["smoothing_factor"] = s
     temp["critical_frequency"] = crit_fs
     temp["critical_frequency_der"] = crit_fs_der
+    temp["smooth_operator"] = smooth_operator
     temp["smooth_value"] = smooth_value
     return temp
 
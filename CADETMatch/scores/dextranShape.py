@@ -2,7 +2,7 @@ import multiprocessing
 
 import numpy
 import numpy.linalg
-import scipy.stats
+import scipy.interpolate
 from addict import Dict
 
 import CADETMatch.score as score
@@ -2,7 +2,9 @@ import multiprocessing
 
 import numpy
 import pandas
+import scipy.interpolate
 import scipy.optimize
+import scipy.stats
 from addict import Dict
 
 import CADETMatch.score as score
@@ -28,11 +30,21 @@ def get_settings(feature):
     return settings
 
 
-def goal(offset, frac_exp, sim_data_time, spline, start, stop):
-    frac_sim = util.fractionate_spline(start + offset, stop + offset, spline)
+def goal(offset, frac_exp, antiderivative, start, stop):
+    frac_sim = util.fractionate_antiderivative(start + offset, stop + offset, antiderivative)
     return float(numpy.sum((frac_exp - frac_sim) ** 2))
 
 
+def goal_offsets(offsets, frac_exp, antiderivative, start, stop):
+    "goal for every offset at once, rows of the fraction matrix are offsets"
+    frac_sim = util.fractionate_antiderivative(
+        start[numpy.newaxis, :] + offsets[:, numpy.newaxis],
+        stop[numpy.newaxis, :] + offsets[:, numpy.newaxis],
+        antiderivative,
+    )
+    return numpy.sum((frac_exp[numpy.newaxis, :] - frac_sim) ** 2, axis=1)
+
+
 def run(sim_data, feature):
     simulation = sim_data["simulation"]
     timeFunc = feature["timeFunc"]
@@ -66,24 +78,15 @@ def run(sim_data, feature):
         ]
 
         spline = scipy.interpolate.InterpolatedUnivariateSpline(times, sim_value, ext=1)
+        antiderivative = util.spline_antiderivative(spline)
 
         lb = times[numpy.argmax(sim_value)] - times[-1]
         ub = times[numpy.argmax(sim_value)] - times[0]
 
         # getting a starting point estimate
         offsets = numpy.linspace(lb, ub, 100)
-        errors = numpy.array(
-            [
-                goal(
-                    offset,
-                    exp_values[selected],
-                    times,
-                    spline,
-                    start[selected],
-                    stop[selected],
-                )
-                for offset in offsets
-            ]
+        errors = goal_offsets(
+            offsets, exp_values[selected], antiderivative, start[selected], stop[selected]
         )
         idx_min = numpy.argmin(errors)
 
@@ -94,7 +97,7 @@ def run(sim_data, feature):
         result_powell = scipy.optimize.minimize(
             goal,
             offset_start,
-            args=(exp_values[selected], times, spline, start[selected], stop[selected]),
+            args=(exp_values[selected], antiderivative, start[selected], stop[selected]),
             method="powell",
             bounds=[
                 (min_offsets[0], min_offsets[-1]),
@@ -103,8 +106,8 @@ def run(sim_data, feature):
 
         time_offset = result_powell.x[0]
 
-        fracOffset = util.fractionate_spline(
-            start[selected] - time_offset, stop[selected] - time_offset, spline
+        fracOffset = util.fractionate_antiderivative(
+            start[selected] - time_offset, stop[selected] - time_offset, antiderivative
         )
 
         # if the simulation scale and exp scale are too different the estimation of similarity, offset etc is not accurate discard if value max/min > 1e3
@@ -1,6 +1,5 @@
 import numpy
 import scipy.interpolate
-import scipy.stats
 from addict import Dict
 
 import CADETMatch.score as score
@@ -103,12 +102,8 @@ def run(sim_data, feature):
     min_value = feature["min_value"]
     max_value = feature["max_value"]
 
-    sim_data_values_smooth, sim_data_values_der_smooth = smoothing.full_smooth(
-        exp_time_values,
-        sim_data_values,
-        feature["critical_frequency"],
-        feature["smoothing_factor"],
-        feature["critical_frequency_der"],
+    sim_data_values_smooth, sim_data_values_der_smooth = smoothing.smooth_simulation(
+        sim_data, feature, exp_time_values, sim_data_values
     )
 
     ret = slice_back_values(
@@ -174,6 +169,9 @@ def setup(sim, feature, selectedTimes, selectedValues, CV_time, abstol, cache):
     exp_data_values_smooth, exp_data_values_der_smooth = smoothing.full_smooth(
         selectedTimes, selectedValues, crit_fs, s, crit_fs_der
     )
+    smooth_operator = smoothing.setup_operator(
+        selectedTimes, selectedValues, crit_fs, s, crit_fs_der, name, cache
+    )
 
     [high, low] = util.find_peak(selectedTimes, exp_data_values_der_smooth)
 
@@ -204,6 +202,7 @@ def setup(sim, feature, selectedTimes, selectedValues, CV_time, abstol, cache):
     temp["smoothing_factor"] = s
     temp["critical_frequency"] = crit_fs
     temp["critical_frequency_der"] = crit_fs_der
+    temp["smooth_operator"] = smooth_operator
     temp["new_times"] = selectedTimes
     temp["exp_data_values_smooth"] = exp_data_values_smooth
     temp["exp_data_values_der_smooth"] = exp_data_values_der_smooth
@@ -1,6 +1,5 @@
 import numpy
 import scipy.interpolate
-import scipy.stats
 from addict import Dict
 
 import CADETMatch.score as score
@@ -32,12 +31,8 @@ def run(sim_data, feature):
     exp_data_values = feature["value"][selected]
     exp_time_values = feature["time"][selected]
 
-    sim_data_values_smooth, sim_data_values_der_smooth = smoothing.full_smooth(
-        exp_time_values,
-        sim_data_values,
-        feature["critical_frequency"],
-        feature["smoothing_factor"],
-        feature["critical_frequency_der"],
+    sim_data_values_smooth, sim_data_values_der_smooth = smoothing.smooth_simulation(
+        sim_data, feature, exp_time_values, sim_data_values
     )
 
     [high, low] = util.find_peak(exp_time_values, sim_data_values_smooth)
@@ -74,6 +69,9 @@ def setup(sim, feature, selectedTimes, selectedValues, CV_time, abstol, cache):
     exp_data_values_smooth, exp_data_values_der_smooth = smoothing.full_smooth(
         selectedTimes, selectedValues, crit_fs, s, crit_fs_der
     )
+    smooth_operator = smoothing.setup_operator(
+        selectedTimes, selectedValues, crit_fs, s, crit_fs_der, name, cache
+    )
 
     temp = {}
     temp["peak"] = util.find_peak(selectedTimes, exp_data_values_smooth)[0]
@@ -83,6 +81,7 @@ def setup(sim, feature, selectedTimes, selectedValues, CV_time, abstol, cache):
     temp["smoothing_factor"] = s
     temp["critical_frequency"] = crit_fs
     temp["critical_frequency_der"] = crit_fs_der
+    temp["smooth_operator"] = smooth_operator
     temp["smooth_value"] = exp_data_values_smooth
     temp["smooth_value_der"] = exp_data_values_der_smooth
     return temp
@@ -1,5 +1,4 @@
 import numpy
-import scipy.stats
 from addict import Dict
 
 import CADETMatch.score as score
@@ -1,15 +1,14 @@
 import array
-import csv
 import multiprocessing
 import time
-from pathlib import Path
 
 import numpy
-from cadet import H5
 
+import CADETMatch.h5store as h5store
 import CADETMatch.jacobian as jacobian
 import CADETMatch.pareto as pareto
 import CADETMatch.progress as progress
+import CADETMatch.records as records
 import CADETMatch.sub as sub
 import CADETMatch.util as util
 import CADETMatch.pop as pop
@@ -19,9 +18,8 @@ name = "AltScore"
 
 def run(cache):
     "run the parameter estimation"
-    path = Path(cache.settings["resultsDirBase"], cache.settings["csv"])
-    with path.open("a", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_ALL)
+    with records.RecordSink(cache) as writer:
+        csvfile = writer
         sim_start = generation_start = time.time()
         result_data = {
             "input": [],
@@ -37,9 +35,7 @@ def run(cache):
         }
 
         previousResults = cache.settings["PreviousResults"]
-        data = H5()
-        data.filename = previousResults
-        data.load(paths=["/meta_population", "/meta_population_transform"], lock=True)
+        data = h5store.load_results(previousResults, paths=["/meta_population", "/meta_population_transform"])
 
         meta_population = data.root.meta_population
         meta_population_transform = data.root.meta_population_transform
@@ -69,7 +65,7 @@ def run(cache):
             )
         meta_hof = pareto.ParetoFront(dimensions=len(cache.WORST_META),
             similar=pareto.similar, similar_fit=pareto.similar_fit_meta(cache),
-            slice_object=cache.meta_slice
+            slice_object=cache.meta_slice, epsilon=cache.metaEpsilon
         )
         grad_hof = pareto.ParetoFront(dimensions=len(cache.WORST), 
             similar=pareto.similar, similar_fit=pareto.similar_fit(cache)
@@ -1,5 +1,4 @@
 import array
-import csv
 import multiprocessing
 import pickle
 import random
@@ -18,11 +17,14 @@ import scipy
 import scipy.spatial
 from sklearn.cluster import KMeans
 
+import CADETMatch.background as background
 import CADETMatch.cache as cache
 import CADETMatch.evo as evo
+import CADETMatch.h5store as h5store
 import CADETMatch.kde_generator as kde_generator
 import CADETMatch.pareto as pareto
 import CADETMatch.progress as progress
+import CADETMatch.records as records
 import CADETMatch.util as util
 import CADETMatch.sub as sub
 import CADETMatch.pop as pop
@@ -540,7 +542,7 @@ def sampler_auto_bounds(cache, checkpoint, sampler, checkpointFile, mcmc_store):
     mcmc_store.root.bounds.auto_chain = auto_chain
     mcmc_store.root.bounds.auto_probability = auto_probability
 
-    mcmc_store.save(lock=True)
+    h5store.save_store(mcmc_store, cache.resultStorage)
 
     while not finished:
         state = next(
@@ -900,8 +902,7 @@ def write_checkpoint(interval, checkpoint, checkpointFile):
         write_checkpoint.last_time = time.time()
 
     if time.time() - write_checkpoint.last_time > interval:
-        with checkpointFile.open("wb") as cp_file:
-            pickle.dump(checkpoint, cp_file)
+        background.write_checkpoint(checkpointFile, checkpoint)
 
         write_checkpoint.last_time = time.time()
 
@@ -956,15 +957,13 @@ def run(cache):
         kde, kde_scaler = kde_generator.setupKDE(cache)
         checkpoint["state"] = "auto_bounds"
 
-        with checkpointFile.open("wb") as cp_file:
-            pickle.dump(checkpoint, cp_file)
+        background.write_checkpoint(checkpointFile, checkpoint)
     else:
         multiprocessing.get_logger().info("loading kde")
         kde, kde_scaler = kde_generator.getKDE(cache)
 
-    path = Path(cache.settings["resultsDirBase"], cache.settings["csv"])
-    with path.open("a", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_ALL)
+    with records.RecordSink(cache) as writer:
+        csvfile = writer
 
         result_data = {
             "input": [],
@@ -984,6 +983,7 @@ def run(cache):
             similar=pareto.similar,
             similar_fit=pareto.similar_fit_meta(cache),
             slice_object=cache.meta_slice,
+            epsilon=cache.metaEpsilon,
         )
         grad_hof = pareto.DummyFront()
         progress_hof = None
@@ -1028,8 +1028,7 @@ def run(cache):
         util.finish(cache)
         checkpoint["state"] = "plot_finish"
 
-        with checkpointFile.open("wb") as cp_file:
-            pickle.dump(checkpoint, cp_file)
+        background.write_checkpoint(checkpointFile, checkpoint)
 
     if checkpoint["state"] == "plot_finish":
         sub.mle_process(cache, last=True)
@@ -1066,9 +1065,7 @@ def resetPopulation(checkpoint, cache):
     if cache.settings.get("PreviousResults", None) is not None:
         multiprocessing.get_logger().info("running with previous best results")
         previousResultsFile = Path(cache.settings["PreviousResults"])
-        results_h5 = cadet.H5()
-        results_h5.filename = previousResultsFile.as_posix()
-        results_h5.load(paths=["/meta_population_transform"], lock=True)
+        results_h5 = h5store.load_results(previousResultsFile, paths=["/meta_population_transform"])
         previousResults = results_h5.root.meta_population_transform
 
         row, col = previousResults.shape
@@ -1259,7 +1256,7 @@ def writeMCMC(cache, mcmc_store, process_mcmc_store):
     "write out the mcmc data so it can be plotted"
     process_mcmc_store(cache, mcmc_store)
 
-    mcmc_store.save(lock=True)
+    h5store.save_store(mcmc_store, cache.resultStorage)
 
 
 def interval(chain, cache):
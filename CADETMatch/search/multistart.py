@@ -1,12 +1,11 @@
 import array
-import csv
 import multiprocessing
 import random
 import time
-from pathlib import Path
 
 import CADETMatch.pareto as pareto
 import CADETMatch.progress as progress
+import CADETMatch.records as records
 import CADETMatch.sub as sub
 import CADETMatch.util as util
 import CADETMatch.pop as pop
@@ -60,15 +59,15 @@ def run(cache):
         similar=pareto.similar,
         similar_fit=pareto.similar_fit_meta(cache),
         slice_object=cache.meta_slice,
+        epsilon=cache.metaEpsilon,
     )
     grad_hof = pareto.ParetoFront(dimensions=len(cache.WORST),
         similar=pareto.similar, similar_fit=pareto.similar_fit(cache)
     )
     progress_hof = pareto.DummyFront()
 
-    path = Path(cache.settings["resultsDirBase"], cache.settings["csv"])
-    with path.open("a", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_ALL)
+    with records.RecordSink(cache) as writer:
+        csvfile = writer
 
         multiprocessing.get_logger().info(
             "Population %s", [util.convert_individual_inputorder(i, cache) for i in init_pop]
@@ -0,0 +1,99 @@
+import functools
+import multiprocessing
+import time
+from pathlib import Path
+
+import CADETMatch.archive as archive
+import CADETMatch.evo as evo
+import CADETMatch.pareto as pareto
+import CADETMatch.progress as progress
+import CADETMatch.records as records
+import CADETMatch.sub as sub
+import CADETMatch.util as util
+import CADETMatch.pop as pop
+
+name = "Replay"
+
+
+def run(cache):
+    "score every simulation in a simulation archive with the current score configuration"
+    with records.RecordSink(cache) as writer:
+        csvfile = writer
+        sim_start = time.time()
+        result_data = {
+            "input": [],
+            "output": [],
+            "output_meta": [],
+            "results": {},
+            "times": {},
+            "input_transform": [],
+            "input_transform_extended": [],
+            "strategy": [],
+            "mean": [],
+            "confidence": [],
+        }
+
+        archive_path = Path(cache.settings["replayArchive"]).as_posix()
+        batch_size = int(cache.settings.get("replayBatch", 1000))
+
+        data = archive.read_input(archive_path)
+
+        multiprocessing.get_logger().info(
+            "replay %s individuals from %s", len(data), archive_path
+        )
+
+        evaluate = functools.partial(
+            evo.fitness_replay, json_path=cache.json_path, archive_path=archive_path
+        )
+
+        if cache.metaResultsOnly:
+            hof = pareto.DummyFront()
+        else:
+            hof = pareto.ParetoFront(dimensions=len(cache.WORST),
+                similar=pareto.similar, similar_fit=pareto.similar_fit(cache)
+            )
+        meta_hof = pareto.ParetoFront(dimensions=len(cache.WORST_META),
+            similar=pareto.similar, similar_fit=pareto.similar_fit_meta(cache),
+            slice_object=cache.meta_slice, epsilon=cache.metaEpsilon
+        )
+        grad_hof = pareto.ParetoFront(dimensions=len(cache.WORST),
+            similar=pareto.similar, similar_fit=pareto.similar_fit(cache)
+        )
+        progress_hof = pareto.ParetoFront(dimensions=len(cache.WORST_META),
+            similar=pareto.similar, similar_fit=pareto.similar_fit_meta(cache),
+            slice_object=cache.meta_slice
+        )
+
+        # each batch is treated as a generation so progress and result.h5 are written as the replay goes
+        for generation, start in enumerate(range(0, len(data), batch_size)):
+            generation_start = time.time()
+            population = [pop.Individual(line) for line in data[start : start + batch_size]]
+
+            util.eval_population_base(
+                evaluate,
+                cache,
+                population,
+                writer,
+                csvfile,
+                hof,
+                meta_hof,
+                progress_hof,
+                generation,
+                result_data,
+            )
+            progress.writeProgress(
+                cache,
+                generation,
+                population,
+                hof,
+                meta_hof,
+                grad_hof,
+                progress_hof,
+                sim_start,
+                generation_start,
+                result_data,
+            )
+
+        util.finish(cache)
+        sub.graph_corner_process(cache, last=True)
+        return hof
@@ -1,12 +1,11 @@
 import array
-import csv
 import multiprocessing
 import time
-from pathlib import Path
 
 import CADETMatch.jacobian as jacobian
 import CADETMatch.pareto as pareto
 import CADETMatch.progress as progress
+import CADETMatch.records as records
 import CADETMatch.sub as sub
 import CADETMatch.util as util
 import CADETMatch.pop as pop
@@ -16,9 +15,8 @@ name = "ScoreTest"
 
 def run(cache):
     "run the parameter estimation"
-    path = Path(cache.settings["resultsDirBase"], cache.settings["csv"])
-    with path.open("a", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_ALL)
+    with records.RecordSink(cache) as writer:
+        csvfile = writer
         sim_start = generation_start = time.time()
         result_data = {
             "input": [],
@@ -51,7 +49,7 @@ def run(cache):
             )
         meta_hof = pareto.ParetoFront(dimensions=len(cache.WORST_META),
             similar=pareto.similar, similar_fit=pareto.similar_fit_meta(cache),
-            slice_object=cache.meta_slice
+            slice_object=cache.meta_slice, epsilon=cache.metaEpsilon
         )
         grad_hof = pareto.ParetoFront(dimensions=len(cache.WORST),
             similar=pareto.similar, similar_fit=pareto.similar_fit(cache)
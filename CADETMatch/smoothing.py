@@ -1,69 +1,19 @@
+import hashlib
 import multiprocessing
 import warnings
 
 import numpy
 import numpy.linalg
 import scipy
+import scipy.interpolate
 import scipy.signal
-from cadet import H5
+import scipy.sparse
 
+import CADETMatch.artifacts as artifacts
 import CADETMatch.util as util
 
-from pymoo.core.problem import ElementwiseProblem
-from pymoo.factory import get_algorithm, get_reference_directions
-from pymoo.optimize import minimize
-
 butter_order = 3
 
-class TargetProblem(ElementwiseProblem):
-
-    def __init__(self, lb, ub, sse_target, func, values, fs):
-        super().__init__(n_var=1, n_obj=1, n_constr=0, xl=lb, xu=ub)
-        self.sse_target = sse_target
-        self.func = func
-        self.values = values
-        self.fs = fs        
-
-    def _evaluate(self, crit_fs, out, *args, **kwargs):
-        crit_fs = 10**crit_fs
-        try:
-            sos = self.func(crit_fs, self.fs)
-            low_passed = scipy.signal.sosfiltfilt(sos, self.values)
-            sse = numpy.sum((low_passed - self.values) ** 2)
-
-            error = (sse - self.sse_target)**2
-        except ValueError:
-            error = numpy.inf
-        out["F"] = error
-
-class MaxDistance(ElementwiseProblem):
-
-    def __init__(self, lb, ub, func, fs, values, x_min, y_min, p1, p2, factor):
-        super().__init__(n_var=1, n_obj=1, n_constr=0, xl=lb, xu=ub)
-        self.func = func
-        self.fs = fs   
-        self.values = values
-        self.x_min = x_min
-        self.y_min = y_min
-        self.p1 = p1
-        self.p2 = p2
-        self.factor = factor
-
-    def _evaluate(self, crit_fs, out, *args, **kwargs):
-        crit_fs = 10.0 ** crit_fs[0]
-        try:
-            sos = self.func(crit_fs, self.fs)
-        except ValueError:
-            return 1e6
-        low_passed = scipy.signal.sosfiltfilt(sos, self.values)
-
-        sse = numpy.sum((low_passed - self.values) ** 2)
-
-        pT = numpy.array([crit_fs - self.x_min, numpy.log(sse) - self.y_min]).T / self.factor
-
-        d = numpy.cross(self.p2 - self.p1, self.p1 - pT) / numpy.linalg.norm(self.p2 - self.p1)
-        out["F"] = -d
-
 def get_p(x, y):
     x = numpy.array(x)
     y = numpy.array(y)
@@ -96,14 +46,12 @@ def refine_signal(func, times, values, x, y, fs, start):
     lb = numpy.log10(x[0])
     ub = numpy.log10(x[-1])
 
-    problem = MaxDistance(lb, ub, func, fs, values, x_min, y_min, p1, p2, factor)
+    # pymoo is only needed when smoothing factors are searched so it is not imported with this module
+    import CADETMatch.smoothing_problem as smoothing_problem
 
-    algorithm = get_algorithm('pattern-search', n_sample_points=50, eps=1e-13)
+    problem = smoothing_problem.MaxDistance(lb, ub, func, fs, values, x_min, y_min, p1, p2, factor)
 
-    res = minimize(problem,
-               algorithm,
-               verbose=False,
-               seed=1)
+    res = smoothing_problem.pattern_search(problem)
 
     crit_fs = 10**res.X[0]
 
@@ -161,14 +109,11 @@ def find_max_signal(func, times, values, sse_target, filters, sse):
     fs = 1.0 / (times[1] - times[0])
 
     filters = numpy.log10(filters)
-    problem = TargetProblem(filters[0], filters[-1], sse_target, func, values, fs)
+    import CADETMatch.smoothing_problem as smoothing_problem
 
-    algorithm = get_algorithm('pattern-search', n_sample_points=50, eps=1e-13)
+    problem = smoothing_problem.TargetProblem(filters[0], filters[-1], sse_target, func, values, fs)
 
-    res = minimize(problem,
-               algorithm,
-               verbose=False,
-               seed=1)
+    res = smoothing_problem.pattern_search(problem)
 
     crit_fs = 10**res.X[0]
 
@@ -184,7 +129,24 @@ def smoothing_filter_signal(func, times, values, crit_fs):
     return low_passed
 
 
-def load_data(name, cache):
+class SmoothingPending(Exception):
+    "raised on a cache miss while setupTarget collects the smoothing requests of all features"
+
+
+# list of requests while setupTarget collects them so they can be found in parallel, None otherwise
+pending = None
+
+
+def smoothing_key(times, values, rmse_target):
+    "content hash of the data and target so cached factors are never reused for different data"
+    digest = hashlib.sha1()
+    digest.update(numpy.ascontiguousarray(times, dtype="float64").tobytes())
+    digest.update(numpy.ascontiguousarray(values, dtype="float64").tobytes())
+    digest.update(repr(float(rmse_target)).encode())
+    return digest.hexdigest()
+
+
+def load_data(key, name, cache):
     crit_fs = None
     crit_fs_der = None
     s = None
@@ -194,26 +156,21 @@ def load_data(name, cache):
     if name is None or cache is None:
         return s, crit_fs, crit_fs_der
 
-    factor_file = cache.settings["resultsDirMisc"] / "find_smoothing_factor.h5"
-
-    data = H5()
-    data.filename = factor_file.as_posix()
+    # without artifactCache only the factors this run found are used, its setup and pool workers still share them
+    data = artifacts.load_arrays(cache, "smoothing", key, this_run=not artifacts.enabled(cache))
 
-    if factor_file.exists():
-        data.load(lock=True)
+    if data is not None:
+        s = float(data.s)
 
-    if name in data.root:
-        s = float(data.root[name].s)
-
-        crit_fs = data.root[name].crit_fs
+        crit_fs = data.crit_fs
         if crit_fs == -1.0:
             crit_fs = None
 
-        crit_fs_der = data.root[name].crit_fs_der
+        crit_fs_der = data.crit_fs_der
         if crit_fs_der == -1.0:
             crit_fs_der = None
 
-        s_knots = int(data.root[name].s_knots)
+        s_knots = int(data.s_knots)
     else:
         return s, crit_fs, crit_fs_der
 
@@ -238,16 +195,33 @@ def load_data(name, cache):
 
 
 def find_smoothing_factors(times, values, name, cache, rmse_target=1e-4):
-    times, values = resample(times, values)
-    min = 1e-3
+    key = smoothing_key(times, values, rmse_target)
 
-    sse_target = (rmse_target**2.0)*len(values)
-
-    s, crit_fs, crit_fs_der = load_data(name, cache)
+    s, crit_fs, crit_fs_der = load_data(key, name, cache)
 
     if s is not None:
         return s, crit_fs, crit_fs_der
 
+    if pending is not None and name is not None and cache is not None:
+        pending.append((key, times, values, name, rmse_target))
+        raise SmoothingPending(name)
+
+    key, s, crit_fs, crit_fs_der, knots = smoothing_factors(
+        (key, times, values, name, rmse_target)
+    )
+
+    record_smoothing(s, 0, crit_fs, crit_fs_der, knots, [s, s], name, cache, key)
+
+    return s, crit_fs, crit_fs_der
+
+
+def smoothing_factors(request):
+    "find the smoothing factors for one request, used directly and on the pool by find_pending"
+    key, times, values, name, rmse_target = request
+    times, values = resample(times, values)
+
+    sse_target = (rmse_target**2.0)*len(values)
+
     # normalize the data
     values = values * 1.0 / max(values)
 
@@ -258,8 +232,6 @@ def find_smoothing_factors(times, values, name, cache, rmse_target=1e-4):
             "%s butter filter disabled, no viable L point found", name
         )
 
-    values_filter = smoothing_filter_signal(signal_bessel, times, values, crit_fs)
-
     s = sse_target
  
     spline, factor = create_spline(times, values, crit_fs, s)
@@ -270,42 +242,50 @@ def find_smoothing_factors(times, values, name, cache, rmse_target=1e-4):
     values_filter = values_filter * factor
     crit_fs_der = find_signal(signal_bessel, times, values_filter, sse_target)
 
-    s_knots = 0
-    knots = spline.get_knots()
-    all_s = [s, s]
+    return key, s, crit_fs, crit_fs_der, spline.get_knots()
 
-    record_smoothing(s, s_knots, crit_fs, crit_fs_der, knots, all_s, name, cache)
 
-    return s, crit_fs, crit_fs_der
+def find_pending(requests, cache):
+    "find the smoothing factors of all collected requests in parallel and record them"
+    unique = {}
+    for request in requests:
+        unique.setdefault(request[0], request)
+
+    multiprocessing.get_logger().info(
+        "finding %d smoothing factors in parallel", len(unique)
+    )
+
+    names = {key: request[3] for key, request in unique.items()}
+    for key, s, crit_fs, crit_fs_der, knots in cache.map_function(
+        smoothing_factors, list(unique.values())
+    ):
+        record_smoothing(
+            s, 0, crit_fs, crit_fs_der, knots, [s, s], names[key], cache, key
+        )
 
 
 def record_smoothing(
-    s, s_knots, crit_fs, crit_fs_der, knots, all_s, name=None, cache=None
+    s, s_knots, crit_fs, crit_fs_der, knots, all_s, name=None, cache=None, key=None
 ):
     if name is None or cache is None:
         return
-    factor_file = cache.settings["resultsDirMisc"] / "find_smoothing_factor.h5"
-
-    data = H5()
-    data.filename = factor_file.as_posix()
-
-    if factor_file.exists():
-        data.load(lock=True)
-
-    if name not in data.root:
-        data.root[name].knots = knots
-        data.root[name].all_s = all_s
-        data.root[name].s = float(s)
-        data.root[name].s_knots = int(s_knots)
-        if crit_fs is None:
-            data.root[name].crit_fs = -1.0
-        else:
-            data.root[name].crit_fs = float(crit_fs)
-        if crit_fs_der is None:
-            data.root[name].crit_fs_der = -1.0
-        else:
-            data.root[name].crit_fs_der = float(crit_fs)
-        data.save(lock=True)
+    if key is None:
+        key = name
+
+    artifacts.save_arrays(
+        cache,
+        "smoothing",
+        key,
+        {
+            "name": name,
+            "knots": knots,
+            "all_s": all_s,
+            "s": float(s),
+            "s_knots": int(s_knots),
+            "crit_fs": -1.0 if crit_fs is None else float(crit_fs),
+            "crit_fs_der": -1.0 if crit_fs_der is None else float(crit_fs_der),
+        },
+    )
 
     crit_fs_message = "critical frequency disable"
     if crit_fs is not None:
@@ -337,7 +317,9 @@ def create_spline(times, values, crit_fs, s):
     )
 
 
-def smooth_data(times, values, crit_fs, s):
+def smooth_data(times, values, crit_fs, s, operator=None):
+    if operator is not None:
+        return apply_operator(operator, values, derivative=False)[0]
     spline, factor = create_spline(times, values, crit_fs, s)
 
     return spline(times) / factor
@@ -363,8 +345,10 @@ def smooth_data_derivative(times, values, crit_fs, s, crit_fs_der, smooth=True):
     return values_filter_der
 
 
-def full_smooth(times, values, crit_fs, s, crit_fs_der, smooth=True):
+def full_smooth(times, values, crit_fs, s, crit_fs_der, smooth=True, operator=None):
     # return smooth data derivative of data
+    if operator is not None:
+        return apply_operator(operator, values)
     times_resample, values_resample = resample(times, values)
     spline, factor = create_spline(times_resample, values_resample, crit_fs, s)
 
@@ -388,6 +372,78 @@ def full_smooth(times, values, crit_fs, s, crit_fs_der, smooth=True):
     return values_filter, values_filter_der
 
 
+def smooth_simulation(sim_data, feature, times, values, derivative=True):
+    """full_smooth for the simulated values of a feature, shared with the other features of the same evaluation
+
+    util.runExperiment attaches a smooth_cache dictionary to sim_data. Features that read the same output_path over the
+    same time window with the same smoothing parameters get the same arrays back, so they must not be modified.
+    When the simulation contains the outlet derivative written by CADET (simulationDerivative setting) that is used
+    instead of differentiating a spline, only the bessel filter used for the experimental derivative is applied to it.
+    Returns the smoothed values and the smoothed derivative (None if derivative is False)."""
+    operator = feature.get("smooth_operator", None)
+
+    values_der = None
+    if derivative and "simulation" in sim_data:
+        values_der = util.get_times_values_derivative(sim_data["simulation"], feature)
+
+    output_path = feature["output_path"]
+    if isinstance(output_path, list):
+        output_path = tuple(output_path)
+
+    key = (
+        output_path,
+        feature["factor"],
+        float(times[0]),
+        float(times[-1]),
+        len(times),
+        feature["smoothing_factor"],
+        feature["critical_frequency"],
+        feature["critical_frequency_der"],
+        None if operator is None else operator["knots"].tobytes(),
+        values_der is not None,
+    )
+
+    smooth_cache = sim_data.get("smooth_cache", {})
+
+    if key in smooth_cache and (smooth_cache[key][1] is not None or not derivative):
+        return smooth_cache[key]
+
+    if values_der is not None:
+        values_filter = smooth_data(
+            times,
+            values,
+            feature["critical_frequency"],
+            feature["smoothing_factor"],
+            operator=operator,
+        )
+        if feature["critical_frequency_der"] is not None and numpy.max(values_der) > 0:
+            values_der = butter(times, values_der, feature["critical_frequency_der"])
+        result = (values_filter, values_der)
+    elif derivative:
+        result = full_smooth(
+            times,
+            values,
+            feature["critical_frequency"],
+            feature["smoothing_factor"],
+            feature["critical_frequency_der"],
+            operator=operator,
+        )
+    else:
+        result = (
+            smooth_data(
+                times,
+                values,
+                feature["critical_frequency"],
+                feature["smoothing_factor"],
+                operator=operator,
+            ),
+            None,
+        )
+
+    smooth_cache[key] = result
+    return result
+
+
 def butter(times, values, crit_fs_der):
     max_value = numpy.max(values)
     values = values / max_value
@@ -425,3 +481,206 @@ def resample(times, values, max_samples=5000):
             return times_resample, values_resample
         else:
             return times, values
+
+
+def interpolation_matrix(times_from, times_to):
+    "sparse matrix that linearly interpolates values at times_from onto times_to"
+    idx = numpy.clip(numpy.searchsorted(times_from, times_to, side="right") - 1, 0, len(times_from) - 2)
+    weight = (times_to - times_from[idx]) / (times_from[idx + 1] - times_from[idx])
+    weight = numpy.clip(weight, 0.0, 1.0)
+    rows = numpy.arange(len(times_to))
+    return scipy.sparse.csr_matrix(
+        (
+            numpy.concatenate([1.0 - weight, weight]),
+            (numpy.concatenate([rows, rows]), numpy.concatenate([idx, idx + 1])),
+        ),
+        shape=(len(times_to), len(times_from)),
+    )
+
+
+def filter_matrix(times, crit_fs, matrix, adjoint=False):
+    """apply the bessel filter used by smoothing_filter_signal (or its transpose if adjoint) to every row of matrix
+
+    Entries that are negligible compared to the largest entry are set to zero, the tails of the IIR filter
+    otherwise end up as subnormal numbers which make every later product with the matrix very slow."""
+    if crit_fs is None:
+        return matrix
+    fs = 1.0 / (times[1] - times[0])
+    sos = signal_bessel(crit_fs, fs)
+    if adjoint:
+        matrix = sosfiltfilt_adjoint(sos, matrix)
+    else:
+        matrix = scipy.signal.sosfiltfilt(sos, matrix, axis=-1)
+    matrix = numpy.ascontiguousarray(matrix)
+    matrix[numpy.abs(matrix) < numpy.finfo(float).eps ** 2 * numpy.max(numpy.abs(matrix))] = 0.0
+    return matrix
+
+
+def sosfiltfilt_adjoint(sos, y):
+    """transpose of scipy.signal.sosfiltfilt with the default odd padding applied along the last axis
+
+    sosfiltfilt is linear: odd extension, a forward pass and a backward pass that start from the steady state
+    of the first sample, then trimming the padding. Each step is transposed and applied in reverse order."""
+    n_sections = sos.shape[0]
+    ntaps = 2 * n_sections + 1
+    ntaps -= min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum())
+    edge = 3 * ntaps
+
+    size = y.shape[-1]
+    length = size + 2 * edge
+
+    zi = scipy.signal.sosfilt_zi(sos)
+    # response of a pass to its initial condition when the first sample is 1
+    initial_response = scipy.signal.sosfilt(sos, numpy.zeros(length), zi=zi)[0]
+
+    def pass_adjoint(values):
+        # transpose of the causal filter is the filter run backwards, the initial condition only depends on the first sample
+        result = scipy.signal.sosfilt(sos, values[..., ::-1], axis=-1)[..., ::-1]
+        result[..., 0] += values @ initial_response
+        return result
+
+    values = numpy.zeros(y.shape[:-1] + (length,))
+    values[..., edge : edge + size] = y
+
+    values = pass_adjoint(values[..., ::-1])[..., ::-1]
+    values = pass_adjoint(values)
+
+    # transpose of the odd extension
+    left = values[..., :edge]
+    right = values[..., edge + size :]
+    x = values[..., edge : edge + size].copy()
+    x[..., 0] += 2 * numpy.sum(left, axis=-1)
+    x[..., 1 : edge + 1] -= left[..., ::-1]
+    x[..., -1] += 2 * numpy.sum(right, axis=-1)
+    x[..., size - 1 - edge : size - 1] -= right[..., ::-1]
+    return x
+
+
+def create_operator(
+    times, values, crit_fs, s, crit_fs_der, smooth=True, max_coefficients=500
+):
+    """precompute the linear operators that replace full_smooth for data on a fixed time grid
+
+    full_smooth is linear in the values except for the knot placement of the smoothing spline. The knots
+    are found once from values (normally the experimental data) and kept fixed, after that resampling, the
+    bessel filters and a least squares spline on those knots are all linear maps. Returns None when the
+    time grid is not supported (non-uniform time steps) or the spline needs too many coefficients."""
+    times_resample, values_resample = resample(times, values)
+
+    downsample = len(times) > len(times_resample)
+    if times_resample is not times and not downsample:
+        # non-uniform time steps are resampled onto a finer grid, linear interpolation is not accurate enough for that
+        return None
+
+    spline, factor = create_spline(times_resample, values_resample, crit_fs, s)
+    knots = spline.get_knots()
+    k = 5
+    t = numpy.concatenate([[knots[0]] * k, knots, [knots[-1]] * k])
+    coefficients = len(t) - k - 1
+
+    if coefficients > max_coefficients:
+        multiprocessing.get_logger().info(
+            "smoothing operator disabled, %d spline coefficients", coefficients
+        )
+        return None
+
+    basis_resample = scipy.interpolate.BSpline.design_matrix(times_resample, t, k).toarray()
+    projection = numpy.linalg.pinv(basis_resample)
+
+    # the smoothing filter is applied before the spline fit, projection @ filter is the filter transpose applied to each row
+    spline_operator = filter_matrix(times_resample, crit_fs, projection, adjoint=True)
+
+    operator = {}
+    operator["knots"] = t
+    operator["spline"] = spline_operator
+    operator["smooth"] = scipy.interpolate.BSpline.design_matrix(times, t, k)
+    operator["smooth_derivative"] = smooth
+
+    if times_resample is times:
+        operator["resample"] = None
+        operator["resample_derivative"] = None
+    else:
+        operator["resample"] = interpolation_matrix(times, times_resample)
+        operator["resample_derivative"] = interpolation_matrix(times_resample, times)
+
+    if smooth:
+        basis_derivative = derivative_design_matrix(times_resample, t, k).toarray().T
+        operator["derivative"] = numpy.ascontiguousarray(
+            filter_matrix(times_resample, crit_fs_der, basis_derivative).T
+        )
+    else:
+        operator["derivative"] = derivative_design_matrix(times, t, k)
+    return operator
+
+
+def derivative_design_matrix(x, t, k):
+    "sparse matrix that maps the coefficients of a spline of order k with knots t to its derivative at x"
+    coefficients = len(t) - k - 1
+    # the derivative is a spline of order k-1 on t[1:-1] with coefficients k*(c[i+1] - c[i])/(t[i+k+1] - t[i+1])
+    scale = numpy.zeros(coefficients - 1)
+    span = t[k + 1 : k + coefficients] - t[1:coefficients]
+    scale[span > 0] = k / span[span > 0]
+    difference = scipy.sparse.diags(
+        [-scale, scale], [0, 1], shape=(coefficients - 1, coefficients)
+    )
+    return scipy.interpolate.BSpline.design_matrix(x, t[1:-1], k - 1) @ difference
+
+
+def apply_operator(operator, values, derivative=True):
+    "return the smoothed values and the smoothed derivative (None if derivative is False) using create_operator"
+    if operator["resample"] is not None:
+        values = operator["resample"] @ values
+
+    coefficients = operator["spline"] @ values
+
+    values_filter = operator["smooth"] @ coefficients
+
+    values_filter_der = None
+    if derivative:
+        values_filter_der = operator["derivative"] @ coefficients
+        if operator["smooth_derivative"] and operator["resample_derivative"] is not None:
+            values_filter_der = operator["resample_derivative"] @ values_filter_der
+    return values_filter, values_filter_der
+
+
+def check_operator(operator, times, values, crit_fs, s, crit_fs_der, smooth=True):
+    "largest difference between apply_operator and full_smooth relative to the peak of each output"
+    values_filter, values_filter_der = full_smooth(times, values, crit_fs, s, crit_fs_der, smooth)
+    operator_filter, operator_filter_der = apply_operator(operator, values)
+
+    error = numpy.max(numpy.abs(operator_filter - values_filter)) / numpy.max(numpy.abs(values_filter))
+    error_der = numpy.max(numpy.abs(operator_filter_der - values_filter_der)) / numpy.max(
+        numpy.abs(values_filter_der)
+    )
+    return error, error_der
+
+
+def setup_operator(times, values, crit_fs, s, crit_fs_der, name=None, cache=None, smooth=True, tolerance=2e-2):
+    "create the smoothing operator for a feature if it is enabled and reproduces full_smooth on values"
+    if cache is not None:
+        if not cache.smoothingOperator:
+            return None
+        tolerance = cache.smoothingOperatorTol
+
+    operator = create_operator(times, values, crit_fs, s, crit_fs_der, smooth)
+    if operator is None:
+        return None
+
+    error, error_der = check_operator(operator, times, values, crit_fs, s, crit_fs_der, smooth)
+
+    if error > tolerance or error_der > tolerance:
+        multiprocessing.get_logger().info(
+            "smoothing operator disabled for %s  error %.3e  derivative error %.3e",
+            name,
+            error,
+            error_der,
+        )
+        return None
+
+    multiprocessing.get_logger().info(
+        "smoothing operator %s  error %.3e  derivative error %.3e",
+        name,
+        error,
+        error_der,
+    )
+    return operator
@@ -0,0 +1,67 @@
+"pymoo problems used by smoothing to search for the critical frequencies of the smoothing filters"
+
+import numpy
+import numpy.linalg
+import scipy.signal
+from pymoo.core.problem import ElementwiseProblem
+from pymoo.factory import get_algorithm
+from pymoo.optimize import minimize
+
+
+class TargetProblem(ElementwiseProblem):
+
+    def __init__(self, lb, ub, sse_target, func, values, fs):
+        super().__init__(n_var=1, n_obj=1, n_constr=0, xl=lb, xu=ub)
+        self.sse_target = sse_target
+        self.func = func
+        self.values = values
+        self.fs = fs        
+
+    def _evaluate(self, crit_fs, out, *args, **kwargs):
+        crit_fs = 10**crit_fs
+        try:
+            sos = self.func(crit_fs, self.fs)
+            low_passed = scipy.signal.sosfiltfilt(sos, self.values)
+            sse = numpy.sum((low_passed - self.values) ** 2)
+
+            error = (sse - self.sse_target)**2
+        except ValueError:
+            error = numpy.inf
+        out["F"] = error
+
+class MaxDistance(ElementwiseProblem):
+
+    def __init__(self, lb, ub, func, fs, values, x_min, y_min, p1, p2, factor):
+        super().__init__(n_var=1, n_obj=1, n_constr=0, xl=lb, xu=ub)
+        self.func = func
+        self.fs = fs   
+        self.values = values
+        self.x_min = x_min
+        self.y_min = y_min
+        self.p1 = p1
+        self.p2 = p2
+        self.factor = factor
+
+    def _evaluate(self, crit_fs, out, *args, **kwargs):
+        crit_fs = 10.0 ** crit_fs[0]
+        try:
+            sos = self.func(crit_fs, self.fs)
+        except ValueError:
+            return 1e6
+        low_passed = scipy.signal.sosfiltfilt(sos, self.values)
+
+        sse = numpy.sum((low_passed - self.values) ** 2)
+
+        pT = numpy.array([crit_fs - self.x_min, numpy.log(sse) - self.y_min]).T / self.factor
+
+        d = numpy.cross(self.p2 - self.p1, self.p1 - pT) / numpy.linalg.norm(self.p2 - self.p1)
+        out["F"] = -d
+
+
+def pattern_search(problem):
+    algorithm = get_algorithm('pattern-search', n_sample_points=50, eps=1e-13)
+
+    return minimize(problem,
+               algorithm,
+               verbose=False,
+               seed=1)
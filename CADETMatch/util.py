@@ -1,7 +1,5 @@
-import copy
 import csv
 import decimal as decim
-import hashlib
 import multiprocessing
 import os
 import random
@@ -14,9 +12,7 @@ from pathlib import Path
 
 import jstyleson
 import numpy
-import pandas
 import psutil
-import scipy.signal
 from addict import Dict
 from cadet import H5, Cadet
 
@@ -31,9 +27,13 @@ __logBase10of2 = float(__logBase10of2_decim)
 import logging
 import os
 
-import SALib.sample.sobol_sequence
 import scipy.interpolate
 
+import CADETMatch.archive as archive
+import CADETMatch.background as background
+import CADETMatch.front_files as front_files
+import CADETMatch.h5store as h5store
+import CADETMatch.records as records
 import CADETMatch.loggerwriter as loggerwriter
 import CADETMatch.pareto as pareto
 import CADETMatch.synthetic_error as synthetic_error
@@ -61,6 +61,29 @@ def get_times_values(simulation, target, selected=None):
     return times[selected], values[selected] * target["factor"]
 
 
+def get_times_values_derivative(simulation, target, selected=None):
+    "time derivative CADET wrote (write_soldot_outlet) for the output of get_times_values, None if the simulation does not have it"
+    output_path = target["output_path"]
+    if not isinstance(output_path, list):
+        output_path = [output_path]
+
+    if not all("solution_outlet" in path for path in output_path):
+        return None
+
+    try:
+        values = [simulation[path.replace("solution_outlet", "soldot_outlet")] for path in output_path]
+    except (AttributeError, KeyError, IndexError, TypeError):
+        return None
+
+    # missing entries come back as empty groups
+    if not all(isinstance(value, numpy.ndarray) for value in values):
+        return None
+
+    if selected is None:
+        selected = target["selected"]
+    return numpy.sum(values, 0)[selected] * target["factor"]
+
+
 def sse(data1, data2):
     return numpy.sum((data1 - data2) ** 2)
 
@@ -88,6 +111,8 @@ def initIndividual(icls, cache, content):
     return icls(content)
 
 def sobolPopulation(populationSize, populationDimension, lb, ub):
+    import SALib.sample.sobol_sequence
+
     sobol = SALib.sample.sobol_sequence.sample(populationSize, populationDimension)
     sobol = sobol * (ub - lb) + lb
     return sobol
@@ -118,6 +143,8 @@ def calcMetaScores(scores, cache):
 
 
 def product_score(values):
+    import scipy.stats
+
     values = numpy.array(values)
     return 1.0 - scipy.stats.gmean(1-values)
 
@@ -363,9 +390,44 @@ def runExperiment(
     if post_function:
         post_function(simulation)
 
+    return scoreExperiment(
+        simulation,
+        path if simulation.is_file else None,
+        individual,
+        experiment,
+        target,
+        cache,
+        cadetValues,
+        cadetValuesKEQ,
+    )
+
+
+def replayExperiment(individual, experiment, settings, target, template_sim, solution, cache):
+    "score a stored solution (see archive.py) as if the simulation for individual had just been run"
+    simulation = Cadet(template_sim.root)
+
+    if individual is not None:
+        cadetValues, cadetValuesKEQ = set_simulation(
+            individual, simulation, settings, cache, experiment
+        )
+    else:
+        cadetValues = []
+        cadetValuesKEQ = []
+
+    simulation.root.output.solution = solution
+
+    return scoreExperiment(
+        simulation, None, individual, experiment, target, cache, cadetValues, cadetValuesKEQ
+    )
+
+
+def scoreExperiment(
+    simulation, path, individual, experiment, target, cache, cadetValues, cadetValuesKEQ
+):
+    "run all the scores of an experiment on a finished simulation"
     temp = {}
     temp["simulation"] = simulation
-    temp["path"] = path if simulation.is_file else None
+    temp["path"] = path
     temp["scores"] = []
     temp["error"] = 0.0
     temp["error_count"] = 0.0
@@ -378,6 +440,8 @@ def runExperiment(
     temp["sim_time"] = []
     temp["sim_value"] = []
     temp["exp_value"] = []
+    # smoothed simulation data shared between features of this evaluation, see smoothing.smooth_simulation
+    temp["smooth_cache"] = {}
 
     for feature in experiment["scores"]:
         featureType = feature["type"]
@@ -408,6 +472,7 @@ def runExperiment(
             temp["sim_value"].append(sim_value)
             temp["exp_value"].append(exp_value)
 
+    del temp["smooth_cache"]
     return temp
 
 
@@ -606,9 +671,7 @@ def createSimulationBestIndividual(individual, cache):
 def getBestIndividual(cache):
     "return the path to the best item based on meta min score"
     progress_path = Path(cache.settings["resultsDirBase"]) / "result.h5"
-    results = H5()
-    results.filename = progress_path.as_posix()
-    results.load(paths=["/meta_score", "/meta_population"], lock=True)
+    results = h5store.load_results(progress_path, paths=["/meta_score", "/meta_population"])
 
     idx = numpy.argmin(results.root.meta_score[:, 0])
     individual = results.root.meta_population[idx, :]
@@ -682,10 +745,28 @@ def fracStat(time_center, value):
 
 
 def fractionate_spline(start_seq, stop_seq, spline):
-    temp = []
-    for (start, stop) in zip(start_seq, stop_seq):
-        temp.append(spline.integral(start, stop) / (stop - start))
-    return numpy.array(temp)
+    return fractionate_antiderivative(start_seq, stop_seq, spline_antiderivative(spline))
+
+
+def spline_antiderivative(spline):
+    "antiderivative of spline and the interval it is defined on, like spline.integral the spline is zero outside of that interval"
+    knots = spline.get_knots()
+    return spline.antiderivative(), knots[0], knots[-1]
+
+
+def fractionate_antiderivative(start_seq, stop_seq, antiderivative):
+    """average value of every fraction using the result of spline_antiderivative
+
+    start_seq and stop_seq can have any matching (or broadcastable) shape so many fraction windows, for example
+    the same fractions at many time offsets, are evaluated with one call"""
+    integral, lower, upper = antiderivative
+    start_seq = numpy.asarray(start_seq, dtype=float)
+    stop_seq = numpy.asarray(stop_seq, dtype=float)
+    start_seq, stop_seq = numpy.broadcast_arrays(start_seq, stop_seq)
+    area = integral(numpy.clip(stop_seq, lower, upper)) - integral(
+        numpy.clip(start_seq, lower, upper)
+    )
+    return area / (stop_seq - start_seq)
 
 
 def find_opt_poly(x, y, index):
@@ -717,6 +798,8 @@ def find_opt_poly(x, y, index):
 
 
 def metaCSV(cache):
+    import pandas
+
     repeat = int(cache.settings["repeat"])
 
     generations = []
@@ -877,6 +960,9 @@ def update_result_data(cache, ind, fit, result_data, results, meta_scores):
 
                             result_data["results"][name].append(tuple(solution))
 
+        if cache.simulationArchive:
+            archive.collect(cache, result_data, ind, results)
+
 
 def calcFitness(scores_orig, cache):
     scores = numpy.array(scores_orig)[cache.meta_mask]
@@ -886,6 +972,21 @@ def calcFitness(scores_orig, cache):
     return tuple(scores)
 
 
+def update_progress(progress_hof, population):
+    """add every individual of a generation that makes significant progress to progress_hof, returns True if any did.
+    The generation is checked against the front at once, after the first insertion the rest are checked one by one so
+    the result is the same as checking each individual against the front updated with the ones before it"""
+    mask = progress_hof.significant_mask(population)
+    made_progress = False
+    for ind, significant in zip(population, mask):
+        if made_progress:
+            significant = progress_hof.is_significant(ind)
+        if significant:
+            made_progress = True
+            pareto.updateParetoFront(progress_hof, ind)
+    return made_progress
+
+
 def process_population(
     cache,
     population,
@@ -899,7 +1000,7 @@ def process_population(
     result_data=None,
 ):
     csv_lines = []
-    meta_csv_lines = []
+    progress_candidates = []
 
     made_progress = False
 
@@ -931,9 +1032,7 @@ def process_population(
 
         ind = pop_lookup(lookup, individual)
 
-        save_name_base = hashlib.md5(
-            str(list(ind)).encode("utf-8", "ignore")
-        ).hexdigest()
+        save_name_base = ind.hash
 
         ind.fitness.values = calcFitness(fit, cache)
         ind.csv_line = [time.ctime(), save_name_base] + csv_line
@@ -955,18 +1054,14 @@ def process_population(
 
             onFrontMeta, significant_meta = pareto.updateParetoFront(meta_hof, ind_meta)
             if onFrontMeta:
-                meta_csv_lines.append([time.ctime(), save_name_base] + csv_line)
                 processResultsMeta(save_name_base, ind, cache, results)
 
-            # If this is None progress can never be made and the algorithm will terminate, it should only be
-            # None if used with algorithms like multistart or scoretest which don't need progress
-            if progress_hof is not None:
-                onFrontProgress, significant_progress = pareto.updateParetoFront(
-                    copy.deepcopy(progress_hof), ind_meta
-                )
-                if significant_progress:
-                    made_progress = True
-                    pareto.updateParetoFront(progress_hof, ind_meta)
+            progress_candidates.append(ind_meta)
+
+    # If this is None progress can never be made and the algorithm will terminate, it should only be
+    # None if used with algorithms like multistart or scoretest which don't need progress
+    if progress_hof is not None and progress_candidates:
+        made_progress = update_progress(progress_hof, progress_candidates)
 
     writer.writerows(csv_lines)
 
@@ -990,13 +1085,8 @@ def process_population(
     elif generation != cache.lastProgressGeneration:
         cache.generationsOfProgress = 0
 
-    path_meta_csv = cache.settings["resultsDirMeta"] / "results.csv"
-    with path_meta_csv.open("a", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_ALL)
-        writer.writerows(meta_csv_lines)
-
     cleanupFront(cache, halloffame, meta_hof)
-    writeMetaFront(cache, meta_hof, path_meta_csv)
+    writeMetaFront(cache, meta_hof)
 
     stalled = (generation - cache.lastProgressGeneration) >= cache.stallGenerations
     stallWarn = (generation - cache.lastProgressGeneration) >= cache.stallCorrect
@@ -1103,77 +1193,40 @@ def get_evo_tolerance(cache, name):
     return max([evo_tol, evo_tol_min])
 
 
-def writeMetaFront(cache, meta_hof, path_meta_csv):
-    new_data = [individual.csv_line for individual in meta_hof.items]
-    new_data = pandas.DataFrame(new_data, columns=cache.headers)
-
-    new_data.to_csv(path_meta_csv, quoting=csv.QUOTE_ALL, index=False)
-    new_data.to_excel(cache.settings["resultsDirMeta"] / "results.xlsx", index=False)
+def writeMetaFront(cache, meta_hof):
+    "store the changes of the meta front, the csv and xlsx files are materialized from the store on a timer"
+    records.get_meta_store(cache).update(meta_hof)
 
 
 def processResultsGrad(save_name_base, individual, cache, results):
-    saveExperiments(
-        save_name_base,
-        cache.settings,
-        cache.target,
-        results,
-        cache.settings["resultsDirGrad"],
-        "%s_%s_GRAD.h5",
-    )
+    front_files.get_front(cache, "resultsDirGrad").add(save_name_base, results)
 
 
 def processResults(save_name_base, individual, cache, results):
-    saveExperiments(
-        save_name_base,
-        cache.settings,
-        cache.target,
-        results,
-        cache.settings["resultsDirEvo"],
-        "%s_%s_EVO.h5",
-    )
+    front_files.get_front(cache, "resultsDirEvo").add(save_name_base, results)
 
 
 def processResultsMeta(save_name_base, individual, cache, results):
-    saveExperiments(
-        save_name_base,
-        cache.settings,
-        cache.target,
-        results,
-        cache.settings["resultsDirMeta"],
-        "%s_%s_meta.h5",
-    )
+    front_files.get_front(cache, "resultsDirMeta").add(save_name_base, results)
 
 
 def cleanupFront(cache, halloffame=None, meta_hof=None, grad_hof=None):
+    "write the simulations of the individuals still on the fronts at the end of a generation and remove the rest"
     if halloffame is not None:
-        cleanDir(Path(cache.settings["resultsDirEvo"]), halloffame)
+        front_files.get_front(cache, "resultsDirEvo").commit(halloffame)
 
     if meta_hof is not None:
-        cleanDir(Path(cache.settings["resultsDirMeta"]), meta_hof)
+        front_files.get_front(cache, "resultsDirMeta").commit(meta_hof)
 
     if grad_hof is not None:
-        cleanDir(Path(cache.settings["resultsDirGrad"]), grad_hof)
-
-
-def cleanDir(dir, hof):
-    # find all items in directory
-    paths = dir.glob("*.h5")
-
-    # make set of items based on removing everything after _
-    exists = {str(path.name).split("_", 1)[0] for path in paths}
-
-    # make set of allowed keys based on hall of hame
-    allowed = hof.hashes()
-
-    # remove everything not in hall of fame
-    remove = exists - allowed
-
-    for save_name_base in remove:
-        for path in dir.glob("%s*" % save_name_base):
-            path.unlink()
+        front_files.get_front(cache, "resultsDirGrad").commit(grad_hof)
 
 
 def finish(cache):
+    # the final graphs read everything written so far
+    background.wait()
+    records.export_meta_fronts()
+    h5store.close_writers()
     sub.graph_process(cache, "Last", last=True)
 
 
@@ -1289,10 +1342,12 @@ def setupSimulation(sim, times, name, cache):
                 sim.root.input["return"][unit].write_solution_column_outlet = 1
                 sim.root.input["return"][unit].write_solution_outlet = 1
                 sim.root.input["return"][unit].write_sens_outlet = 1
+                sim.root.input["return"][unit].write_soldot_outlet = int(cache.simulationDerivative)
             else:
                 sim.root.input["return"][unit].write_solution_column_outlet = 0
                 sim.root.input["return"][unit].write_solution_outlet = 0
                 sim.root.input["return"][unit].write_sens_outlet = 0
+                sim.root.input["return"][unit].write_soldot_outlet = 0
     sim.root.input.solver.nthreads = 1
 
 
@@ -1370,7 +1425,19 @@ def getCoreCounts():
         return multiprocessing.cpu_count()
 
 
-def getMapFunction():
+def initializeWorker(json_path):
+    "pool initializer, compiles the numba kernels or loads them from the disk cache before the first evaluation"
+    import CADETMatch.cache as cache
+    import CADETMatch.score as score
+
+    # a separate cache only to find the directories, the worker cache is set up on the first evaluation
+    worker_cache = cache.Cache()
+    worker_cache.setup_dir(json_path)
+    score.setup_numba(worker_cache.settings["resultsDirMisc"] / "numba")
+    score.warmup_numba()
+
+
+def getMapFunction(json_path=None):
     cores = getCoreCounts()
     if cores == 1:
 
@@ -1379,7 +1446,12 @@ def getMapFunction():
         return map
     else:
         if "pool" not in getMapFunction.__dict__:
-            pool = multiprocessing.Pool(cores)
+            if json_path is not None:
+                pool = multiprocessing.Pool(
+                    cores, initializer=initializeWorker, initargs=(json_path,)
+                )
+            else:
+                pool = multiprocessing.Pool(cores)
             getMapFunction.pool = pool
             multiprocessing.get_logger().info(
                 "CADETMatch startup: created a parallel pool of %s workers", cores
@@ -1410,6 +1482,8 @@ def pop_lookup(lookup, key):
 
 
 def process_fraction_csv(csv_file):
+    import pandas
+
     data = pandas.read_csv(csv_file)
     rows, cols = data.shape
 
@@ -1439,6 +1513,8 @@ def fractionate_sim(start_times, stop_times, components, simulation, unit):
 
 
 def get_bins(array, axis=None):
+    import scipy.stats
+
     array = numpy.atleast_2d(array)
     shape = array.shape
     if axis:
@@ -0,0 +1,44 @@
+import subprocess
+import sys
+import textwrap
+
+import numpy
+
+import CADETMatch.h5store as h5store
+
+crash = textwrap.dedent(
+    """
+    import os
+    import sys
+
+    import numpy
+
+    import CADETMatch.h5store as h5store
+
+    def append(hf, data):
+        if "x" not in hf:
+            hf.create_dataset("x", data=data, maxshape=(None,))
+        else:
+            hf["x"].resize((hf["x"].shape[0] + len(data),))
+            hf["x"][-len(data):] = data
+
+    writer = h5store.get_writer(sys.argv[1])
+    writer.write(append, ["x"], numpy.arange(3.0))
+    writer.write(append, ["x"], numpy.arange(3.0))
+    writer.flush()
+    os._exit(0)
+    """
+)
+
+
+def test_reopen_after_crash(tmp_path):
+    path = tmp_path / "result.h5"
+    subprocess.run([sys.executable, "-c", crash, path.as_posix()], check=True)
+
+    writer = h5store.ResultWriter(path, 30.0)
+    writer.open(swmr=True)
+    try:
+        numpy.testing.assert_array_equal(writer.hf["x"][()], numpy.concatenate([numpy.arange(3.0)] * 2))
+        assert writer.hf.swmr_mode
+    finally:
+        writer.close()